@@ -0,0 +1,65 @@
+"""
+Alembic environment.
+
+The database URL comes from app settings (DATABASE_URL), not alembic.ini.
+Callers that already hold a connection (tests, startup code) can pass it as
+``config.attributes["connection"]``.
+"""
+import re
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+from app.core.config import settings
+from app.core.database import Base
+import app.models  # noqa: F401  (register tables)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Keep autogenerate away from audit_logs_YYYYMM month tables"""
+    return not (type_ == "table" and re.match(r"^audit_logs_(\d{6}|default)$", name or ""))
+
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout instead of running it"""
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=settings.DATABASE_URL.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = create_engine(settings.DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        _run(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
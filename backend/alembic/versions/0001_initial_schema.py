@@ -0,0 +1,258 @@
+"""initial schema
+
+Tables as created by Base.metadata.create_all before migrations existed.
+Databases created that way should be stamped with ``alembic stamp 0001``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:52:39.074426
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('hosts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uuid', sa.String(), nullable=True),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('fqdn', sa.String(), nullable=True),
+    sa.Column('ip_address', sa.String(), nullable=False),
+    sa.Column('total_cpu_cores', sa.Integer(), nullable=False),
+    sa.Column('total_ram_gb', sa.Float(), nullable=False),
+    sa.Column('total_storage_gb', sa.Float(), nullable=False),
+    sa.Column('used_cpu_cores', sa.Integer(), nullable=False),
+    sa.Column('used_ram_gb', sa.Float(), nullable=False),
+    sa.Column('used_storage_gb', sa.Float(), nullable=False),
+    sa.Column('libvirt_uri', sa.String(), nullable=True),
+    sa.Column('status', sa.Enum('ONLINE', 'OFFLINE', 'MAINTENANCE', 'ERROR', name='hoststatus'), nullable=False),
+    sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('stats_cache', sa.JSON(), nullable=True),
+    sa.Column('stats_updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_hosts_id'), 'hosts', ['id'], unique=False)
+    op.create_index(op.f('ix_hosts_uuid'), 'hosts', ['uuid'], unique=True)
+
+    op.create_table('os_images',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('os_family', sa.String(), nullable=False),
+    sa.Column('os_version', sa.String(), nullable=True),
+    sa.Column('file_path', sa.String(), nullable=False),
+    sa.Column('file_size_gb', sa.Float(), nullable=False),
+    sa.Column('file_format', sa.Enum('QCOW2', 'RAW', 'VMDK', name='imageformat'), nullable=False),
+    sa.Column('checksum_md5', sa.String(), nullable=True),
+    sa.Column('checksum_sha256', sa.String(), nullable=True),
+    sa.Column('is_public', sa.Boolean(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('uploader_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_os_images_id'), 'os_images', ['id'], unique=False)
+    op.create_index(op.f('ix_os_images_name'), 'os_images', ['name'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uuid', sa.String(), nullable=True),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('role', sa.Enum('ADMIN', 'SUPPORT', 'BILLING', 'USER', name='userrole'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('is_email_verified', sa.Boolean(), nullable=False),
+    sa.Column('totp_secret', sa.String(), nullable=True),
+    sa.Column('is_2fa_enabled', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_login', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_index(op.f('ix_users_uuid'), 'users', ['uuid'], unique=True)
+
+    op.create_table('vps_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('cpu_cores', sa.Integer(), nullable=False),
+    sa.Column('ram_gb', sa.Float(), nullable=False),
+    sa.Column('storage_gb', sa.Integer(), nullable=False),
+    sa.Column('price_per_month', sa.Float(), nullable=True),
+    sa.Column('price_per_hour', sa.Float(), nullable=True),
+    sa.Column('default_expiration_days', sa.Integer(), nullable=True),
+    sa.Column('default_expiration_action', sa.Enum('AUTO_DELETE', 'AUTO_SHUTDOWN', 'NOTIFY', name='expirationaction'), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_vps_templates_id'), 'vps_templates', ['id'], unique=False)
+
+    op.create_table('audit_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.Enum('CREATE', 'UPDATE', 'DELETE', 'START', 'STOP', 'REBOOT', 'LOGIN', 'LOGOUT', 'UPLOAD', 'DOWNLOAD', name='auditaction'), nullable=False),
+    sa.Column('resource_type', sa.Enum('VPS', 'USER', 'HOST', 'IMAGE', 'SSH_KEY', 'TEMPLATE', name='auditresource'), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=True),
+    sa.Column('resource_uuid', sa.String(), nullable=True),
+    sa.Column('ip_address', sa.String(), nullable=True),
+    sa.Column('user_agent', sa.String(), nullable=True),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_audit_logs_created_at'), 'audit_logs', ['created_at'], unique=False)
+    op.create_index(op.f('ix_audit_logs_id'), 'audit_logs', ['id'], unique=False)
+
+    op.create_table('revoked_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(), nullable=False),
+    sa.Column('scope', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('revoked_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_revoked_tokens_expires_at'), 'revoked_tokens', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_revoked_tokens_id'), 'revoked_tokens', ['id'], unique=False)
+    op.create_index(op.f('ix_revoked_tokens_jti'), 'revoked_tokens', ['jti'], unique=True)
+    op.create_index(op.f('ix_revoked_tokens_user_id'), 'revoked_tokens', ['user_id'], unique=False)
+
+    op.create_table('ssh_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('public_key', sa.Text(), nullable=False),
+    sa.Column('fingerprint', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ssh_keys_fingerprint'), 'ssh_keys', ['fingerprint'], unique=True)
+    op.create_index(op.f('ix_ssh_keys_id'), 'ssh_keys', ['id'], unique=False)
+
+    op.create_table('vps_template_plans',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('template_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('duration_days', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['template_id'], ['vps_templates.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_vps_template_plans_id'), 'vps_template_plans', ['id'], unique=False)
+
+    op.create_table('vpses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uuid', sa.String(), nullable=True),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('cpu_cores', sa.Integer(), nullable=False),
+    sa.Column('ram_gb', sa.Float(), nullable=False),
+    sa.Column('storage_gb', sa.Integer(), nullable=False),
+    sa.Column('os_image_id', sa.Integer(), nullable=False),
+    sa.Column('network_type', sa.Enum('PUBLIC_IPV4', 'PRIVATE_ONLY', name='networktype'), nullable=False),
+    sa.Column('public_ipv4', sa.String(), nullable=True),
+    sa.Column('private_ip', sa.String(), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=True),
+    sa.Column('template_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.Enum('CREATING', 'RUNNING', 'STOPPED', 'PAUSED', 'ERROR', 'DELETING', name='vpsstatus'), nullable=False),
+    sa.Column('vm_id', sa.String(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expiration_action', sa.Enum('AUTO_DELETE', 'AUTO_SHUTDOWN', 'NOTIFY', name='expirationaction'), nullable=True),
+    sa.Column('start_on_create', sa.Boolean(), nullable=False),
+    sa.Column('auto_backups', sa.Boolean(), nullable=False),
+    sa.Column('cloud_init_data', sa.Text(), nullable=True),
+    sa.Column('stats_cache', sa.JSON(), nullable=True),
+    sa.Column('stats_updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['host_id'], ['hosts.id'], ),
+    sa.ForeignKeyConstraint(['os_image_id'], ['os_images.id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['template_id'], ['vps_templates.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_vpses_id'), 'vpses', ['id'], unique=False)
+    op.create_index(op.f('ix_vpses_name'), 'vpses', ['name'], unique=False)
+    op.create_index(op.f('ix_vpses_uuid'), 'vpses', ['uuid'], unique=True)
+
+    op.create_table('vps_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('vps_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('snapshot_path', sa.String(), nullable=True),
+    sa.Column('size_gb', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['vps_id'], ['vpses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_vps_snapshots_id'), 'vps_snapshots', ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_vps_snapshots_id'), table_name='vps_snapshots')
+    op.drop_table('vps_snapshots')
+
+    op.drop_index(op.f('ix_vpses_uuid'), table_name='vpses')
+    op.drop_index(op.f('ix_vpses_name'), table_name='vpses')
+    op.drop_index(op.f('ix_vpses_id'), table_name='vpses')
+    op.drop_table('vpses')
+
+    op.drop_index(op.f('ix_vps_template_plans_id'), table_name='vps_template_plans')
+    op.drop_table('vps_template_plans')
+
+    op.drop_index(op.f('ix_ssh_keys_id'), table_name='ssh_keys')
+    op.drop_index(op.f('ix_ssh_keys_fingerprint'), table_name='ssh_keys')
+    op.drop_table('ssh_keys')
+
+    op.drop_index(op.f('ix_revoked_tokens_user_id'), table_name='revoked_tokens')
+    op.drop_index(op.f('ix_revoked_tokens_jti'), table_name='revoked_tokens')
+    op.drop_index(op.f('ix_revoked_tokens_id'), table_name='revoked_tokens')
+    op.drop_index(op.f('ix_revoked_tokens_expires_at'), table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
+
+    op.drop_index(op.f('ix_audit_logs_id'), table_name='audit_logs')
+    op.drop_index(op.f('ix_audit_logs_created_at'), table_name='audit_logs')
+    op.drop_table('audit_logs')
+
+    op.drop_index(op.f('ix_vps_templates_id'), table_name='vps_templates')
+    op.drop_table('vps_templates')
+
+    op.drop_index(op.f('ix_users_uuid'), table_name='users')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+
+    op.drop_index(op.f('ix_os_images_name'), table_name='os_images')
+    op.drop_index(op.f('ix_os_images_id'), table_name='os_images')
+    op.drop_table('os_images')
+
+    op.drop_index(op.f('ix_hosts_uuid'), table_name='hosts')
+    op.drop_index(op.f('ix_hosts_id'), table_name='hosts')
+    op.drop_table('hosts')
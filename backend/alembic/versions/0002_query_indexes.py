@@ -0,0 +1,47 @@
+"""query indexes
+
+Composite indexes for the filters the API actually runs:
+
+- vps.list_vpses           owner_id [+ status], paged by id
+- hosts.get_host_stats     status IN (running, creating), grouped by host;
+                           on Postgres the resource columns are INCLUDEd so
+                           the aggregate is an index-only scan
+- images.delete_image      count of VPSes on an image
+- admin.list_audit_logs    user_id / resource_type / action filter, newest first
+
+On Postgres the indexes are built CONCURRENTLY so writers are not blocked.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:53:05.630507
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_vpses_owner_status_id', 'vpses', ['owner_id', 'status', 'id'], {}),
+    ('ix_vpses_status_host', 'vpses', ['status', 'host_id'],
+     {'postgresql_include': ['cpu_cores', 'ram_gb', 'storage_gb']}),
+    ('ix_vpses_os_image_id', 'vpses', ['os_image_id'], {}),
+    ('ix_audit_logs_user_created', 'audit_logs', ['user_id', 'created_at'], {}),
+    ('ix_audit_logs_resource_created', 'audit_logs', ['resource_type', 'created_at'], {}),
+    ('ix_audit_logs_action_created', 'audit_logs', ['action', 'created_at'], {}),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
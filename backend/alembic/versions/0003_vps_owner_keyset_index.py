@@ -0,0 +1,27 @@
+"""vps owner keyset index
+
+vps.list_vpses pages by id within an owner. (owner_id, status, id) only
+serves that order when status is also filtered, so add (owner_id, id).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 01:20:11.402918
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_vpses_owner_id', 'vpses', ['owner_id', 'id'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_vpses_owner_id', table_name='vpses', postgresql_concurrently=True)
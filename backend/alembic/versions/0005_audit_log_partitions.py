@@ -0,0 +1,124 @@
+"""audit log partitions
+
+Postgres: rebuild audit_logs as a table partitioned by month on created_at
+(RANGE partitions audit_logs_YYYYMM plus audit_logs_default). A partitioned
+table's primary key has to include the partition key, so it becomes
+(id, created_at); ids still come from the existing sequence. Rows with a
+NULL created_at are kept with the time of the migration.
+
+SQLite: audit_logs keeps the current month and closed months are moved into
+audit_logs_YYYYMM tables by app.core.audit_partitions. Rebuild audit_logs
+with AUTOINCREMENT so ids are never reused once older rows have moved out.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 02:34:50.207113
+"""
+import re
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+COLUMNS = """
+    id integer NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+    user_id integer REFERENCES users (id),
+    action auditaction NOT NULL,
+    resource_type auditresource NOT NULL,
+    resource_id integer,
+    resource_uuid varchar,
+    ip_address varchar,
+    user_agent varchar,
+    details json,
+"""
+INDEXES = [
+    ('ix_audit_logs_created_at', ['created_at']),
+    ('ix_audit_logs_id', ['id']),
+    ('ix_audit_logs_user_created', ['user_id', 'created_at']),
+    ('ix_audit_logs_resource_created', ['resource_type', 'created_at']),
+    ('ix_audit_logs_action_created', ['action', 'created_at']),
+]
+
+
+def _months(first: datetime, last: datetime):
+    month = datetime(first.year, first.month, 1)
+    while month <= last:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        yield month, following
+        month = following
+
+
+def _swap_in(create_sql: str) -> None:
+    """Replace audit_logs with the table built by ``create_sql``, keeping rows and sequence"""
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_old")
+    op.execute("ALTER TABLE audit_logs_old DROP CONSTRAINT audit_logs_pkey")
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(create_sql)
+    for name, columns in INDEXES:
+        op.create_index(name, 'audit_logs', columns)
+
+
+def _upgrade_postgresql() -> None:
+    bind = op.get_bind()
+    _swap_in(f"""
+        CREATE TABLE audit_logs ({COLUMNS}
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    now = datetime.utcnow()
+    first = bind.execute(sa.text("SELECT min(created_at) FROM audit_logs_old")).scalar() or now
+    last = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)  # through next month
+    for lo, hi in _months(first, last):
+        op.execute(
+            f"CREATE TABLE audit_logs_{lo:%Y%m} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{lo:%Y-%m-%d} 00:00+00') TO ('{hi:%Y-%m-%d} 00:00+00')"
+        )
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    op.execute(
+        "INSERT INTO audit_logs SELECT id, user_id, action, resource_type, resource_id, resource_uuid, "
+        "ip_address, user_agent, details, coalesce(created_at, now()) FROM audit_logs_old"
+    )
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("DROP TABLE audit_logs_old")
+
+
+def _downgrade_postgresql() -> None:
+    _swap_in(f"""
+        CREATE TABLE audit_logs ({COLUMNS}
+            created_at timestamptz DEFAULT now(),
+            PRIMARY KEY (id)
+        )
+    """)
+    op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_old")
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("DROP TABLE audit_logs_old")  # drops the partitions with it
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _upgrade_postgresql()
+        return
+    with op.batch_alter_table('audit_logs', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        _downgrade_postgresql()
+        return
+    # Fold month tables back into audit_logs
+    months = [name for name in sa.inspect(bind).get_table_names() if re.fullmatch(r'audit_logs_\d{6}', name)]
+    for name in sorted(months):
+        op.execute(f"INSERT INTO audit_logs SELECT * FROM {name}")
+        op.drop_table(name)
+    with op.batch_alter_table('audit_logs', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
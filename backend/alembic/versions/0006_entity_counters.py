@@ -0,0 +1,45 @@
+"""entity counters
+
+Per-(entity, status) row counts read by the admin dashboard, filled from the
+current tables. Later changes are kept in step by the session hooks in
+app.models.entity_counter.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 03:12:40.581926
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('entity_counters',
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('entity', 'status')
+    )
+    op.execute(
+        "INSERT INTO entity_counters (entity, status, count) "
+        "SELECT 'users', CASE WHEN is_active THEN 'active' ELSE 'inactive' END, count(*) "
+        "FROM users GROUP BY 2"
+    )
+    op.execute(
+        "INSERT INTO entity_counters (entity, status, count) "
+        "SELECT 'vpses', lower(CAST(status AS VARCHAR)), count(*) FROM vpses GROUP BY 2"
+    )
+    op.execute(
+        "INSERT INTO entity_counters (entity, status, count) "
+        "SELECT 'hosts', lower(CAST(status AS VARCHAR)), count(*) FROM hosts GROUP BY 2"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('entity_counters')
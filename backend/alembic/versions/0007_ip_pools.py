@@ -0,0 +1,55 @@
+"""ip pools
+
+Admin-defined address pools and their allocation bitmaps, stored as one row
+per block. The pools themselves are created by app.core.ipam.create_pool:
+the default pools at bootstrap, and any others through the admin API.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 05:02:18.334190
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    network_type = sa.Enum('PUBLIC_IPV4', 'PRIVATE_ONLY', name='networktype')
+    if op.get_bind().dialect.name == 'postgresql':
+        # The type already exists (vpses.network_type)
+        network_type = postgresql.ENUM('PUBLIC_IPV4', 'PRIVATE_ONLY', name='networktype', create_type=False)
+    op.create_table('ip_pools',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('cidr', sa.String(), nullable=False),
+    sa.Column('network_type', network_type, nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['host_id'], ['hosts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_ip_pools_id'), 'ip_pools', ['id'], unique=False)
+    op.create_table('ip_pool_blocks',
+    sa.Column('pool_id', sa.Integer(), nullable=False),
+    sa.Column('block', sa.Integer(), nullable=False),
+    sa.Column('bitmap', sa.LargeBinary(), nullable=False),
+    sa.Column('free', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['pool_id'], ['ip_pools.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('pool_id', 'block')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ip_pool_blocks')
+    op.drop_index(op.f('ix_ip_pools_id'), table_name='ip_pools')
+    op.drop_table('ip_pools')
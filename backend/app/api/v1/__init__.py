@@ -2,7 +2,7 @@
 API v1 Router
 """
 from fastapi import APIRouter
-from app.api.v1 import auth, admin, users, vps, hosts, images, ssh_keys, tmate
+from app.api.v1 import auth, admin, users, vps, hosts, images, ssh_keys, tmate, jobs
 
 api_router = APIRouter()
 
@@ -14,4 +14,4 @@ api_router.include_router(hosts.router, prefix="/hosts", tags=["Hosts"])
 api_router.include_router(images.router, prefix="/images", tags=["Images"])
 api_router.include_router(ssh_keys.router, prefix="/ssh-keys", tags=["SSH Keys"])
 api_router.include_router(tmate.router, prefix="/tmate", tags=["tmate"])
-
+api_router.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
@@ -1,13 +1,23 @@
 """
 Admin-only endpoints
 """
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from app.core.audit_export import FORMATS, export_query, stream_export
+from app.core.audit_partitions import audit_source, listing_since, naive_utc
+from app.core.counters import read_counters
+from app.core.database import AnySession, get_async_db
 from app.core.dependencies import get_current_admin
+from app.core.ipam import create_pool
+from app.core.pagination import count_total, paginate, set_page_headers
+from app.models.host import Host, HostStatus
+from app.models.ip_pool import IPPool, IPPoolBlock
 from app.models.user import User
+from app.models.vps import NetworkType, VPSStatus
 from typing import Optional, List
 from pydantic import BaseModel
+from datetime import datetime
 from app.models.audit_log import AuditLog, AuditAction, AuditResource
 
 router = APIRouter()
@@ -15,35 +25,25 @@ router = APIRouter()
 
 @router.get("/dashboard")
 async def admin_dashboard(
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin)
 ):
-    """Admin dashboard statistics"""
-    from app.models.user import User
-    from app.models.vps import VPS, VPSStatus
-    from app.models.host import Host, HostStatus
-    
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    
-    total_vpses = db.query(VPS).count()
-    running_vpses = db.query(VPS).filter(VPS.status == VPSStatus.RUNNING).count()
-    
-    total_hosts = db.query(Host).count()
-    online_hosts = db.query(Host).filter(Host.status == HostStatus.ONLINE).count()
+    """Admin dashboard statistics (from the maintained counters, one query)"""
+    counts = await read_counters(db)
+    users, vpses, hosts = counts["users"], counts["vpses"], counts["hosts"]
     
     return {
         "users": {
-            "total": total_users,
-            "active": active_users
+            "total": sum(users.values()),
+            "active": users.get("active", 0)
         },
         "vpses": {
-            "total": total_vpses,
-            "running": running_vpses
+            "total": sum(vpses.values()),
+            "running": vpses.get(VPSStatus.RUNNING.value, 0)
         },
         "hosts": {
-            "total": total_hosts,
-            "online": online_hosts
+            "total": sum(hosts.values()),
+            "online": hosts.get(HostStatus.ONLINE.value, 0)
         }
     }
 
@@ -58,30 +58,211 @@ class AuditLogResponse(BaseModel):
     ip_address: Optional[str]
     user_agent: Optional[str]
     details: Optional[dict]
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+async def _audit_query(
+    db: AnySession,
+    action: Optional[str],
+    resource_type: Optional[str],
+    user_id: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+):
+    """(entity, filtered select) shared by the audit-log list and export"""
+    since, until = naive_utc(since), naive_utc(until)
+    source = await audit_source(db, since, until)
+    query = select(source)
+    if action:
+        query = query.where(source.action == AuditAction(action))
+    if resource_type:
+        query = query.where(source.resource_type == AuditResource(resource_type))
+    if user_id:
+        query = query.where(source.user_id == user_id)
+    if since:
+        query = query.where(source.created_at >= since)
+    if until:
+        query = query.where(source.created_at < until)
+    return source, query
+
+
 @router.get("/audit-logs", response_model=List[AuditLogResponse])
 async def list_audit_logs(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     action: Optional[str] = None,
     resource_type: Optional[str] = None,
     user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
 ):
-    """List audit logs with optional filters"""
-    query = db.query(AuditLog)
-    if action:
-        query = query.filter(AuditLog.action == AuditAction(action))
-    if resource_type:
-        query = query.filter(AuditLog.resource_type == AuditResource(resource_type))
-    if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
-    logs = query.order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all()
-    return logs
+    """
+    List audit logs, newest first (cursor-paged on (created_at, id); ``skip``
+    is legacy). ``since``/``until`` bound created_at and limit the scan to the
+    monthly partitions they overlap; without ``since`` the listing covers the
+    last AUDIT_LIST_MONTHS months.
+    """
+    if since is None:
+        since = listing_since(naive_utc(until))
+    source, query = await _audit_query(db, action, resource_type, user_id, since, until)
+    if skip:
+        if include_total:
+            response.headers["X-Total-Count"] = str(await count_total(db, query))
+        return (await db.scalars(
+            query.order_by(source.created_at.desc(), source.id.desc()).offset(skip).limit(limit)
+        )).all()
+    
+    page = await paginate(
+        db, query, source,
+        keys=[source.created_at, source.id], descending=True,
+        limit=limit, cursor=cursor, include_total=include_total,
+    )
+    set_page_headers(response, request, page)
+    return page.items
+
+
+@router.get("/audit-logs/export")
+async def export_audit_logs(
+    request: Request,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream every matching audit log, oldest first, as NDJSON or CSV (optionally gzipped)"""
+    source, query = await _audit_query(db, action, resource_type, user_id, since, until)
+    filename = f"audit-logs-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(export_query(query, source), format, compress=gzip, request=request),
+        media_type="application/gzip" if gzip else FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+
+class IPPoolCreate(BaseModel):
+    name: str
+    cidr: str
+    network_type: str = "public_ipv4"
+    host_id: Optional[int] = None  # None = shared by every host
+    reserved: List[str] = []  # Never handed out, e.g. the gateway
+
+
+class IPPoolResponse(BaseModel):
+    id: int
+    name: str
+    cidr: str
+    network_type: str
+    host_id: Optional[int]
+    size: int
+    free: int
+
+
+def _pool_response(pool: IPPool, free: int) -> IPPoolResponse:
+    return IPPoolResponse(
+        id=pool.id, name=pool.name, cidr=pool.cidr, network_type=pool.network_type.value,
+        host_id=pool.host_id, size=pool.size, free=free,
+    )
+
+
+@router.get("/ip-pools", response_model=List[IPPoolResponse])
+async def list_ip_pools(
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Address pools with their free-address counts"""
+    rows = (await db.execute(
+        select(IPPool, func.sum(IPPoolBlock.free))
+        .join(IPPoolBlock, IPPoolBlock.pool_id == IPPool.id)
+        .group_by(IPPool.id)
+        .order_by(IPPool.id)
+    )).all()
+    return [_pool_response(pool, free) for pool, free in rows]
+
+
+@router.post("/ip-pools", response_model=IPPoolResponse, status_code=201)
+async def create_ip_pool(
+    pool_data: IPPoolCreate,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Define an address pool for a network type, optionally for one host"""
+    try:
+        network_type = NetworkType(pool_data.network_type)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Invalid network_type {pool_data.network_type!r}")
+    if pool_data.host_id is not None and not await db.get(Host, pool_data.host_id):
+        raise HTTPException(status_code=404, detail="Host not found")
+    if await db.scalar(select(IPPool.id).where(IPPool.name == pool_data.name)):
+        raise HTTPException(status_code=409, detail="Pool name already in use")
+
+    try:
+        pool = await db.run_sync(
+            create_pool, pool_data.name, pool_data.cidr, network_type, pool_data.host_id, pool_data.reserved
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = _pool_response(pool, sum(block.free for block in pool.blocks))
+    await db.commit()
+    return result
+
 
+@router.get("/cache-stats")
+async def cache_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counters for the in-process authentication caches"""
+    from app.core.principal_cache import principal_cache
+    from app.core.revocation import revocation_list
+    from app.core.security import token_cache
+
+    return {
+        "principal": principal_cache.stats(),
+        "token": token_cache.stats(),
+        "revocation": revocation_list.stats(),
+    }
+
+
+@router.post("/users/{user_id}/revoke-sessions")
+async def revoke_user_sessions(
+    user_id: int,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Revoke every access and refresh token issued to a user"""
+    from app.core.revocation import revocation_list
+    from app.core.audit import record_audit
+
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    await db.run_sync(revocation_list.revoke_user, user.id)
+    try:
+        await db.run_sync(
+            record_audit,
+            user_id=current_user.id,
+            action=AuditAction.LOGOUT,
+            resource_type=AuditResource.USER,
+            resource_id=user.id,
+            resource_uuid=user.uuid,
+            details={"revoked_all_sessions": True},
+        )
+    except Exception:
+        pass
+    
+    return {"message": "All sessions revoked", "user_id": user.id}
@@ -2,14 +2,13 @@
 Authentication endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from app.core.database import get_db
+from app.core.database import AnySession, get_async_db
 from app.core.security import (
-    verify_password,
-    get_password_hash,
+    password_hasher,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -17,6 +16,7 @@ from app.core.security import (
 )
 from app.core.dependencies import get_current_user
 from app.core.rate_limit import should_throttle, record_failure, reset_counter
+from app.core.revocation import revocation_list
 from app.core.audit import record_audit
 from app.models.audit_log import AuditAction, AuditResource
 from app.models.user import User, UserRole
@@ -42,6 +42,10 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
@@ -65,7 +69,7 @@ class UserResponse(BaseModel):
 @router.post("/login", response_model=TokenResponse)
 async def login(
     request: LoginRequest,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     client_request: Request = None
 ):
     """Login and get JWT tokens"""
@@ -79,9 +83,12 @@ async def login(
             detail="Too many failed attempts. Please try again later."
         )
 
-    user = db.query(User).filter(User.email == request.email).first()
+    user = await db.scalar(select(User).where(User.email == request.email))
+    # Hand the pooled connection back while bcrypt runs off-loop; the loaded
+    # user stays usable and is re-attached before it is modified below.
+    await db.close()
     
-    if not user or not verify_password(request.password, user.hashed_password):
+    if not user or not await password_hasher.verify(request.password, user.hashed_password):
         if client_ip:
             record_failure(client_ip)
         raise HTTPException(
@@ -116,8 +123,9 @@ async def login(
     
     # Update last login
     from datetime import datetime
+    db.add(user)
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Create tokens
     access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
@@ -129,8 +137,8 @@ async def login(
 
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=user.id,
             action=AuditAction.LOGIN,
             resource_type=AuditResource.USER,
@@ -152,17 +160,17 @@ async def login(
 @router.post("/register")
 async def register(
     request: RegisterRequest,
-    db: Session = Depends(get_db)
+    db: AnySession = Depends(get_async_db)
 ):
     """Register a new user (default role: user)"""
     # Check if user exists
-    if db.query(User).filter(User.email == request.email).first():
+    if await db.scalar(select(User).where(User.email == request.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    if db.query(User).filter(User.username == request.username).first():
+    if await db.scalar(select(User).where(User.username == request.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
@@ -172,14 +180,14 @@ async def register(
     user = User(
         email=request.email,
         username=request.username,
-        hashed_password=get_password_hash(request.password),
+        hashed_password=await password_hasher.hash(request.password),
         full_name=request.full_name,
         role=UserRole.USER
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return {"message": "User registered successfully", "user_id": user.id}
 
@@ -187,19 +195,24 @@ async def register(
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh_token(
     request: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AnySession = Depends(get_async_db)
 ):
     """Refresh access token"""
-    payload = decode_token(request.refresh_token)
+    # Revocation is decided by the rotation step below, which also detects reuse
+    payload = decode_token(request.refresh_token, check_revoked=False)
     
-    if payload is None or payload.get("type") != "refresh":
+    if (
+        payload is None
+        or payload.get("type") != "refresh"
+        or not payload.get("jti")
+        or revocation_list.is_user_revoked(payload)
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
         )
     
-    user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, int(payload["sub"]))
     
     if not user or not user.is_active:
         raise HTTPException(
@@ -207,6 +220,15 @@ async def refresh_token(
             detail="User not found or inactive"
         )
     
+    # Rotate: consuming the jti is the atomic step, so a replayed token loses
+    if not await db.run_sync(revocation_list.revoke_token, payload):
+        # A rotated token came back; assume it was stolen and end every session
+        await db.run_sync(revocation_list.revoke_user, user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+    
     # Create new tokens
     access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
     new_refresh_token = create_refresh_token(data={"sub": user.id})
@@ -227,8 +249,35 @@ async def get_current_user_info(
 
 @router.post("/logout")
 async def logout(
+    request: Optional[LogoutRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Logout (client should discard tokens)"""
+    """Logout: revoke the presented access token and, if given, the refresh token"""
+    access_payload = decode_token(credentials.credentials)
+    if access_payload:
+        await db.run_sync(revocation_list.revoke_token, access_payload)
+    
+    if request and request.refresh_token:
+        refresh_payload = decode_token(request.refresh_token)
+        if (
+            refresh_payload
+            and refresh_payload.get("type") == "refresh"
+            and refresh_payload.get("sub") == str(current_user.id)
+        ):
+            await db.run_sync(revocation_list.revoke_token, refresh_payload)
+    
+    try:
+        await db.run_sync(
+            record_audit,
+            user_id=current_user.id,
+            action=AuditAction.LOGOUT,
+            resource_type=AuditResource.USER,
+            resource_id=current_user.id,
+            resource_uuid=current_user.uuid,
+        )
+    except Exception:
+        pass
+    
     return {"message": "Logged out successfully"}
-
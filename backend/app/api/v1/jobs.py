@@ -0,0 +1,69 @@
+"""
+Job status endpoints (poll the job ids returned by the VPS endpoints)
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from typing import Any, List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+from app.core.database import AnySession, get_async_db
+from app.core.dependencies import get_current_user
+from app.models.job import Job
+from app.models.user import User, UserRole
+from app.models.vps import VPS
+
+router = APIRouter()
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    vps_id: Optional[int]
+    progress: int
+    attempts: int
+    max_attempts: int
+    error: Optional[str]
+    result: Optional[Any]
+    run_after: Optional[datetime]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+def _visible(query, current_user: User):
+    """Users see the jobs they started and the jobs on their VPSes"""
+    if current_user.role != UserRole.USER:
+        return query
+    own_vpses = select(VPS.id).where(VPS.owner_id == current_user.id)
+    return query.where((Job.user_id == current_user.id) | Job.vps_id.in_(own_vpses))
+
+
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    vps_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Most recent jobs, optionally for one VPS"""
+    query = _visible(select(Job), current_user)
+    if vps_id is not None:
+        query = query.where(Job.vps_id == vps_id)
+    return (await db.scalars(query.order_by(Job.id.desc()).limit(limit))).all()
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get job by ID"""
+    job = await db.scalar(_visible(select(Job).where(Job.id == job_id), current_user))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,13 +1,16 @@
 """
 User management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import select
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr
-from app.core.database import get_db
+from datetime import datetime
+from app.core.database import AnySession, get_async_db
 from app.core.dependencies import get_current_user, get_current_admin
+from app.core.pagination import count_total, paginate, set_page_headers
 from app.core.permissions import require_permission, Permission
+from app.core.revocation import revocation_list
 from app.models.user import User, UserRole
 
 router = APIRouter()
@@ -38,8 +41,8 @@ class UserResponse(BaseModel):
     role: str
     is_active: bool
     is_2fa_enabled: bool
-    created_at: str
-    last_login: Optional[str]
+    created_at: datetime
+    last_login: Optional[datetime]
 
     class Config:
         from_attributes = True
@@ -47,41 +50,53 @@ class UserResponse(BaseModel):
 
 @router.get("/", response_model=List[UserResponse])
 async def list_users(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     search: Optional[str] = None,
     role: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List users (requires USER_READ permission)"""
+    """List users (cursor-paged by id; ``skip`` keeps the legacy offset paging)"""
     # Check permission (admin/support can see all, users see only themselves)
-    query = db.query(User)
+    query = select(User)
     
     if current_user.role == UserRole.USER:
-        query = query.filter(User.id == current_user.id)
+        query = query.where(User.id == current_user.id)
     else:
         if search:
-            query = query.filter(
+            query = query.where(
                 (User.email.ilike(f"%{search}%")) |
                 (User.username.ilike(f"%{search}%")) |
                 (User.full_name.ilike(f"%{search}%"))
             )
         if role:
-            query = query.filter(User.role == UserRole(role))
+            query = query.where(User.role == UserRole(role))
     
-    users = query.offset(skip).limit(limit).all()
-    return users
+    if skip:
+        if include_total:
+            response.headers["X-Total-Count"] = str(await count_total(db, query))
+        return (await db.scalars(query.order_by(User.id).offset(skip).limit(limit))).all()
+    
+    page = await paginate(
+        db, query, User, keys=[User.id], limit=limit, cursor=cursor, include_total=include_total
+    )
+    set_page_headers(response, request, page)
+    return page.items
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -96,32 +111,32 @@ async def get_user(
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin)
 ):
     """Create a new user (admin only)"""
     # Check if user exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User).where(User.email == user_data.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User).where(User.username == user_data.username)):
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    from app.core.security import get_password_hash
+    from app.core.security import password_hasher
     
     role = UserRole(user_data.role) if user_data.role else UserRole.USER
     
     user = User(
         email=user_data.email,
         username=user_data.username,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await password_hasher.hash(user_data.password),
         full_name=user_data.full_name,
         role=role
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
@@ -130,11 +145,11 @@ async def create_user(
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update user (admin or self)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -149,12 +164,12 @@ async def update_user(
         user_data.is_active = None
     
     if user_data.email and user_data.email != user.email:
-        if db.query(User).filter(User.email == user_data.email).first():
+        if await db.scalar(select(User).where(User.email == user_data.email)):
             raise HTTPException(status_code=400, detail="Email already registered")
         user.email = user_data.email
     
     if user_data.username and user_data.username != user.username:
-        if db.query(User).filter(User.username == user_data.username).first():
+        if await db.scalar(select(User).where(User.username == user_data.username)):
             raise HTTPException(status_code=400, detail="Username already taken")
         user.username = user_data.username
     
@@ -167,8 +182,9 @@ async def update_user(
     if user_data.is_active is not None and current_user.role == UserRole.ADMIN:
         user.is_active = user_data.is_active
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.run_sync(revocation_list.principal_changed, user.id)
+    await db.refresh(user)
     
     return user
 
@@ -176,11 +192,11 @@ async def update_user(
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin)
 ):
     """Delete user (admin only)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -188,8 +204,9 @@ async def delete_user(
     if user.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await db.run_sync(revocation_list.principal_changed, user_id)
     
     return None
 
@@ -1,24 +1,32 @@
 """
 VPS management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import exists, insert, select
+from sqlalchemy.exc import IntegrityError
+from collections import defaultdict
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import AnySession, get_async_db
 from app.core.dependencies import get_current_user, get_current_admin
-from app.models.vps import VPS, VPSStatus, NetworkType, ExpirationAction
+from app.core.pagination import count_total, paginate, set_page_headers
+from app.models.vps import VPS, VPSStatus, VPSTemplate, NetworkType, ExpirationAction
 from app.core.audit import record_audit
-from app.models.audit_log import AuditAction, AuditResource
+from app.core.ipam import allocate_addresses, release_addresses
+from app.core.jobs import ACTIVE, dispatch, enqueue, enqueue_where, has_active_job
+from app.core.metric_store import history
+from app.core.scheduler import NoCapacity, Reservation, Resources, scheduler
+from app.models.audit_log import AuditLog, AuditAction, AuditResource
+from app.models.job import Job, JobKind
 from app.models.user import User, UserRole
 from app.models.image import OSImage
 
 router = APIRouter()
 
 
-class VPSCreate(BaseModel):
-    name: str
+class VPSSpec(BaseModel):
     cpu_cores: int
     ram_gb: float
     storage_gb: int
@@ -33,6 +41,19 @@ class VPSCreate(BaseModel):
     expiration_action: str = "notify"
 
 
+class VPSCreate(VPSSpec):
+    name: str
+
+
+class VPSBulkCreate(BaseModel):
+    """Either explicit ``items``, or ``count`` copies of ``spec`` named by ``name_pattern``"""
+    items: Optional[List[VPSCreate]] = None
+    count: Optional[int] = None
+    name_pattern: str = "vps-{n}"  # str.format with n = start, start + 1, ...
+    start: int = 1
+    spec: Optional[VPSSpec] = None
+
+
 class VPSUpdate(BaseModel):
     name: Optional[str] = None
     cpu_cores: Optional[int] = None
@@ -66,39 +87,156 @@ class VPSResponse(BaseModel):
         from_attributes = True
 
 
+class VPSJobResponse(VPSResponse):
+    job_id: Optional[int] = None  # Poll GET /jobs/{job_id}
+
+
+class StatsSeries(BaseModel):
+    min: List[Optional[float]]
+    avg: List[Optional[float]]
+    max: List[Optional[float]]
+
+
+class VPSStatsHistory(BaseModel):
+    range: int  # Seconds
+    step: int
+    timestamps: List[int]  # Unix time at the start of each step
+    metrics: Dict[str, StatsSeries]  # cpu/ram/disk in %, disk_read/disk_write/net_in/net_out in bytes/s
+
+
+class JobAccepted(BaseModel):
+    message: str
+    status: str
+    job_id: int
+
+
+class VPSBulkItem(BaseModel):
+    index: int
+    name: str
+    status_code: int
+    vps: Optional[VPSResponse] = None
+    job_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class VPSBulkResult(BaseModel):
+    created: int
+    failed: int
+    results: List[VPSBulkItem]
+
+
+class VPSActionRequest(BaseModel):
+    """``action`` on the VPSes in ``ids``, or on those matching every filter given"""
+    action: str  # start | stop | reboot
+    ids: Optional[List[int]] = None
+    owner_id: Optional[int] = None
+    host_id: Optional[int] = None
+    status: Optional[str] = None
+
+
+class VPSActionItem(BaseModel):
+    vps_id: int
+    status_code: int
+    job_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class VPSActionResult(BaseModel):
+    action: str
+    queued: int
+    failed: int
+    results: List[VPSActionItem]
+
+
+# Batch actions: job kind, audit action and the statuses a VPS may be in
+BATCH_ACTIONS = {
+    "start": (JobKind.START, AuditAction.START, (VPSStatus.STOPPED, VPSStatus.PAUSED, VPSStatus.ERROR)),
+    "stop": (JobKind.STOP, AuditAction.STOP, (VPSStatus.RUNNING, VPSStatus.PAUSED, VPSStatus.ERROR)),
+    "reboot": (JobKind.REBOOT, AuditAction.REBOOT, (VPSStatus.RUNNING,)),
+}
+
+
+def _new_vps(data: VPSCreate, host_id: int, address: str) -> VPS:
+    network_type = NetworkType(data.network_type)
+    return VPS(
+        name=data.name,
+        cpu_cores=data.cpu_cores,
+        ram_gb=data.ram_gb,
+        storage_gb=data.storage_gb,
+        os_image_id=data.os_image_id,
+        network_type=network_type,
+        public_ipv4=address if network_type == NetworkType.PUBLIC_IPV4 else None,
+        private_ip=address if network_type == NetworkType.PRIVATE_ONLY else None,
+        owner_id=data.owner_id,
+        template_id=data.template_id,
+        start_on_create=data.start_on_create,
+        auto_backups=data.auto_backups,
+        cloud_init_data=data.cloud_init_data,
+        expires_at=data.expires_at,
+        expiration_action=ExpirationAction(data.expiration_action),
+        status=VPSStatus.CREATING,
+        host_id=host_id
+    )
+
+
+def _with_job(vps: VPS, job_id: Optional[int]) -> VPSJobResponse:
+    return VPSJobResponse(**VPSResponse.model_validate(vps).model_dump(), job_id=job_id)
+
+
+JOB_IN_PROGRESS = "VPS has a job in progress"
+
+
+async def _ensure_idle(db: AnySession, vps: VPS) -> None:
+    """Early 409; a request racing past this is stopped by ix_jobs_vps_status on insert"""
+    if await has_active_job(db, vps.id):
+        raise HTTPException(status_code=409, detail=JOB_IN_PROGRESS)
+
+
 @router.get("/", response_model=List[VPSResponse])
 async def list_vpses(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     owner_id: Optional[int] = None,
     status_filter: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List VPS instances"""
-    query = db.query(VPS)
+    """List VPS instances (cursor-paged by id; ``skip`` keeps the legacy offset paging)"""
+    query = select(VPS)
     
     # Users can only see their own VPSes
     if current_user.role == UserRole.USER:
-        query = query.filter(VPS.owner_id == current_user.id)
+        query = query.where(VPS.owner_id == current_user.id)
     elif owner_id:
-        query = query.filter(VPS.owner_id == owner_id)
+        query = query.where(VPS.owner_id == owner_id)
     
     if status_filter:
-        query = query.filter(VPS.status == VPSStatus(status_filter))
+        query = query.where(VPS.status == VPSStatus(status_filter))
     
-    vpses = query.offset(skip).limit(limit).all()
-    return vpses
+    if skip:
+        if include_total:
+            response.headers["X-Total-Count"] = str(await count_total(db, query))
+        return (await db.scalars(query.order_by(VPS.id).offset(skip).limit(limit))).all()
+    
+    page = await paginate(
+        db, query, VPS, keys=[VPS.id], limit=limit, cursor=cursor, include_total=include_total
+    )
+    set_page_headers(response, request, page)
+    return page.items
 
 
 @router.get("/{vps_id}", response_model=VPSResponse)
 async def get_vps(
     vps_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get VPS by ID"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
@@ -110,63 +248,76 @@ async def get_vps(
     return vps
 
 
-@router.post("/", response_model=VPSResponse, status_code=status.HTTP_201_CREATED)
+@router.get("/{vps_id}/stats", response_model=VPSStatsHistory)
+async def get_vps_stats(
+    vps_id: int,
+    range_: str = Query("1h", alias="range", description="How far back: 90s, 30m, 6h, 7d"),
+    step: Optional[str] = Query(None, description="Point spacing (multiple of 10s); default about 360 points"),
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Usage history from the in-memory metric store (min/avg/max per step)"""
+    vps = await db.get(VPS, vps_id)
+    if not vps:
+        raise HTTPException(status_code=404, detail="VPS not found")
+    if current_user.role == UserRole.USER and vps.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    try:
+        return history("vps", vps_id, range_, step)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.post("/", response_model=VPSJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_vps(
     vps_data: VPSCreate,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin)
 ):
-    """Create a new VPS (admin only)"""
+    """Create a new VPS (admin only); a job provisions it"""
     # Validate OS image
-    os_image = db.query(OSImage).filter(OSImage.id == vps_data.os_image_id).first()
+    os_image = await db.get(OSImage, vps_data.os_image_id)
     if not os_image:
         raise HTTPException(status_code=404, detail="OS image not found")
     
     # Validate owner
-    owner = db.query(User).filter(User.id == vps_data.owner_id).first()
+    owner = await db.get(User, vps_data.owner_id)
     if not owner:
         raise HTTPException(status_code=404, detail="Owner user not found")
     
-    # Create VPS
-    vps = VPS(
-        name=vps_data.name,
-        cpu_cores=vps_data.cpu_cores,
-        ram_gb=vps_data.ram_gb,
-        storage_gb=vps_data.storage_gb,
-        os_image_id=vps_data.os_image_id,
-        network_type=NetworkType(vps_data.network_type),
-        owner_id=vps_data.owner_id,
-        template_id=vps_data.template_id,
-        start_on_create=vps_data.start_on_create,
-        auto_backups=vps_data.auto_backups,
-        cloud_init_data=vps_data.cloud_init_data,
-        expires_at=vps_data.expires_at,
-        expiration_action=ExpirationAction(vps_data.expiration_action),
-        status=VPSStatus.CREATING
-    )
-    
-    db.add(vps)
-    db.commit()
-    db.refresh(vps)
+    # Place on a host; the capacity is reserved in this transaction
+    try:
+        reservation = await scheduler.place(
+            db, Resources(vps_data.cpu_cores, vps_data.ram_gb, vps_data.storage_gb)
+        )
+    except NoCapacity as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    # Simulate provisioning so the UI can proceed (until real worker is plugged in)
+    # From here on, any failure rolls back and gives the reservation up
     try:
-        if vps.network_type == NetworkType.PUBLIC_IPV4:
-            # Assign a placeholder public IPv4 (TEST-NET-3 range)
-            vps.public_ipv4 = f"203.0.113.{(vps.id % 250) + 1}"
-        else:
-            # Private-only IP (RFC1918)
-            vps.private_ip = f"10.0.0.{(vps.id % 250) + 10}"
-        vps.status = VPSStatus.RUNNING if vps.start_on_create else VPSStatus.STOPPED
-        db.commit()
-        db.refresh(vps)
+        # Take an address from the host's (or a shared) pool, also in this transaction
+        network_type = NetworkType(vps_data.network_type)
+        addresses = await allocate_addresses(db, network_type, reservation.host_id)
+        if not addresses:
+            raise HTTPException(status_code=409, detail=f"No free {network_type.value} address")
+
+        # Create VPS (CREATING until its job has provisioned it)
+        vps = _new_vps(vps_data, reservation.host_id, addresses[0])
+        db.add(vps)
+        await db.flush()
+        job = enqueue(db, JobKind.CREATE, vps.id, current_user.id)
+        await db.flush()
+        job_id = job.id
+        await db.commit()
     except Exception:
-        # Keep initial state if anything goes wrong
-        pass
+        await db.rollback()
+        scheduler.abort(reservation)
+        raise
+    await db.refresh(vps)
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=current_user.id,
             action=AuditAction.CREATE,
             resource_type=AuditResource.VPS,
@@ -177,20 +328,239 @@ async def create_vps(
     except Exception:
         pass
 
-    # TODO: Trigger provisioning task via Celery
-    
-    return vps
+    await dispatch([job_id])
+    return _with_job(vps, job_id)
+
+
+def _expand_bulk(bulk: VPSBulkCreate) -> List[VPSCreate]:
+    if (bulk.items is None) == (bulk.count is None):
+        raise HTTPException(status_code=422, detail="Give either items or count")
+    if bulk.items is not None:
+        items = bulk.items
+    else:
+        if bulk.spec is None:
+            raise HTTPException(status_code=422, detail="count needs a spec")
+        if bulk.count < 1 or bulk.count > settings.VPS_BULK_MAX:
+            raise HTTPException(status_code=422, detail=f"count must be 1..{settings.VPS_BULK_MAX}")
+        try:
+            names = [bulk.name_pattern.format(n=bulk.start + k) for k in range(bulk.count)]
+        except (KeyError, IndexError, ValueError):
+            raise HTTPException(status_code=422, detail="name_pattern may only use {n}")
+        items = [VPSCreate(name=name, **bulk.spec.model_dump()) for name in names]
+    if not items or len(items) > settings.VPS_BULK_MAX:
+        raise HTTPException(status_code=422, detail=f"Between 1 and {settings.VPS_BULK_MAX} VPSes per request")
+    return items
+
+
+async def _existing(db: AnySession, column, ids) -> set:
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    return set((await db.scalars(select(column).where(column.in_(ids)))).all())
+
+
+@router.post("/bulk", response_model=VPSBulkResult, status_code=status.HTTP_202_ACCEPTED)
+async def create_vps_bulk(
+    bulk: VPSBulkCreate,
+    response: Response,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Create many VPSes in one transaction (admin only), one job each; 207 with per-item errors if some fail"""
+    items = _expand_bulk(bulk)
+    results: List[Optional[VPSBulkItem]] = [None] * len(items)
+
+    def fail(i: int, code: int, error: str) -> None:
+        results[i] = VPSBulkItem(index=i, name=items[i].name, status_code=code, error=error)
+
+    # Validate images, owners and templates once for the whole batch
+    images = await _existing(db, OSImage.id, (item.os_image_id for item in items))
+    owners = await _existing(db, User.id, (item.owner_id for item in items))
+    templates = await _existing(db, VPSTemplate.id, (item.template_id for item in items))
+    valid = []
+    for i, item in enumerate(items):
+        if item.os_image_id not in images:
+            fail(i, 404, "OS image not found")
+        elif item.owner_id not in owners:
+            fail(i, 404, "Owner user not found")
+        elif item.template_id is not None and item.template_id not in templates:
+            fail(i, 404, "Template not found")
+        elif item.network_type not in NetworkType._value2member_map_:
+            fail(i, 422, f"Invalid network_type {item.network_type!r}")
+        elif item.expiration_action not in ExpirationAction._value2member_map_:
+            fail(i, 422, f"Invalid expiration_action {item.expiration_action!r}")
+        else:
+            valid.append(i)
+
+    # Place the whole batch together; the capacity is reserved in this transaction
+    created = []
+    job_ids = []
+    try:
+        reservations = await scheduler.place_many(
+            db, [Resources(items[i].cpu_cores, items[i].ram_gb, items[i].storage_gb) for i in valid]
+        )
+        groups = defaultdict(list)
+        for i, reservation in zip(valid, reservations):
+            if reservation is None:
+                fail(i, 409, "No ONLINE host has capacity for this VPS")
+            else:
+                groups[NetworkType(items[i].network_type), reservation.host_id].append((i, reservation))
+
+        # Addresses for each (network type, host) group; a VPS left without one gives its capacity back
+        for (network_type, host_id), members in groups.items():
+            addresses = await allocate_addresses(db, network_type, host_id, len(members))
+            for k, (i, reservation) in enumerate(members):
+                if k < len(addresses):
+                    created.append((i, _new_vps(items[i], host_id, addresses[k]), reservation))
+                else:
+                    await scheduler.release(db, host_id, reservation.resources)
+                    fail(i, 409, f"No free {network_type.value} address")
+
+        if created:
+            db.add_all([vps for _, vps, _ in created])
+            await db.flush()
+            jobs = [enqueue(db, JobKind.CREATE, vps.id, current_user.id) for _, vps, _ in created]
+            await db.flush()
+            job_ids = [job.id for job in jobs]
+            await db.execute(insert(AuditLog), [
+                dict(
+                    user_id=current_user.id,
+                    action=AuditAction.CREATE,
+                    resource_type=AuditResource.VPS,
+                    resource_id=vps.id,
+                    resource_uuid=vps.uuid,
+                    details={"start_on_create": vps.start_on_create, "bulk": True},
+                )
+                for _, vps, _ in created
+            ])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        scheduler.invalidate()
+        raise
+
+    if created:
+        # Reload server defaults (created_at) for all of them in one query
+        ids = [vps.id for _, vps, _ in created]
+        await db.scalars(select(VPS).where(VPS.id.in_(ids)).execution_options(populate_existing=True))
+    for (i, vps, _), job_id in zip(created, job_ids):
+        results[i] = VPSBulkItem(
+            index=i, name=vps.name, status_code=202, vps=VPSResponse.model_validate(vps), job_id=job_id
+        )
+    await dispatch(job_ids)
 
+    if len(created) < len(items):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return VPSBulkResult(created=len(created), failed=len(items) - len(created), results=results)
+
+
+def _action_scope(batch: VPSActionRequest, current_user: User) -> list:
+    """WHERE criteria for the VPSes a batch action is aimed at (users only reach their own by filter)"""
+    if batch.ids is not None:
+        if batch.owner_id is not None or batch.host_id is not None or batch.status is not None:
+            raise HTTPException(status_code=422, detail="Give either ids or filters")
+        if not batch.ids or len(batch.ids) > settings.VPS_ACTION_MAX:
+            raise HTTPException(status_code=422, detail=f"Between 1 and {settings.VPS_ACTION_MAX} ids per request")
+        return [VPS.id.in_(set(batch.ids))]
+    criteria = []
+    if batch.owner_id is not None:
+        criteria.append(VPS.owner_id == batch.owner_id)
+    if batch.host_id is not None:
+        criteria.append(VPS.host_id == batch.host_id)
+    if batch.status is not None:
+        if batch.status not in VPSStatus._value2member_map_:
+            raise HTTPException(status_code=422, detail=f"Invalid status {batch.status!r}")
+        criteria.append(VPS.status == VPSStatus(batch.status))
+    if not criteria:
+        raise HTTPException(status_code=422, detail="Give ids or at least one filter")
+    if current_user.role == UserRole.USER:
+        criteria.append(VPS.owner_id == current_user.id)
+    return criteria
+
+
+@router.post("/actions", response_model=VPSActionResult, status_code=status.HTTP_202_ACCEPTED)
+async def batch_action(
+    batch: VPSActionRequest,
+    response: Response,
+    db: AnySession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Start, stop or reboot many VPSes at once: one job each; 207 with per-VPS errors if some are skipped"""
+    if batch.action not in BATCH_ACTIONS:
+        raise HTTPException(status_code=422, detail=f"action must be one of {', '.join(BATCH_ACTIONS)}")
+    kind, audit_action, allowed = BATCH_ACTIONS[batch.action]
+    scope = _action_scope(batch, current_user)
 
-@router.patch("/{vps_id}", response_model=VPSResponse)
+    # What the request is aimed at, for the per-VPS outcomes (and their uuids for the audit rows)
+    targets = (await db.execute(
+        select(VPS.id, VPS.uuid, VPS.status, VPS.owner_id, exists().where(Job.vps_id == VPS.id, Job.status.in_(ACTIVE)))
+        .where(*scope).order_by(VPS.id).limit(settings.VPS_ACTION_MAX + 1)
+    )).all()
+    if len(targets) > settings.VPS_ACTION_MAX:
+        raise HTTPException(status_code=422, detail=f"Filter matches more than {settings.VPS_ACTION_MAX} VPSes")
+
+    # One INSERT ... SELECT queues every eligible VPS; its WHERE is the authority, not the read above
+    eligible = [*scope, VPS.status.in_(allowed)]
+    if current_user.role == UserRole.USER:
+        eligible.append(VPS.owner_id == current_user.id)
+    try:
+        queued = {vps_id: job_id for job_id, vps_id in await enqueue_where(db, kind, current_user.id, *eligible)}
+        uuids = {vps_id: uuid for vps_id, uuid, *_ in targets}
+        if queued:
+            await db.execute(insert(AuditLog), [
+                dict(
+                    user_id=current_user.id,
+                    action=audit_action,
+                    resource_type=AuditResource.VPS,
+                    resource_id=vps_id,
+                    resource_uuid=uuids.get(vps_id),
+                    details={"batch": True, "job_id": job_id},
+                )
+                for vps_id, job_id in queued.items()
+            ])
+        await db.commit()
+    except IntegrityError:
+        # A job was queued on one of these VPSes since the INSERT's snapshot
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A job was queued on one of these VPSes meanwhile; retry")
+    except Exception:
+        await db.rollback()
+        raise
+    await dispatch(queued.values())
+
+    results = []
+    for vps_id, _, vps_status, owner_id, busy in targets:
+        if vps_id in queued:
+            results.append(VPSActionItem(vps_id=vps_id, status_code=202, job_id=queued[vps_id]))
+        elif current_user.role == UserRole.USER and owner_id != current_user.id:
+            results.append(VPSActionItem(vps_id=vps_id, status_code=403, error="Access denied"))
+        elif vps_status not in allowed:
+            results.append(VPSActionItem(vps_id=vps_id, status_code=400,
+                                         error=f"Cannot {batch.action} a {vps_status.value} VPS"))
+        else:
+            results.append(VPSActionItem(vps_id=vps_id, status_code=409, error=JOB_IN_PROGRESS))
+    found = {item.vps_id for item in results}
+    results += [
+        VPSActionItem(vps_id=vps_id, status_code=404, error="VPS not found")
+        for vps_id in sorted(set(batch.ids or ())) if vps_id not in found
+    ]
+
+    if len(queued) < len(results):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return VPSActionResult(action=batch.action, queued=len(queued), failed=len(results) - len(queued),
+                           results=results)
+
+
+@router.patch("/{vps_id}", response_model=VPSJobResponse)
 async def update_vps(
     vps_id: int,
     vps_data: VPSUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Update VPS"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    """Update VPS; a spec change is applied by a resize job (202)"""
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
@@ -213,30 +583,76 @@ async def update_vps(
         vps.expiration_action = ExpirationAction(vps_data.expiration_action)
     
     # Admin-only updates
+    reservation = None
+    resize = False
     if current_user.role != UserRole.USER:
+        delta = Resources(
+            (vps_data.cpu_cores or vps.cpu_cores) - vps.cpu_cores,
+            (vps_data.ram_gb or vps.ram_gb) - vps.ram_gb,
+            (vps_data.storage_gb or vps.storage_gb) - vps.storage_gb,
+        )
+        if vps.host_id and delta != Resources(0, 0, 0):
+            await _ensure_idle(db, vps)
+            # A resize stays on the same host: grow only if it still fits there
+            if max(delta.cpu, delta.ram, delta.storage) > 0:
+                if not await scheduler.reserve_on(db, vps.host_id, delta):
+                    raise HTTPException(status_code=409, detail="Host has no capacity for this resize")
+            else:
+                await scheduler.release(db, vps.host_id, -delta)
+            reservation = Reservation(vps.host_id, delta)
+            resize = True
         if vps_data.cpu_cores:
             vps.cpu_cores = vps_data.cpu_cores
         if vps_data.ram_gb:
             vps.ram_gb = vps_data.ram_gb
         if vps_data.storage_gb:
             vps.storage_gb = vps_data.storage_gb
-    
-    db.commit()
-    db.refresh(vps)
-    
-    # TODO: Trigger resize task if specs changed
-    
-    return vps
 
+    job_id = None
+    try:
+        if resize:
+            job = enqueue(db, JobKind.RESIZE, vps.id, current_user.id,
+                          {"cpu_cores": vps.cpu_cores, "ram_gb": vps.ram_gb, "storage_gb": vps.storage_gb})
+            await db.flush()
+            job_id = job.id
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        if reservation:
+            scheduler.abort(reservation)
+        if isinstance(e, IntegrityError):
+            raise HTTPException(status_code=409, detail=JOB_IN_PROGRESS)
+        raise
+    await db.refresh(vps)
+
+    if job_id is not None:
+        await dispatch([job_id])
+        response.status_code = status.HTTP_202_ACCEPTED
+    return _with_job(vps, job_id)
 
-@router.post("/{vps_id}/start")
+
+async def _queue_job(db: AnySession, kind: JobKind, vps: VPS, user_id: int) -> int:
+    """Commit a job for ``vps`` (409 while another one is in flight) and return its id"""
+    await _ensure_idle(db, vps)
+    job = enqueue(db, kind, vps.id, user_id)
+    try:
+        await db.flush()
+        job_id = job.id
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=JOB_IN_PROGRESS)
+    return job_id
+
+
+@router.post("/{vps_id}/start", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def start_vps(
     vps_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Start VPS"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
@@ -247,12 +663,11 @@ async def start_vps(
     if vps.status == VPSStatus.RUNNING:
         raise HTTPException(status_code=400, detail="VPS is already running")
     
-    vps.status = VPSStatus.RUNNING
-    db.commit()
+    job_id = await _queue_job(db, JobKind.START, vps, current_user.id)
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=current_user.id,
             action=AuditAction.START,
             resource_type=AuditResource.VPS,
@@ -261,20 +676,19 @@ async def start_vps(
         )
     except Exception:
         pass
-
-    # TODO: Trigger start task via Celery
     
-    return {"message": "VPS start initiated", "status": vps.status.value}
+    await dispatch([job_id])
+    return {"message": "VPS start initiated", "status": vps.status.value, "job_id": job_id}
 
 
-@router.post("/{vps_id}/stop")
+@router.post("/{vps_id}/stop", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def stop_vps(
     vps_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Stop VPS"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
@@ -285,12 +699,11 @@ async def stop_vps(
     if vps.status == VPSStatus.STOPPED:
         raise HTTPException(status_code=400, detail="VPS is already stopped")
     
-    vps.status = VPSStatus.STOPPED
-    db.commit()
+    job_id = await _queue_job(db, JobKind.STOP, vps, current_user.id)
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=current_user.id,
             action=AuditAction.STOP,
             resource_type=AuditResource.VPS,
@@ -299,20 +712,19 @@ async def stop_vps(
         )
     except Exception:
         pass
-
-    # TODO: Trigger stop task via Celery
     
-    return {"message": "VPS stop initiated", "status": vps.status.value}
+    await dispatch([job_id])
+    return {"message": "VPS stop initiated", "status": vps.status.value, "job_id": job_id}
 
 
-@router.post("/{vps_id}/reboot")
+@router.post("/{vps_id}/reboot", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def reboot_vps(
     vps_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Reboot VPS"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
@@ -323,11 +735,11 @@ async def reboot_vps(
     if vps.status != VPSStatus.RUNNING:
         raise HTTPException(status_code=400, detail="VPS must be running to reboot")
     
-    # TODO: Trigger reboot task via Celery
+    job_id = await _queue_job(db, JobKind.REBOOT, vps, current_user.id)
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=current_user.id,
             action=AuditAction.REBOOT,
             resource_type=AuditResource.VPS,
@@ -337,27 +749,49 @@ async def reboot_vps(
     except Exception:
         pass
 
-    return {"message": "VPS reboot initiated"}
+    await dispatch([job_id])
+    return {"message": "VPS reboot initiated", "status": vps.status.value, "job_id": job_id}
 
 
-@router.delete("/{vps_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{vps_id}", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def delete_vps(
     vps_id: int,
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_async_db),
     current_user: User = Depends(get_current_admin)
 ):
-    """Delete VPS (admin only)"""
-    vps = db.query(VPS).filter(VPS.id == vps_id).first()
+    """Delete VPS (admin only); a job destroys the domain and removes the row"""
+    vps = await db.get(VPS, vps_id)
     
     if not vps:
         raise HTTPException(status_code=404, detail="VPS not found")
-    
+    await _ensure_idle(db, vps)
+
+    # Hand the VPS's address and capacity back once, on the move to DELETING
+    reservation = None
+    if vps.status != VPSStatus.DELETING:
+        await release_addresses(db, vps.network_type, vps.host_id, [vps.public_ipv4, vps.private_ip])
+    if vps.host_id and vps.status != VPSStatus.DELETING:
+        freed = Resources(vps.cpu_cores, vps.ram_gb, vps.storage_gb)
+        await scheduler.release(db, vps.host_id, freed)
+        reservation = Reservation(vps.host_id, -freed)
     vps.status = VPSStatus.DELETING
-    db.commit()
+    try:
+        job = enqueue(db, JobKind.DELETE, vps.id, current_user.id)
+        await db.flush()
+        job_id = job.id
+        await db.commit()
+    except Exception as e:
+        # Also undoes the releases above when a racing request got its job in first
+        await db.rollback()
+        if reservation:
+            scheduler.abort(reservation)
+        if isinstance(e, IntegrityError):
+            raise HTTPException(status_code=409, detail=JOB_IN_PROGRESS)
+        raise
     # Audit
     try:
-        record_audit(
-            db,
+        await db.run_sync(
+            record_audit,
             user_id=current_user.id,
             action=AuditAction.DELETE,
             resource_type=AuditResource.VPS,
@@ -366,8 +800,6 @@ async def delete_vps(
         )
     except Exception:
         pass
-
-    # TODO: Trigger delete task via Celery
     
-    return None
-
+    await dispatch([job_id])
+    return {"message": "VPS deletion initiated", "status": VPSStatus.DELETING.value, "job_id": job_id}
@@ -1,10 +1,149 @@
 """
 Audit logging helpers.
+
+With AUDIT_ASYNC enabled (the default), ``record_audit`` only enqueues the
+entry; a background thread bulk-inserts queued entries in one executemany
+per batch, once AUDIT_BATCH_SIZE entries are waiting or AUDIT_FLUSH_SECONDS
+after the first one arrived. Entries are timestamped when recorded, not when
+written. When the queue is full the AUDIT_OVERFLOW policy applies: "inline"
+writes that entry synchronously on the caller's session, "drop" discards it
+(counted in ``audit_events_total{outcome="dropped"}``). A batch insert that
+fails is retried once, then written row by row so that only the rows the
+database rejects are lost (counted in ``audit_events_total{outcome="failed"}``).
+The lifespan drains the queue on shutdown.
 """
-from typing import Optional, Dict, Any
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from prometheus_client import Counter, Gauge
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import engine as default_engine
 from app.models.audit_log import AuditLog, AuditAction, AuditResource
 
+logger = logging.getLogger(__name__)
+
+AUDIT_EVENTS = Counter("audit_events_total", "Audit entries by outcome", ["outcome"])
+AUDIT_QUEUE_DEPTH = Gauge("audit_queue_depth", "Audit entries waiting to be written")
+
+_FLUSH = object()
+_STOP = object()
+
+
+class AuditWriter:
+    """Bounded queue of audit rows drained by one bulk-inserting thread"""
+
+    def __init__(
+        self,
+        engine=default_engine,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self) -> None:
+        # Started lazily so forked workers each get their own thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue one row; False if the queue is full"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            return False
+        AUDIT_EVENTS.labels("queued").inc()
+        return True
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """Drain the queue and stop the thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[Dict[str, Any]] = []
+            taken = 0
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is _STOP:
+                    stop = True
+                    break
+                if item is _FLUSH:
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(insert(AuditLog), rows)
+        AUDIT_EVENTS.labels("written").inc(len(rows))
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(2):
+            try:
+                self._insert(batch)
+                return
+            except Exception:
+                logger.warning("audit_flush_failed", extra={"rows": len(batch), "attempt": attempt + 1}, exc_info=True)
+        # Still failing: isolate the rows the database won't take
+        for row in batch:
+            try:
+                self._insert([row])
+            except Exception:
+                logger.exception("audit_row_dropped", extra={"action": str(row.get("action"))})
+                AUDIT_EVENTS.labels("failed").inc()
+
+
+audit_writer = AuditWriter(
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_SECONDS,
+)
+AUDIT_QUEUE_DEPTH.set_function(lambda: len(audit_writer))
+
 
 def record_audit(
     db: Session,
@@ -18,7 +157,7 @@ def record_audit(
     user_agent: Optional[str] = None,
     details: Optional[Dict[str, Any]] = None,
 ) -> None:
-    log = AuditLog(
+    row = dict(
         user_id=user_id,
         action=action,
         resource_type=resource_type,
@@ -28,7 +167,13 @@ def record_audit(
         user_agent=user_agent,
         details=details or {},
     )
-    db.add(log)
+    if settings.AUDIT_ASYNC:
+        row["created_at"] = datetime.utcnow()
+        if audit_writer.submit(row):
+            return
+        if settings.AUDIT_OVERFLOW == "drop":
+            AUDIT_EVENTS.labels("dropped").inc()
+            return
+    AUDIT_EVENTS.labels("inline").inc()
+    db.add(AuditLog(**row))
     db.commit()
-
-
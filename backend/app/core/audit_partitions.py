@@ -0,0 +1,310 @@
+"""
+Monthly audit log partitions, retention and archival.
+
+On Postgres, audit_logs is natively partitioned by RANGE (created_at), with
+one audit_logs_YYYYMM partition per month (migration 0005).
+``ensure_partitions`` keeps this month's and next month's partitions created
+ahead of the writers, and the planner prunes partitions for any query that
+bounds created_at.
+
+SQLite has no partitioning. audit_logs holds the current month, and
+``ensure_partitions`` moves each closed month into its own audit_logs_YYYYMM
+table. ``audit_source`` builds the listing's FROM clause: audit_logs alone,
+or a UNION ALL with only the month tables that a time range overlaps. A
+listing without ``since`` covers the last AUDIT_LIST_MONTHS months
+(``listing_since``) rather than every month kept.
+
+``apply_retention`` handles months older than AUDIT_RETENTION_MONTHS. It
+writes each one to a gzip'd JSONL segment named audit_logs_YYYYMM.jsonl.gz
+under AUDIT_ARCHIVE_URL, then detaches the partition (Postgres) and drops it.
+``maintain`` runs both steps under a cluster-wide lock. The lifespan calls it
+every AUDIT_MAINTENANCE_SECONDS; ``python -m app.core.audit_partitions``
+runs a single pass.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Dict, List, Optional
+from prometheus_client import Counter
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, inspect, select, text, union_all
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import aliased
+from app.core.bootstrap import audit_logs_partitioned, cluster_lock
+from app.core.config import settings
+from app.core.database import AnySession, engine
+from app.models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+PARTITION_RE = re.compile(r"^audit_logs_(\d{4})(\d{2})$")
+ROLLOVER_BATCH = 10000
+
+AUDIT_ARCHIVED_ROWS = Counter("audit_archived_rows_total", "Audit rows written to archive segments")
+
+_tables: Dict[str, Table] = {}
+
+
+def month_floor(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """Aware datetimes converted to naive UTC, the form audit rows are stored in"""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def partition_name(month: datetime) -> str:
+    return f"audit_logs_{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    match = PARTITION_RE.match(name)
+    return datetime(int(match[1]), int(match[2]), 1) if match else None
+
+
+def partition_table(name: str) -> Table:
+    """A month table with audit_logs' columns and (renamed) indexes"""
+    table = _tables.get(name)
+    if table is None:
+        source = AuditLog.__table__
+        table = Table(name, MetaData(), *(
+            Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in source.columns
+        ))
+        for index in source.indexes:
+            Index(index.name.replace("audit_logs", name, 1), *(table.c[c.name] for c in index.columns))
+        _tables[name] = table
+    return table
+
+
+def list_partitions(conn: Connection) -> List[str]:
+    """Month tables, oldest first (on Postgres including detached ones)"""
+    return sorted(name for name in inspect(conn).get_table_names() if PARTITION_RE.match(name))
+
+
+def _attached(conn: Connection) -> set:
+    return set(conn.scalars(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'audit_logs'"
+    )))
+
+
+# -- partition creation -------------------------------------------------
+
+def ensure_partitions(db_engine: Engine = engine, now: Optional[datetime] = None) -> List[str]:
+    """Create upcoming partitions (Postgres) or roll closed months out of audit_logs (SQLite)"""
+    current = month_floor(now or datetime.utcnow())
+    if db_engine.dialect.name == "postgresql":
+        return _create_pg_partitions(db_engine, current)
+    if db_engine.dialect.name == "sqlite":
+        return _roll_over(db_engine, current)
+    return []
+
+
+def _create_pg_partitions(db_engine: Engine, current: datetime) -> List[str]:
+    created = []
+    with db_engine.begin() as conn:
+        if not audit_logs_partitioned(conn):
+            # Nothing would ever be created or archived: say so instead of passing quietly
+            raise RuntimeError("audit_logs is not partitioned; run the migrations (alembic upgrade head)")
+        attached = _attached(conn)
+        for month in (current, add_months(current, 1)):
+            name = partition_name(month)
+            if name not in attached:
+                conn.exec_driver_sql(
+                    f"CREATE TABLE {name} PARTITION OF audit_logs FOR VALUES "
+                    f"FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00+00')"
+                )
+                created.append(name)
+    return created
+
+
+def _roll_over(db_engine: Engine, current: datetime) -> List[str]:
+    """Move rows from before this month into their month tables, ROLLOVER_BATCH per transaction"""
+    live = AuditLog.__table__
+    moved: List[str] = []
+    while True:
+        with db_engine.begin() as conn:
+            oldest = conn.scalar(select(func.min(live.c.created_at)).where(live.c.created_at < current))
+            if oldest is None:
+                return moved
+            month = month_floor(oldest)
+            table = partition_table(partition_name(month))
+            table.create(conn, checkfirst=True)
+            in_month = (live.c.created_at >= month) & (live.c.created_at < add_months(month, 1))
+            batch = select(live.c.id).where(in_month).order_by(live.c.id).limit(ROLLOVER_BATCH)
+            conn.execute(insert(table).from_select(list(live.c.keys()), select(live).where(live.c.id.in_(batch))))
+            conn.execute(delete(live).where(live.c.id.in_(batch)))
+        if table.name not in moved:
+            moved.append(table.name)
+
+
+# -- reads --------------------------------------------------------------
+
+async def audit_source(db: AnySession, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    The entity to list audit logs from for created_at in [since, until). On
+    SQLite this unions in just the overlapping month tables; Postgres prunes
+    natively, so it is always AuditLog. The layout follows the session's own
+    database, which may be a replica or not DATABASE_URL at all.
+    """
+    if db.get_bind(AuditLog).dialect.name != "sqlite":
+        return AuditLog
+    names = (await db.scalars(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'audit_logs_[0-9]*'"
+    ))).all()
+    overlapping = []
+    for name in sorted(names):
+        month = partition_month(name)
+        if month is None:
+            continue
+        if since is not None and add_months(month, 1) <= since:
+            continue
+        if until is not None and month >= until:
+            continue
+        overlapping.append(name)
+    if not overlapping:
+        return AuditLog
+    union = union_all(select(AuditLog.__table__), *(select(partition_table(name)) for name in overlapping))
+    return aliased(AuditLog, union.subquery("audit_logs_all"))
+
+
+def listing_since(until: Optional[datetime] = None, months: Optional[int] = None) -> datetime:
+    """Where a listing without ``since`` starts: the AUDIT_LIST_MONTHS months up to ``until`` (or now)"""
+    months = settings.AUDIT_LIST_MONTHS if months is None else months
+    return add_months(month_floor(until or datetime.utcnow()), 1 - max(1, months))
+
+
+# -- retention ----------------------------------------------------------
+
+class LocalArchive:
+    """Segments kept in a local directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def put(self, key: str, path: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        shutil.move(path, os.path.join(self.directory, key))
+
+
+class S3Archive:
+    """Segments uploaded to an S3-compatible bucket (the S3_* settings)"""
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT,
+            aws_access_key_id=settings.S3_ACCESS_KEY,
+            aws_secret_access_key=settings.S3_SECRET_KEY,
+            region_name=settings.S3_REGION,
+        )
+
+    def put(self, key: str, path: str) -> None:
+        self.client.upload_file(path, self.bucket, f"{self.prefix}{key}")
+        os.remove(path)
+
+
+def archive_from_url(url: str):
+    """``s3://bucket/prefix`` or a local directory"""
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3Archive(bucket, prefix.rstrip("/") + "/" if prefix else "")
+    return LocalArchive(url)
+
+
+def _jsonable(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def expired_partitions(conn: Connection, current: datetime, retention_months: int) -> List[str]:
+    """Month tables that ended more than ``retention_months`` before ``current``"""
+    cutoff = add_months(current, -retention_months)
+    return [name for name in list_partitions(conn) if add_months(partition_month(name), 1) <= cutoff]
+
+
+def archive_partition(db_engine: Engine, name: str, sink) -> int:
+    """Detach one month, write it out as a segment, then drop it. Returns its row count"""
+    table = partition_table(name)
+    if db_engine.dialect.name == "postgresql":
+        with db_engine.begin() as conn:
+            if name in _attached(conn):
+                conn.exec_driver_sql(f"ALTER TABLE audit_logs DETACH PARTITION {name}")
+    fd, path = tempfile.mkstemp(suffix=".jsonl.gz")
+    rows = 0
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as out:
+            with db_engine.connect() as conn:
+                result = conn.execution_options(yield_per=1000).execute(select(table).order_by(table.c.id))
+                for row in result.mappings():
+                    out.write(json.dumps({k: _jsonable(v) for k, v in row.items()}, separators=(",", ":")))
+                    out.write("\n")
+                    rows += 1
+        sink.put(f"{name}.jsonl.gz", path)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    with db_engine.begin() as conn:
+        table.drop(conn)
+    AUDIT_ARCHIVED_ROWS.inc(rows)
+    return rows
+
+
+def apply_retention(db_engine: Engine = engine, now: Optional[datetime] = None,
+                    retention_months: Optional[int] = None, sink=None) -> List[str]:
+    """Archive and drop every month past retention (0 months keeps everything)"""
+    months = settings.AUDIT_RETENTION_MONTHS if retention_months is None else retention_months
+    if months <= 0:
+        return []
+    with db_engine.connect() as conn:
+        expired = expired_partitions(conn, month_floor(now or datetime.utcnow()), months)
+    if expired and sink is None:
+        sink = archive_from_url(settings.AUDIT_ARCHIVE_URL)
+    for name in expired:
+        rows = archive_partition(db_engine, name, sink)
+        logger.info(f"audit_partition_archived name={name} rows={rows}")
+    return expired
+
+
+def maintain(db_engine: Engine = engine, now: Optional[datetime] = None,
+             retention_months: Optional[int] = None, sink=None) -> Dict[str, List[str]]:
+    """One pass of partition creation/rollover and retention"""
+    with cluster_lock(db_engine, "audit-maintenance"):
+        partitioned = ensure_partitions(db_engine, now)
+        archived = apply_retention(db_engine, now, retention_months, sink)
+    return {"partitioned": partitioned, "archived": archived}
+
+
+async def maintenance_loop(interval: float) -> None:
+    """Run ``maintain`` off the event loop every ``interval`` seconds"""
+    while True:
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception:
+            logger.exception("audit_maintenance_failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print(maintain())
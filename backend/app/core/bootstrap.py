@@ -0,0 +1,311 @@
+"""
+Startup bootstrap: schema migrations and fixture seeding, once per cluster.
+
+Each worker boot reads one marker row (``app_state['bootstrap']``) recording
+the Alembic head and FIXTURES_VERSION the database was last brought up to.
+When it matches this build, startup touches nothing else. Otherwise the worker
+takes a cluster-wide lock (``pg_advisory_lock`` on Postgres, a lock file next
+to a SQLite database), re-checks the marker, then migrates, seeds and writes
+it; workers that queued on the lock find the marker current and move on.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from prometheus_client import Gauge
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, OperationalError, ProgrammingError
+from app.core.config import settings
+from app.core.counters import reconcile
+from app.core.database import Base, SessionLocal, engine
+from app.core.ipam import create_pool
+from app.core.security import password_hasher
+from app.models.app_state import AppState
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage, ImageFormat
+from app.models.ip_pool import IPPool
+from app.models.user import User, UserRole
+from app.models.vps import NetworkType
+import app.models  # noqa: F401  (register tables)
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the seed data below changes
+FIXTURES_VERSION = 2
+BOOTSTRAP_KEY = "bootstrap"
+# pg_advisory_lock keys per lock name; any constants shared by every worker
+_ADVISORY_LOCK_IDS = {"bootstrap": 0x56505350, "audit-maintenance": 0x56505351, "vps-stats": 0x56505352}
+_BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+BOOTSTRAP_SECONDS = Gauge(
+    "app_bootstrap_seconds", "Duration of the last startup bootstrap", ["outcome"]
+)
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(str(_BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(_BACKEND_DIR / "alembic"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def expected_marker() -> str:
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    return f"{head}:{FIXTURES_VERSION}"
+
+
+def read_marker(db_engine: Engine) -> Optional[str]:
+    """The stored marker, or None on a fresh or pre-marker database"""
+    try:
+        with db_engine.connect() as conn:
+            return conn.scalar(select(AppState.value).where(AppState.key == BOOTSTRAP_KEY))
+    except (OperationalError, ProgrammingError):
+        return None
+
+
+@contextmanager
+def cluster_lock(db_engine: Engine, name: str = "bootstrap"):
+    """Serialize a job across every worker sharing the database"""
+    url = db_engine.url
+    if url.get_backend_name() == "postgresql":
+        lock_id = _ADVISORY_LOCK_IDS[name]
+        with db_engine.connect() as conn:
+            conn.exec_driver_sql(f"SELECT pg_advisory_lock({lock_id})")
+            try:
+                yield
+            finally:
+                conn.exec_driver_sql(f"SELECT pg_advisory_unlock({lock_id})")
+        return
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        import fcntl
+        with open(f"{url.database}.{name}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    yield
+
+
+class ClusterLeader:
+    """
+    One worker at a time for a long-running job: the first to find the cluster
+    lock ``name`` free keeps it until ``release`` (or until its Postgres session
+    ends); the others see it taken whenever they ask, and one of them takes
+    over once it is free again.
+    """
+
+    def __init__(self, db_engine: Engine, name: str):
+        self.engine = db_engine
+        self.name = name
+        self._held = None  # The connection or lock file holding the lock
+
+    def acquire(self) -> bool:
+        """Whether this worker leads, taking the lock if it is free (never waits)"""
+        if self._held is not None:
+            if self._still_held():
+                return True
+            self.release()
+        url = self.engine.url
+        if url.get_backend_name() == "postgresql":
+            conn = self.engine.connect()
+            try:
+                locked = conn.scalar(text(f"SELECT pg_try_advisory_lock({_ADVISORY_LOCK_IDS[self.name]})"))
+                conn.commit()  # The lock belongs to the session: don't sit idle in a transaction
+            except Exception:
+                conn.close()
+                raise
+            if not locked:
+                conn.close()
+                return False
+            self._held = conn
+            return True
+        if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+            import fcntl
+            lock_file = open(f"{url.database}.{self.name}.lock", "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            self._held = lock_file
+            return True
+        self._held = True  # Nothing to share the database with
+        return True
+
+    def _still_held(self) -> bool:
+        if not isinstance(self._held, Connection):
+            return True
+        try:
+            self._held.exec_driver_sql("SELECT 1")
+            self._held.commit()
+            return True
+        except DBAPIError:
+            # The session is gone and the lock with it: another worker may lead already
+            logger.warning(f"cluster_leader_lost name={self.name} pid={os.getpid()}")
+            return False
+
+    def release(self) -> None:
+        held, self._held = self._held, None
+        if isinstance(held, Connection):
+            try:
+                held.exec_driver_sql(f"SELECT pg_advisory_unlock({_ADVISORY_LOCK_IDS[self.name]})")
+            except DBAPIError:
+                pass  # Lost with the session
+            held.close()
+        elif held is not None and held is not True:
+            held.close()  # Drops the flock
+
+
+def migrate(db_engine: Engine) -> None:
+    """Bring the schema to the Alembic head"""
+    with db_engine.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+        config = alembic_config(conn)
+        if "alembic_version" not in tables and tables:
+            if _matches_models(conn):
+                # Built by create_all from this build's models: already head,
+                # except that Postgres' audit_logs still needs 0005's partitioning
+                if conn.dialect.name == "postgresql":
+                    command.stamp(config, "0004")
+                    conn.commit()
+                    command.upgrade(config, "0005")
+                command.stamp(config, "head")
+            else:
+                # Built by create_all before migrations existed: that schema is 0001
+                command.stamp(config, "0001")
+        conn.commit()  # End the inspection's transaction: migrations manage their own
+        # Run the whole chain even on a fresh database: create_all would leave
+        # Postgres' audit_logs unpartitioned (0005)
+        command.upgrade(config, "head")
+        conn.commit()
+        if conn.dialect.name == "postgresql" and not audit_logs_partitioned(conn):
+            raise RuntimeError("audit_logs is not partitioned after migrating; check migration 0005")
+
+
+def _matches_models(conn) -> bool:
+    """Whether every table, column and index of the current models exists (extra objects are ignored)"""
+    diffs = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    return not [diff for diff in diffs if not (isinstance(diff, tuple) and diff[0].startswith("remove_"))]
+
+
+def audit_logs_partitioned(conn) -> bool:
+    """Whether Postgres' audit_logs is the partitioned table from migration 0005"""
+    return conn.scalar(text("SELECT relkind FROM pg_class WHERE relname = 'audit_logs'")) == "p"
+
+
+async def seed_admin_if_missing(session_factory=SessionLocal) -> None:
+    """Create default admin if it doesn't exist."""
+    with session_factory() as db:
+        admin = db.query(User).filter(User.email == "admin@example.com").first()
+        if not admin:
+            admin = User(
+                email="admin@example.com",
+                username="admin",
+                hashed_password=await password_hasher.hash("admin123"),
+                full_name="Administrator",
+                role=UserRole.ADMIN,
+                is_active=True,
+                is_email_verified=True,
+            )
+            db.add(admin)
+            db.commit()
+
+
+def seed_fixtures_if_missing(session_factory=SessionLocal) -> None:
+    """Seed minimal host, images and address pools if none exist."""
+    with session_factory() as db:
+        host = db.query(Host).filter(Host.name == "localhost").first()
+        if not host:
+            host = Host(
+                name="localhost",
+                fqdn="localhost.localdomain",
+                ip_address="127.0.0.1",
+                total_cpu_cores=8,
+                total_ram_gb=32.0,
+                total_storage_gb=500.0,
+                status=HostStatus.ONLINE,
+            )
+            db.add(host)
+
+        ubuntu = db.query(OSImage).filter(OSImage.name == "Ubuntu 22.04 LTS").first()
+        if not ubuntu:
+            ubuntu = OSImage(
+                name="Ubuntu 22.04 LTS",
+                description="Ubuntu Server 22.04 LTS (Jammy)",
+                os_family="ubuntu",
+                os_version="22.04",
+                file_path="/images/ubuntu-22.04.qcow2",
+                file_size_gb=2.5,
+                file_format=ImageFormat.QCOW2,
+                is_public=True,
+                is_active=True,
+            )
+            db.add(ubuntu)
+
+        debian = db.query(OSImage).filter(OSImage.name == "Debian 12").first()
+        if not debian:
+            debian = OSImage(
+                name="Debian 12",
+                description="Debian 12 (Bookworm)",
+                os_family="debian",
+                os_version="12",
+                file_path="/images/debian-12.qcow2",
+                file_size_gb=2.0,
+                file_format=ImageFormat.QCOW2,
+                is_public=True,
+                is_active=True,
+            )
+            db.add(debian)
+
+        if db.query(IPPool).first() is None:
+            for name, cidr, network_type in (
+                ("public-default", settings.IPAM_DEFAULT_PUBLIC_CIDR, NetworkType.PUBLIC_IPV4),
+                ("private-default", settings.IPAM_DEFAULT_PRIVATE_CIDR, NetworkType.PRIVATE_ONLY),
+            ):
+                if cidr:
+                    create_pool(db, name, cidr, network_type)
+
+        db.commit()
+
+
+def write_marker(session_factory, marker: str) -> None:
+    with session_factory() as db:
+        db.merge(AppState(key=BOOTSTRAP_KEY, value=marker))
+        db.commit()
+
+
+async def bootstrap(db_engine: Engine = engine, session_factory=SessionLocal, force: bool = False) -> str:
+    """
+    Migrate and seed unless the stored marker is current. Returns "current"
+    when nothing had to be done, else "bootstrapped".
+    """
+    start = time.perf_counter()
+    marker = expected_marker()
+    outcome = "current"
+    if force or read_marker(db_engine) != marker:
+        with cluster_lock(db_engine):
+            # Another worker may have finished while we waited for the lock
+            if force or read_marker(db_engine) != marker:
+                migrate(db_engine)
+                await seed_admin_if_missing(session_factory)
+                seed_fixtures_if_missing(session_factory)
+                # e.g. entity_counters, counted by 0006 before the rows seeded above
+                reconcile(db_engine)
+                write_marker(session_factory, marker)
+                outcome = "bootstrapped"
+    elapsed = time.perf_counter() - start
+    BOOTSTRAP_SECONDS.labels(outcome).set(elapsed)
+    logger.info(f"startup_bootstrap outcome={outcome} pid={os.getpid()}", extra={"duration_ms": round(elapsed * 1000, 2)})
+    return outcome
@@ -2,7 +2,7 @@
 Application Configuration
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 
@@ -14,6 +14,23 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+
+    # Password hashing pool (0 workers = hash inline on the event loop)
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+    # Authenticated principal cache (0 disables)
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+
+    # Verified JWT payload cache (0 disables)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+    # Token revocation (per-process Bloom filter over the revoked_tokens table)
+    REVOCATION_SYNC_SECONDS: float = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+    REVOCATION_PURGE_SECONDS: float = float(os.getenv("REVOCATION_PURGE_SECONDS", "3600"))
+    REVOCATION_BLOOM_CAPACITY: int = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+    REVOCATION_BLOOM_ERROR_RATE: float = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
     
     # Database
     # Prefer env-provided DB, otherwise default to local SQLite for non-Docker setups
@@ -21,9 +38,86 @@ class Settings(BaseSettings):
         "DATABASE_URL",
         "sqlite:///./app.db"
     )
+    # Connection pool (per engine; ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; -1 disables
+    # SQLite connection profile (WAL + synchronous=NORMAL are always applied)
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # Opt-in native async engine (asyncpg/aiosqlite) for the ported routers
+    DATABASE_ASYNC: bool = os.getenv("DATABASE_ASYNC", "false").lower() == "true"
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")  # Derived from DATABASE_URL if empty
+    # Startup: "auto" migrates/seeds only when the stored bootstrap marker is stale,
+    # "always" forces it, "skip" leaves the database alone
+    STARTUP_MODE: str = os.getenv("STARTUP_MODE", "auto")
+    # Read replicas for GET requests (comma-separated URLs; empty = primary only)
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_EJECT_SECONDS: float = float(os.getenv("REPLICA_EJECT_SECONDS", "30"))
+    # Reads by a user stay on the primary this long after they write
+    REPLICA_STICKY_SECONDS: float = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+    # How long a worker trusts Redis' "no recent write" for a caller before asking again
+    REPLICA_STICKY_RECHECK_SECONDS: float = float(os.getenv("REPLICA_STICKY_RECHECK_SECONDS", "0.5"))
+    
+    # Audit log pipeline (AUDIT_ASYNC=false writes each entry inline, e.g. for tests)
+    AUDIT_ASYNC: bool = os.getenv("AUDIT_ASYNC", "true").lower() == "true"
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_SECONDS: float = float(os.getenv("AUDIT_FLUSH_SECONDS", "0.5"))
+    AUDIT_OVERFLOW: str = os.getenv("AUDIT_OVERFLOW", "inline")  # inline | drop
+    # Monthly audit partitions: months kept in the database (0 keeps all), where
+    # expired months are archived (a directory, or s3://bucket/prefix using the
+    # S3_* settings below) and how often the maintenance job runs (0 disables it)
+    AUDIT_RETENTION_MONTHS: int = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+    AUDIT_ARCHIVE_URL: str = os.getenv("AUDIT_ARCHIVE_URL", "./audit_archive")
+    AUDIT_MAINTENANCE_SECONDS: float = float(os.getenv("AUDIT_MAINTENANCE_SECONDS", "3600"))
+    # Months an audit-log listing without ``since`` reads (the current one included)
+    AUDIT_LIST_MONTHS: int = int(os.getenv("AUDIT_LIST_MONTHS", "3"))
+    
+    # Shared /hosts/stats snapshot: age before a background refresh (0 computes every request)
+    HOST_STATS_TTL_SECONDS: float = float(os.getenv("HOST_STATS_TTL_SECONDS", "5"))
+    
+    # Dashboard counters: how often they are recounted to repair drift (0 disables)
+    COUNTER_RECONCILE_SECONDS: float = float(os.getenv("COUNTER_RECONCILE_SECONDS", "300"))
+    
+    # VPS placement: "best_fit" packs hosts, "spread" picks the emptiest; CPU may be overcommitted
+    SCHEDULER_STRATEGY: str = os.getenv("SCHEDULER_STRATEGY", "best_fit")
+    SCHEDULER_CPU_OVERCOMMIT: float = float(os.getenv("SCHEDULER_CPU_OVERCOMMIT", "1.0"))
+    SCHEDULER_REFRESH_SECONDS: float = float(os.getenv("SCHEDULER_REFRESH_SECONDS", "30"))
+    # Most VPSes one POST /vps/bulk may create
+    VPS_BULK_MAX: int = int(os.getenv("VPS_BULK_MAX", "500"))
+    # Most VPSes one POST /vps/actions may act on (ids given, or matched by its filters)
+    VPS_ACTION_MAX: int = int(os.getenv("VPS_ACTION_MAX", "5000"))
+    # Address pools created at bootstrap when none are defined (empty skips one)
+    IPAM_DEFAULT_PUBLIC_CIDR: str = os.getenv("IPAM_DEFAULT_PUBLIC_CIDR", "203.0.113.0/24")
+    IPAM_DEFAULT_PRIVATE_CIDR: str = os.getenv("IPAM_DEFAULT_PRIVATE_CIDR", "10.0.0.0/16")
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    REDIS_ENABLED: bool = os.getenv("REDIS_ENABLED", "true").lower() == "true"
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+    REDIS_RETRY_SECONDS: float = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+    
+    # Login throttling (in-memory fallback when Redis is unreachable)
+    LOGIN_THROTTLE_MAX_KEYS: int = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+    LOGIN_THROTTLE_SWEEP_SECONDS: float = float(os.getenv("LOGIN_THROTTLE_SWEEP_SECONDS", "60"))
+    
+    # API rate limiting: token buckets written as "<requests>/<seconds>"
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+    RATE_LIMIT_DEFAULT: str = os.getenv("RATE_LIMIT_DEFAULT", "300/60")
+    # Per-role overrides of the per-user bucket ("anonymous" covers unauthenticated clients)
+    RATE_LIMIT_ROLES: Dict[str, str] = {"admin": "1200/60", "anonymous": "120/60"}
+    # Additional per-user buckets for expensive routes, keyed "<METHOD> <route template>"
+    RATE_LIMIT_ROUTES: Dict[str, str] = {
+        "GET /api/v1/vps/": "120/60",
+        "GET /api/v1/hosts/stats": "30/60",
+        "GET /api/v1/admin/dashboard": "30/60",
+        "GET /api/v1/admin/audit-logs/export": "10/60",
+        "POST /api/v1/vps/bulk": "10/60",
+        "POST /api/v1/vps/actions": "10/60",
+    }
     
     # CORS
     CORS_ORIGINS: List[str] = [
@@ -42,10 +136,45 @@ class Settings(BaseSettings):
     
     # Libvirt/KVM
     LIBVIRT_URI: str = os.getenv("LIBVIRT_URI", "qemu:///system")
+    VPS_DISK_DIR: str = os.getenv("VPS_DISK_DIR", "/var/lib/libvirt/images")
+    # Hypervisor driver for VPS jobs: "libvirt" (workers refuse to start without libvirt-python),
+    # or "fake" (in-memory, nothing is provisioned; tests and benchmarks only)
+    HYPERVISOR_DRIVER: str = os.getenv("HYPERVISOR_DRIVER", "libvirt")
+    # Per-host connection pool: threads running blocking calls, calls allowed to wait before new
+    # ones are refused, keepalive probes (interval 0 disables) and the reconnect backoff
+    LIBVIRT_THREADS_PER_HOST: int = int(os.getenv("LIBVIRT_THREADS_PER_HOST", "4"))
+    LIBVIRT_MAX_PENDING_PER_HOST: int = int(os.getenv("LIBVIRT_MAX_PENDING_PER_HOST", "64"))
+    LIBVIRT_KEEPALIVE_INTERVAL: int = int(os.getenv("LIBVIRT_KEEPALIVE_INTERVAL", "5"))
+    LIBVIRT_KEEPALIVE_COUNT: int = int(os.getenv("LIBVIRT_KEEPALIVE_COUNT", "3"))
+    LIBVIRT_RECONNECT_BASE_SECONDS: float = float(os.getenv("LIBVIRT_RECONNECT_BASE_SECONDS", "1"))
+    LIBVIRT_RECONNECT_MAX_SECONDS: float = float(os.getenv("LIBVIRT_RECONNECT_MAX_SECONDS", "60"))
+    # VPS/host usage stats: collection interval (0 disables) and the random delay of up to
+    # JITTER seconds each host's collection starts after, spreading the calls and writes
+    VPS_STATS_INTERVAL_SECONDS: float = float(os.getenv("VPS_STATS_INTERVAL_SECONDS", "10"))
+    VPS_STATS_JITTER_SECONDS: float = float(os.getenv("VPS_STATS_JITTER_SECONDS", "2"))
+    # Usage history (NumPy ring buffers): step:retention per tier, finest first, each step a
+    # multiple of the one before; memory-mapped files under METRICS_DIR, written by the worker
+    # collecting stats and read by the others, so a persistent directory all the API workers
+    # share ("" keeps it in memory, in the collecting worker only), flushed every
+    # METRICS_PERSIST_SECONDS; most points one stats query may return
+    METRICS_TIERS: str = os.getenv("METRICS_TIERS", "10s:1h,1m:6h,5m:1d,1h:7d")
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "/var/lib/vps-panel/metrics")
+    METRICS_PERSIST_SECONDS: float = float(os.getenv("METRICS_PERSIST_SECONDS", "60"))
+    METRICS_MAX_POINTS: int = int(os.getenv("METRICS_MAX_POINTS", "1500"))
     
     # Celery
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/1")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/2")
+    # Run jobs in the calling process instead of a worker (tests, single-process setups)
+    CELERY_TASK_ALWAYS_EAGER: bool = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() == "true"
+    # VPS jobs: attempts before a job fails, exponential backoff between them (with jitter),
+    # how long a worker may hold a job before it is handed out again, and how often
+    # queued jobs that never reached a worker are re-sent (0 disables the sweeper)
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+    JOB_RETRY_MAX_SECONDS: float = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+    JOB_SWEEP_SECONDS: float = float(os.getenv("JOB_SWEEP_SECONDS", "60"))
     
     # tmate
     TMATE_HOST: str = os.getenv("TMATE_HOST", "localhost")
@@ -0,0 +1,72 @@
+"""
+Dashboard counters: reads and drift repair.
+
+The counters themselves are maintained transactionally by the session hooks
+in app.models.entity_counter. ``reconcile`` recounts the real tables and
+overwrites any counter that has drifted, for example after a query-level bulk
+update or a manual SQL fix. It runs at bootstrap and then every
+COUNTER_RECONCILE_SECONDS.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Tuple
+from prometheus_client import Counter
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Connection, Engine
+from app.core.database import AnySession, engine
+from app.models.entity_counter import TRACKED, EntityCounter, counter_status, upsert_counter
+
+logger = logging.getLogger(__name__)
+
+COUNTER_DRIFT = Counter("entity_counter_drift_total", "Counter corrections made by the reconciler", ["entity"])
+
+
+async def read_counters(db: AnySession) -> Dict[str, Dict[str, int]]:
+    """``{entity: {status: count}}`` in one query"""
+    counts: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for entity, status, count in (await db.execute(
+        select(EntityCounter.entity, EntityCounter.status, EntityCounter.count)
+    )).all():
+        counts[entity][status] = count
+    return counts
+
+
+def real_counts(conn: Connection) -> Dict[Tuple[str, str], int]:
+    counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    for model, (entity, attr) in TRACKED.items():
+        column = getattr(model, attr)
+        for value, count in conn.execute(select(column, func.count()).group_by(column)):
+            counts[entity, counter_status(model, value)] += count
+    return counts
+
+
+def reconcile(db_engine: Engine = engine) -> Dict[Tuple[str, str], int]:
+    """Make every counter match a real count; returns the drift found (stored - real)"""
+    table = EntityCounter.__table__
+    with db_engine.begin() as conn:
+        # No-op write first: takes the SQLite write lock / row-locks every counter on
+        # Postgres, so no counter moves between the recount and the overwrite
+        conn.execute(update(table).values(count=table.c.count))
+        stored = {(e, s): c for e, s, c in conn.execute(select(table.c.entity, table.c.status, table.c.count))}
+        real = real_counts(conn)
+        drift = {}
+        for key in sorted(set(stored) | set(real)):
+            actual = real.get(key, 0)
+            if stored.get(key, 0) != actual:
+                upsert_counter(conn, key[0], key[1], actual, increment=False)
+                drift[key] = stored.get(key, 0) - actual
+    for (entity, status), delta in drift.items():
+        COUNTER_DRIFT.labels(entity).inc(abs(delta))
+        logger.warning(f"entity_counter_drift entity={entity} status={status} delta={delta}")
+    return drift
+
+
+async def reconcile_loop(interval: float) -> None:
+    """Run ``reconcile`` off the event loop every ``interval`` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(reconcile)
+        except Exception:
+            logger.exception("entity_counter_reconcile_failed")
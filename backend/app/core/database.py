@@ -1,22 +1,422 @@
 """
 Database Configuration
 """
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+import redis
+from fastapi import Request
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 from app.core.config import settings
+from app.core.db_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine
+from app.core.redis_client import get_redis, mark_unavailable
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (url.partition("://")[2] in ("", "/") or ":memory:" in url)
+
+
+def _engine_options(url: str, async_: bool) -> Dict[str, Any]:
+    """Pool sizing for file/server databases; in-memory SQLite keeps its default pool"""
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    if not _is_memory_sqlite(url):
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if async_ else InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record) -> None:
+    """WAL lets readers run alongside the single writer; busy_timeout queues writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _configure(sync_engine: Engine, url: str, name: str) -> None:
+    if _is_sqlite(url) and not _is_memory_sqlite(url):
+        event.listen(sync_engine, "connect", _apply_sqlite_profile)
+    instrument_engine(sync_engine, name)
+
+
+def make_engine(url: str, name: str) -> Engine:
+    """Sync engine with the tuned pool/pragma profile and pool metrics"""
+    new_engine = create_engine(url, **_engine_options(url, async_=False))
+    _configure(new_engine, url, name)
+    return new_engine
+
+
+def make_async_engine(url: str, name: str):
+    """Async counterpart of make_engine; ``url`` uses an async driver"""
+    new_engine = create_async_engine(url, **_engine_options(url, async_=True))
+    _configure(new_engine.sync_engine, url, name)
+    return new_engine
+
+
+engine = make_engine(settings.DATABASE_URL, "primary")
 
 Base = declarative_base()
 
 
-def get_db():
+# ---------------------------------------------------------------------------
+# Read replicas. GET requests read from a replica picked round-robin; writes,
+# non-GET requests and a user's reads shortly after they wrote stay on the
+# primary. A replica whose connection fails is ejected for a while.
+# ---------------------------------------------------------------------------
+
+class Replica:
+    """One read replica: its engines and when it may be used again"""
+
+    def __init__(self, url: str, sync_engine: Engine, async_engine=None):
+        self.url = url
+        self.engine = sync_engine
+        self.async_engine = async_engine
+        self.down_until = 0.0
+        self.ejections = 0
+
+    def bind_for(self, primary) -> Engine:
+        """The replica engine matching the session's primary (sync or async)"""
+        if self.async_engine is not None and primary is not engine:
+            return self.async_engine.sync_engine
+        return self.engine
+
+
+class ReplicaSet:
+    """Round-robin over healthy replicas with time-based ejection"""
+
+    def __init__(self, replicas: List[Replica], eject_seconds: float):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self._counter = itertools.count()
+        for replica in replicas:
+            for target in filter(None, (replica.engine, getattr(replica.async_engine, "sync_engine", None))):
+                event.listen(target, "handle_error", self._on_error(replica))
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def _on_error(self, replica: Replica):
+        def handle_error(context) -> None:
+            if context.is_disconnect or isinstance(
+                context.sqlalchemy_exception, (exc.OperationalError, exc.InterfaceError)
+            ):
+                self.eject(replica)
+        return handle_error
+
+    def eject(self, replica: Replica) -> None:
+        replica.down_until = time.monotonic() + self.eject_seconds
+        replica.ejections += 1
+
+    def choose(self) -> Optional[Replica]:
+        """Next healthy replica, or None to fall back to the primary"""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._counter) % len(self.replicas)]
+            if replica.down_until <= now:
+                return replica
+        return None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {"index": i, "healthy": r.down_until <= now, "ejections": r.ejections}
+            for i, r in enumerate(self.replicas)
+        ]
+
+
+class StickyPrimary:
+    """"Recently wrote" window keyed by caller (``user:<id>``), shared by every worker
+
+    The marker is a short-TTL Redis key, so a GET landing on another worker
+    still reads from the primary. Answers are kept locally: a window (this
+    worker's own writes, or the TTL Redis reported) until it ends, and "no
+    recent write" for ``recheck_seconds``, so most reads need no round trip.
+    Without Redis each worker only knows its own writes.
+    """
+
+    key_prefix = "sticky_primary:"
+
+    def __init__(
+        self,
+        window_seconds: float,
+        max_keys: int = 100000,
+        recheck_seconds: float = 0.5,
+        redis_factory: Callable[[], Optional[redis.Redis]] = get_redis,
+        on_redis_error: Callable[[], None] = mark_unavailable,
+    ):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.recheck_seconds = recheck_seconds
+        self._redis_factory = redis_factory
+        self._on_redis_error = on_redis_error
+        self._until: Dict[str, float] = {}
+        self._clear_until: Dict[str, float] = {}  # Redis said "no window" for these callers
+        self._lock = threading.Lock()
+
+    def _redis(self) -> Optional[redis.Redis]:
+        try:
+            return self._redis_factory()
+        except redis.RedisError:
+            self._on_redis_error()
+            return None
+
+    def _remember(self, entries: Dict[str, float], caller: str, deadline: float, now: float) -> None:
+        with self._lock:
+            if len(entries) >= self.max_keys:
+                for key in [k for k, v in entries.items() if v <= now]:
+                    del entries[key]
+                if len(entries) >= self.max_keys:
+                    entries.clear()
+            entries[caller] = deadline
+
+    def mark(self, caller: Optional[str]) -> None:
+        if not caller or self.window_seconds <= 0:
+            return
+        now = time.monotonic()
+        self._remember(self._until, caller, now + self.window_seconds, now)
+        self._clear_until.pop(caller, None)
+        client = self._redis()
+        if client is not None:
+            try:
+                client.set(self.key_prefix + caller, 1, px=max(1, int(self.window_seconds * 1000)))
+            except redis.RedisError:
+                self._on_redis_error()
+
+    def active(self, caller: Optional[str]) -> bool:
+        if not caller:
+            return False
+        now = time.monotonic()
+        if self._until.get(caller, 0.0) > now:
+            return True
+        if self._clear_until.get(caller, 0.0) > now:
+            return False
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            ttl_ms = client.pttl(self.key_prefix + caller)
+        except redis.RedisError:
+            self._on_redis_error()
+            return False
+        if ttl_ms > 0:
+            self._remember(self._until, caller, now + ttl_ms / 1000, now)
+            return True
+        self._remember(self._clear_until, caller, now + self.recheck_seconds, now)
+        return False
+
+
+class RoutingSession(Session):
+    """Session that reads from a replica when marked read-only, else the primary"""
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None,
+                 sticky: Optional[StickyPrimary] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.sticky = sticky
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self._flushing
+            or not self.replicas
+            or not self.info.get("read_only")
+            or isinstance(clause, UpdateBase)
+        ):
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        # One replica per session, so a request sees a single consistent snapshot
+        replica = self.info.get("replica")
+        if replica is None:
+            replica = self.replicas.choose()
+            if replica is None:
+                return super().get_bind(mapper, clause=clause, **kwargs)
+            self.info["replica"] = replica
+        return replica.bind_for(self.bind)
+
+
+def _mark_writer(session: RoutingSession) -> None:
+    # Later reads in this session must see what it just wrote; the caller's
+    # marker is set once per session rather than once per flush
+    session.info["read_only"] = False
+    if session.sticky is not None and not session.info.get("sticky_marked"):
+        session.info["sticky_marked"] = True
+        session.sticky.mark(session.info.get("caller"))
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_writer_after_flush(session, flush_context) -> None:
+    _mark_writer(session)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_writer_on_dml(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        _mark_writer(orm_execute_state.session)
+
+
+def _build_replicas() -> ReplicaSet:
+    urls = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    return ReplicaSet(
+        [
+            Replica(
+                url,
+                make_engine(url, f"replica-{i}"),
+                make_async_engine(to_async_url(url), f"replica-{i}-async") if settings.DATABASE_ASYNC else None,
+            )
+            for i, url in enumerate(urls)
+        ],
+        settings.REPLICA_EJECT_SECONDS,
+    )
+
+
+def _caller(request: Request) -> Optional[str]:
+    """``user:<id>`` for a bearer-authenticated request, else None"""
+    auth = request.headers.get("authorization")
+    if not auth or auth[:7].lower() != "bearer ":
+        return None
+    from app.core.security import decode_token
+    payload = decode_token(auth[7:])
+    if payload and payload.get("sub") is not None:
+        return f"user:{payload['sub']}"
+    return None
+
+
+def route_session(info: Dict[str, Any], request: Optional[Request]) -> None:
+    """Mark a request's session read-only for GETs unless the caller just wrote"""
+    if request is None or not replicas:
+        return
+    caller = _caller(request)
+    info["caller"] = caller
+    if request.method in ("GET", "HEAD") and not sticky_primary.active(caller):
+        info["read_only"] = True
+
+
+def get_db(request: Request = None):
     """Dependency for getting database session"""
     db = SessionLocal()
+    route_session(db.info, request)
     try:
         yield db
     finally:
         db.close()
 
+
+# ---------------------------------------------------------------------------
+# Async mode (opt-in via DATABASE_ASYNC). Routers written against the
+# AsyncSession API use get_async_db; with async mode off they get a thin
+# adapter over the sync engine, so the same handler code runs in both modes.
+# ---------------------------------------------------------------------------
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its asyncpg/aiosqlite equivalent"""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+replicas = _build_replicas()
+sticky_primary = StickyPrimary(settings.REPLICA_STICKY_SECONDS, recheck_seconds=settings.REPLICA_STICKY_RECHECK_SECONDS)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine,
+    class_=RoutingSession, replicas=replicas, sticky=sticky_primary,
+)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    async_engine = make_async_engine(
+        settings.ASYNC_DATABASE_URL or to_async_url(settings.DATABASE_URL), "primary-async"
+    )
+    # expire_on_commit=False: attribute access after commit must not lazy-load
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False,
+        sync_session_class=RoutingSession, replicas=replicas, sticky=sticky_primary,
+    )
+
+
+class SyncSessionAdapter:
+    """Awaitable facade over a sync Session, mirroring the AsyncSession methods we use"""
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.sync_session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.sync_session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.sync_session.scalars(statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return self.sync_session.get(entity, ident, **kwargs)
+
+    async def delete(self, instance: Any) -> None:
+        self.sync_session.delete(instance)
+
+    async def flush(self) -> None:
+        self.sync_session.flush()
+
+    async def commit(self) -> None:
+        self.sync_session.commit()
+
+    async def rollback(self) -> None:
+        self.sync_session.rollback()
+
+    async def refresh(self, instance: Any, *args, **kwargs) -> None:
+        self.sync_session.refresh(instance, *args, **kwargs)
+
+    async def close(self) -> None:
+        self.sync_session.close()
+
+    def get_bind(self, *args, **kwargs):
+        return self.sync_session.get_bind(*args, **kwargs)
+
+    async def run_sync(self, fn: Callable, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+
+AnySession = Union[AsyncSession, SyncSessionAdapter]
+
+
+async def get_async_db(request: Request = None) -> AsyncIterator[AnySession]:
+    """Dependency yielding an AsyncSession (async mode) or a sync adapter"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            route_session(db.info, request)
+            yield db
+        return
+    db = SessionLocal()
+    route_session(db.info, request)
+    try:
+        yield SyncSessionAdapter(db)
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+"""
+Connection pool metrics (Prometheus).
+
+Engines are created with the instrumented pool classes below, which time
+every checkout, and ``instrument_engine`` wires pool events into counters and
+gauges labelled by pool name ("primary", "replica-0", ...). Read them from
+``/metrics`` to size DB_POOL_SIZE / DB_MAX_OVERFLOW.
+"""
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection (includes opening a new one)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT", ["pool"]
+)
+DB_POOL_CONNECTIONS = Counter(
+    "db_pool_connections_opened_total", "New DBAPI connections opened", ["pool"]
+)
+DB_POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations_total", "Connections invalidated (disconnects, failed pings)", ["pool"]
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"])
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond pool_size (negative: unused pool slots)", ["pool"]
+)
+
+
+class _TimedCheckout:
+    """Pool mixin observing how long each checkout blocks"""
+
+    metrics_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Label an engine's pool and export its events under ``name``"""
+    engine.pool.metrics_name = name
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.labels(name).inc()
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.labels(name).inc()
+
+    # Sampled at scrape time; engine.pool is looked up each time as dispose() replaces it
+    if isinstance(engine.pool, QueuePool):
+        DB_POOL_CHECKED_OUT.labels(name).set_function(lambda: engine.pool.checkedout())
+        DB_POOL_OVERFLOW.labels(name).set_function(lambda: engine.pool.overflow())
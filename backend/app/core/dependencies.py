@@ -3,9 +3,9 @@ FastAPI dependencies
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import AnySession, get_async_db
 from app.core.security import decode_token
+from app.core.principal_cache import Principal, principal_cache
 from app.models.user import User
 
 security = HTTPBearer()
@@ -13,8 +13,8 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AnySession = Depends(get_async_db)
+) -> Principal:
     """Get current authenticated user"""
     token = credentials.credentials
     payload = decode_token(token)
@@ -26,32 +26,37 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user_id = payload.get("sub")
-    if user_id is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        principal = Principal.from_user(user)
+        principal_cache.put(principal)
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is disabled"
         )
     
-    return user
+    return principal
 
 
 async def get_current_admin(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """Require admin role"""
     from app.models.user import UserRole
     if current_user.role != UserRole.ADMIN:
@@ -52,3 +52,18 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     )
 
 
+
+async def hashing_pool_saturated_handler(request: Request, exc: Exception):
+    request_id = getattr(request.state, "request_id", None)
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={
+            "error": {
+                "code": 503,
+                "type": "service_unavailable",
+                "detail": "Authentication service is busy, please retry",
+            },
+            "request_id": request_id,
+        },
+    )
@@ -0,0 +1,129 @@
+"""
+Cluster-wide host statistics for ``GET /hosts/stats``.
+
+The figures are computed by two aggregate queries. Hosts are reduced with
+SUM and COUNT ... FILTER. Active VPSes are counted by status from the
+(status, host_id) index. No ORM rows are loaded.
+
+The result is kept in a per-process snapshot shared by every caller. The
+first request computes it. After HOST_STATS_TTL_SECONDS, requests keep
+receiving the previous snapshot while one background refresh replaces it.
+Refreshes read from a replica when one is configured.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.host import Host, HostStatus
+from app.models.vps import VPS, VPSStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _usage(total: float, used: float) -> float:
+    return (used / total * 100) if total > 0 else 0
+
+
+def compute_host_stats(db: Session) -> Dict[str, Any]:
+    hosts = db.execute(select(
+        func.count(),
+        func.count().filter(Host.status == HostStatus.ONLINE),
+        func.count().filter(Host.status == HostStatus.OFFLINE),
+        func.coalesce(func.sum(Host.total_cpu_cores), 0),
+        func.coalesce(func.sum(Host.total_ram_gb), 0.0),
+        func.coalesce(func.sum(Host.total_storage_gb), 0.0),
+        func.coalesce(func.sum(Host.used_cpu_cores), 0),
+        func.coalesce(func.sum(Host.used_ram_gb), 0.0),
+        func.coalesce(func.sum(Host.used_storage_gb), 0.0),
+    )).one()
+    count, online, offline, total_cpu, total_ram, total_storage, used_cpu, used_ram, used_storage = hosts
+    vpses = dict(db.execute(
+        select(VPS.status, func.count())
+        .where(VPS.status.in_([VPSStatus.RUNNING, VPSStatus.CREATING]))
+        .group_by(VPS.status)
+    ).all())
+    running, creating = vpses.get(VPSStatus.RUNNING, 0), vpses.get(VPSStatus.CREATING, 0)
+
+    return {
+        "hosts": {
+            "total": count,
+            "online": online,
+            "offline": offline,
+        },
+        "resources": {
+            "cpu": {
+                "total": total_cpu,
+                "used": used_cpu,
+                "available": total_cpu - used_cpu,
+                "usage_percent": _usage(total_cpu, used_cpu)
+            },
+            "ram": {
+                "total_gb": total_ram,
+                "used_gb": used_ram,
+                "available_gb": total_ram - used_ram,
+                "usage_percent": _usage(total_ram, used_ram)
+            },
+            "storage": {
+                "total_gb": total_storage,
+                "used_gb": used_storage,
+                "available_gb": total_storage - used_storage,
+                "usage_percent": _usage(total_storage, used_storage)
+            }
+        },
+        "vpses": {
+            "total": running + creating,
+            "running": running,
+            "creating": creating,
+        },
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+
+
+class HostStatsSnapshot:
+    """Shared, stale-while-revalidate snapshot of ``compute_host_stats``"""
+
+    def __init__(self, ttl_seconds: float, session_factory=SessionLocal):
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory
+        self.refreshes = 0
+        self._value: Optional[Dict[str, Any]] = None
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self) -> bool:
+        return self._value is not None and time.monotonic() - self._computed_at < self.ttl_seconds
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Recompute unless another thread just did (single flight)"""
+        with self._lock:
+            if force or not self._fresh():
+                with self.session_factory() as db:
+                    db.info["read_only"] = True  # a replica is fine for a snapshot
+                    self._value = compute_host_stats(db)
+                self._computed_at = time.monotonic()
+                self.refreshes += 1
+            return self._value
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("host_stats_refresh_failed")
+
+    async def get(self) -> Dict[str, Any]:
+        if self.ttl_seconds <= 0:
+            return await asyncio.to_thread(self.refresh, True)
+        if self._value is None:
+            return await asyncio.to_thread(self.refresh)
+        if not self._fresh() and not self._lock.locked():
+            asyncio.get_running_loop().run_in_executor(None, self._refresh_in_background)
+        return self._value
+
+
+host_stats_snapshot = HostStatsSnapshot(settings.HOST_STATS_TTL_SECONDS)
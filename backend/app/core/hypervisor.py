@@ -0,0 +1,515 @@
+"""
+Hypervisor access: one pooled connection per host, blocking calls on threads.
+
+A backend does the actual work on one open connection. ``LibvirtBackend``
+talks to libvirtd, and ``FakeHypervisor`` keeps domains in memory for
+development and tests. Every operation is idempotent, because a failed job
+runs again from the start: defining an existing domain, starting a running
+one or destroying a missing one all succeed.
+
+``HypervisorManager`` keys everything by host URI. Each host has one
+persistent connection (libvirt connections are thread-safe) kept up by
+libvirt keepalives, and a bounded thread pool that runs the blocking calls.
+A call that leaves the connection dead drops it. The next call reconnects,
+but not before an exponential backoff, so an unreachable host fails fast
+instead of every call waiting on a connect timeout. When too many calls are
+waiting for one host, new calls are refused (``HypervisorBusy``). Per-host,
+per-operation latency is exported as the ``hypervisor_call_seconds``
+histogram.
+
+Celery workers use the blocking methods (``define``, ``start``, ...). Async
+code awaits ``call``, which never blocks the event loop.
+
+``domain_stats`` reads the counters of every domain on a host in one call
+(libvirt's ``getAllDomainStats``) for the stats collector.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape
+from prometheus_client import Counter, Gauge, Histogram
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+SHUTOFF = "shutoff"
+
+HYPERVISOR_CALL_SECONDS = Histogram(
+    "hypervisor_call_seconds", "Hypervisor call latency, including the wait for a host thread",
+    ["host", "operation"],
+)
+HYPERVISOR_CALL_ERRORS = Counter("hypervisor_call_errors_total", "Failed hypervisor calls", ["host", "operation"])
+HYPERVISOR_CONNECTS = Counter("hypervisor_connects_total", "Connection attempts by outcome", ["host", "outcome"])
+HYPERVISOR_PENDING = Gauge("hypervisor_pending_calls", "Calls queued or running per host", ["host"])
+
+
+class HypervisorError(Exception):
+    """A hypervisor operation failed (the job may be retried)"""
+
+
+class HypervisorConnectionError(HypervisorError):
+    """The host could not be reached, or is backing off after failed connects"""
+
+
+class HypervisorBusy(HypervisorError):
+    """Too many calls are already waiting for this host"""
+
+
+class DomainStats(NamedTuple):
+    """One domain's counters; the cumulative ones only ever grow while the domain runs"""
+    state: str
+    vcpus: int
+    cpu_time_ns: int = 0
+    mem_total_kb: int = 0
+    mem_used_kb: int = 0
+    disk_capacity_bytes: int = 0
+    disk_allocation_bytes: int = 0
+    disk_read_bytes: int = 0
+    disk_write_bytes: int = 0
+    net_rx_bytes: int = 0
+    net_tx_bytes: int = 0
+
+
+def domain_xml(domain: str, spec: Dict[str, Any]) -> str:
+    """Minimal KVM domain definition for a VPS"""
+    return (
+        f"<domain type='kvm'><name>{escape(domain)}</name><uuid>{escape(domain)}</uuid>"
+        f"<memory unit='MiB'>{int(spec['ram_gb'] * 1024)}</memory>"
+        f"<vcpu>{int(spec['cpu_cores'])}</vcpu>"
+        "<os><type arch='x86_64'>hvm</type></os>"
+        "<devices>"
+        f"<disk type='file' device='disk'><driver name='qemu' type='qcow2'/>"
+        f"<source file='{escape(spec['disk_path'])}'/><target dev='vda' bus='virtio'/></disk>"
+        "<interface type='network'><source network='default'/><model type='virtio'/></interface>"
+        "</devices></domain>"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Backends: connect/close/alive plus the operations, each on one connection
+# ---------------------------------------------------------------------------
+
+class FakeConnection:
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.alive = True
+
+
+class FakeHypervisor:
+    """
+    In-memory domains per host URI. ``fail`` makes the next calls of an
+    operation raise, ``drop`` kills the open connections to a host,
+    ``unreachable`` makes connects to it fail and ``latency`` slows its calls.
+    A domain's ``counters`` entry holds the DomainStats counters it reports.
+    """
+
+    def __init__(self):
+        self.domains: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.calls: List[Tuple[str, str]] = []
+        self.connects: List[str] = []
+        self.unreachable: set = set()
+        self.latency: Dict[str, float] = {}
+        self._open: List[FakeConnection] = []
+        self._failures: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def fail(self, operation: str, times: int = 1, error: str = "injected failure") -> None:
+        with self._lock:
+            self._failures.setdefault(operation, []).extend([error] * times)
+
+    def drop(self, uri: str) -> None:
+        with self._lock:
+            for conn in self._open:
+                if conn.uri == uri:
+                    conn.alive = False
+
+    def connect(self, uri: str) -> FakeConnection:
+        with self._lock:
+            self.connects.append(uri)
+            if uri in self.unreachable:
+                raise HypervisorError(f"Cannot connect to {uri}")
+            conn = FakeConnection(uri)
+            self._open.append(conn)
+            return conn
+
+    def close(self, conn: FakeConnection) -> None:
+        conn.alive = False
+
+    def alive(self, conn: FakeConnection) -> bool:
+        return conn.alive
+
+    def _call(self, conn: FakeConnection, operation: str, domain: str) -> None:
+        if self.latency.get(conn.uri):
+            time.sleep(self.latency[conn.uri])
+        with self._lock:
+            if not conn.alive:
+                raise HypervisorError("connection closed")
+            self.calls.append((operation, domain))
+            pending = self._failures.get(operation)
+            if pending:
+                raise HypervisorError(pending.pop(0))
+
+    def _get(self, conn: FakeConnection, domain: str) -> Dict[str, Any]:
+        if (conn.uri, domain) not in self.domains:
+            raise HypervisorError(f"Domain {domain} not found on {conn.uri}")
+        return self.domains[conn.uri, domain]
+
+    def define(self, conn: FakeConnection, domain: str, spec: Dict[str, Any]) -> None:
+        self._call(conn, "define", domain)
+        self.domains.setdefault((conn.uri, domain), {"state": SHUTOFF})["spec"] = dict(spec)
+
+    def start(self, conn: FakeConnection, domain: str) -> None:
+        self._call(conn, "start", domain)
+        self._get(conn, domain)["state"] = RUNNING
+
+    def shutdown(self, conn: FakeConnection, domain: str) -> None:
+        self._call(conn, "shutdown", domain)
+        self._get(conn, domain)["state"] = SHUTOFF
+
+    def reboot(self, conn: FakeConnection, domain: str) -> None:
+        self._call(conn, "reboot", domain)
+        if self._get(conn, domain)["state"] != RUNNING:
+            raise HypervisorError(f"Domain {domain} is not running")
+
+    def resize(self, conn: FakeConnection, domain: str, spec: Dict[str, Any]) -> None:
+        self._call(conn, "resize", domain)
+        self._get(conn, domain)["spec"].update(spec)
+
+    def destroy(self, conn: FakeConnection, domain: str) -> None:
+        self._call(conn, "destroy", domain)
+        self.domains.pop((conn.uri, domain), None)
+
+    def list_domains(self, conn: FakeConnection) -> List[str]:
+        self._call(conn, "list_domains", "")
+        return sorted(domain for uri, domain in self.domains if uri == conn.uri)
+
+    def domain_stats(self, conn: FakeConnection) -> Dict[str, DomainStats]:
+        self._call(conn, "domain_stats", "")
+        return {
+            domain: DomainStats(
+                state=entry["state"],
+                vcpus=int(entry["spec"]["cpu_cores"]),
+                mem_total_kb=int(entry["spec"]["ram_gb"] * 1024 * 1024),
+                disk_capacity_bytes=int(entry["spec"]["storage_gb"] * 1024 ** 3),
+                **entry.get("counters", {}),
+            )
+            for (uri, domain), entry in list(self.domains.items()) if uri == conn.uri
+        }
+
+
+# virDomainState values
+_LIBVIRT_STATES = {
+    0: "unknown", 1: RUNNING, 2: "blocked", 3: "paused", 4: "shutdown", 5: SHUTOFF, 6: "crashed", 7: "pmsuspended",
+}
+
+
+def _import_libvirt():
+    try:
+        import libvirt  # Optional dependency: only needed where hypervisor calls run
+    except ImportError as exc:
+        raise ImportError(
+            "HYPERVISOR_DRIVER=libvirt needs libvirt-python; HYPERVISOR_DRIVER=fake is for tests and benchmarks only"
+        ) from exc
+    return libvirt
+
+
+class LibvirtBackend:
+    """libvirt-python; keepalives are driven by libvirt's default event loop on a daemon thread"""
+
+    _event_loop_started = False
+    _event_loop_lock = threading.Lock()
+
+    def __init__(self, keepalive_interval: int = 5, keepalive_count: int = 3):
+        self.libvirt = _import_libvirt()
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        if keepalive_interval > 0:
+            self._start_event_loop()
+
+    def _start_event_loop(self) -> None:
+        with LibvirtBackend._event_loop_lock:
+            if LibvirtBackend._event_loop_started:
+                return
+            self.libvirt.virEventRegisterDefaultImpl()
+
+            def run() -> None:
+                while True:
+                    self.libvirt.virEventRunDefaultImpl()
+
+            threading.Thread(target=run, name="libvirt-events", daemon=True).start()
+            LibvirtBackend._event_loop_started = True
+
+    def connect(self, uri: str):
+        try:
+            conn = self.libvirt.open(uri)
+            if self.keepalive_interval > 0:
+                conn.setKeepAlive(self.keepalive_interval, self.keepalive_count)
+            return conn
+        except self.libvirt.libvirtError as e:
+            raise HypervisorError(f"Cannot connect to {uri}: {e}") from e
+
+    def close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.libvirt.libvirtError:
+            pass
+
+    def alive(self, conn) -> bool:
+        try:
+            return conn.isAlive() == 1
+        except self.libvirt.libvirtError:
+            return False
+
+    def _lookup(self, conn, domain: str):
+        try:
+            return conn.lookupByName(domain)
+        except self.libvirt.libvirtError as e:
+            if e.get_error_code() == self.libvirt.VIR_ERR_NO_DOMAIN:
+                return None
+            raise
+
+    def define(self, conn, domain: str, spec: Dict[str, Any]) -> None:
+        conn.defineXML(domain_xml(domain, spec))
+
+    def start(self, conn, domain: str) -> None:
+        dom = conn.lookupByName(domain)
+        if not dom.isActive():
+            dom.create()
+
+    def shutdown(self, conn, domain: str) -> None:
+        dom = conn.lookupByName(domain)
+        if dom.isActive():
+            dom.shutdown()
+
+    def reboot(self, conn, domain: str) -> None:
+        conn.lookupByName(domain).reboot(0)
+
+    def resize(self, conn, domain: str, spec: Dict[str, Any]) -> None:
+        dom = conn.lookupByName(domain)
+        config = self.libvirt.VIR_DOMAIN_AFFECT_CONFIG
+        dom.setVcpusFlags(int(spec["cpu_cores"]), config | self.libvirt.VIR_DOMAIN_VCPU_MAXIMUM)
+        dom.setVcpusFlags(int(spec["cpu_cores"]), config)
+        dom.setMemoryFlags(int(spec["ram_gb"] * 1024 * 1024), config | self.libvirt.VIR_DOMAIN_MEM_MAXIMUM)
+        dom.setMemoryFlags(int(spec["ram_gb"] * 1024 * 1024), config)
+        if dom.isActive():
+            dom.blockResize("vda", int(spec["storage_gb"]) * 1024 ** 3, self.libvirt.VIR_DOMAIN_BLOCK_RESIZE_BYTES)
+
+    def destroy(self, conn, domain: str) -> None:
+        dom = self._lookup(conn, domain)
+        if dom is None:
+            return
+        if dom.isActive():
+            dom.destroy()
+        dom.undefine()
+
+    def list_domains(self, conn) -> List[str]:
+        return sorted(dom.name() for dom in conn.listAllDomains())
+
+    def domain_stats(self, conn) -> Dict[str, DomainStats]:
+        lv = self.libvirt
+        records = conn.getAllDomainStats(
+            lv.VIR_DOMAIN_STATS_STATE | lv.VIR_DOMAIN_STATS_CPU_TOTAL | lv.VIR_DOMAIN_STATS_BALLOON
+            | lv.VIR_DOMAIN_STATS_VCPU | lv.VIR_DOMAIN_STATS_INTERFACE | lv.VIR_DOMAIN_STATS_BLOCK
+        )
+        stats = {}
+        for dom, s in records:
+            total = s.get("balloon.maximum") or s.get("balloon.current", 0)
+            if "balloon.available" in s and "balloon.unused" in s:
+                used = s["balloon.available"] - s["balloon.unused"]  # Reported by the guest's balloon driver
+            else:
+                used = s.get("balloon.rss", s.get("balloon.current", 0))
+            blocks = range(s.get("block.count", 0))
+            nets = range(s.get("net.count", 0))
+            stats[dom.name()] = DomainStats(
+                state=_LIBVIRT_STATES.get(s.get("state.state"), "unknown"),
+                vcpus=s.get("vcpu.current") or 1,
+                cpu_time_ns=s.get("cpu.time", 0),
+                mem_total_kb=total,
+                mem_used_kb=used,
+                disk_capacity_bytes=sum(s.get(f"block.{i}.capacity", 0) for i in blocks),
+                disk_allocation_bytes=sum(s.get(f"block.{i}.allocation", 0) for i in blocks),
+                disk_read_bytes=sum(s.get(f"block.{i}.rd.bytes", 0) for i in blocks),
+                disk_write_bytes=sum(s.get(f"block.{i}.wr.bytes", 0) for i in blocks),
+                net_rx_bytes=sum(s.get(f"net.{i}.rx.bytes", 0) for i in nets),
+                net_tx_bytes=sum(s.get(f"net.{i}.tx.bytes", 0) for i in nets),
+            )
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Connection manager
+# ---------------------------------------------------------------------------
+
+class _Host:
+    """One host's connection, thread pool and reconnect backoff"""
+
+    def __init__(self, uri: str, threads: int, max_pending: int):
+        self.uri = uri
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="hypervisor")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.conn = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class HypervisorManager:
+    """Pooled per-host connections to ``backend`` with a blocking and an async call API"""
+
+    def __init__(self, backend, threads_per_host: int = 4, max_pending_per_host: int = 64,
+                 reconnect_base_seconds: float = 1.0, reconnect_max_seconds: float = 60.0):
+        self.backend = backend
+        self.threads_per_host = threads_per_host
+        self.max_pending_per_host = max_pending_per_host
+        self.reconnect_base_seconds = reconnect_base_seconds
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self._hosts: Dict[str, _Host] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, uri: str) -> _Host:
+        with self._lock:
+            host = self._hosts.get(uri)
+            if host is None:
+                host = self._hosts[uri] = _Host(uri, self.threads_per_host, self.max_pending_per_host)
+            return host
+
+    def _connection(self, host: _Host):
+        with host.lock:
+            if host.conn is not None and self.backend.alive(host.conn):
+                return host.conn
+            if host.conn is not None:
+                self.backend.close(host.conn)
+                host.conn = None
+            wait = host.retry_at - time.monotonic()
+            if wait > 0:
+                raise HypervisorConnectionError(f"{host.uri} unreachable; next connect in {wait:.1f}s")
+            try:
+                host.conn = self.backend.connect(host.uri)
+            except Exception as e:
+                host.failures += 1
+                host.retry_at = time.monotonic() + min(
+                    self.reconnect_max_seconds, self.reconnect_base_seconds * 2 ** (host.failures - 1)
+                )
+                HYPERVISOR_CONNECTS.labels(host.uri, "failed").inc()
+                logger.warning(f"hypervisor_connect_failed host={host.uri} failures={host.failures} error={e}")
+                raise HypervisorConnectionError(str(e)) from e
+            host.failures = 0
+            host.retry_at = 0.0
+            HYPERVISOR_CONNECTS.labels(host.uri, "ok").inc()
+            return host.conn
+
+    def _run(self, host: _Host, operation: str, args: tuple, queued_at: float):
+        try:
+            conn = self._connection(host)
+            try:
+                return getattr(self.backend, operation)(conn, *args)
+            except Exception as e:
+                if not self.backend.alive(conn):
+                    raise HypervisorConnectionError(f"{host.uri}: {e}") from e
+                if isinstance(e, HypervisorError):
+                    raise
+                raise HypervisorError(str(e)) from e
+        except Exception:
+            HYPERVISOR_CALL_ERRORS.labels(host.uri, operation).inc()
+            raise
+        finally:
+            HYPERVISOR_CALL_SECONDS.labels(host.uri, operation).observe(time.perf_counter() - queued_at)
+
+    @staticmethod
+    def _release(host: _Host) -> None:
+        HYPERVISOR_PENDING.labels(host.uri).dec()
+        host.slots.release()
+
+    def submit(self, uri: str, operation: str, *args) -> Future:
+        """Queue ``operation`` on the host's pool; raises HypervisorBusy when too many are waiting"""
+        host = self._host(uri)
+        if not host.slots.acquire(blocking=False):
+            HYPERVISOR_CALL_ERRORS.labels(uri, operation).inc()
+            raise HypervisorBusy(f"{uri} has {self.max_pending_per_host} calls pending")
+        HYPERVISOR_PENDING.labels(uri).inc()
+        try:
+            future = host.executor.submit(self._run, host, operation, args, time.perf_counter())
+        except BaseException:
+            self._release(host)
+            raise
+        # On completion, not in _run: a call cancelled while still queued never runs
+        future.add_done_callback(lambda _: self._release(host))
+        return future
+
+    def run(self, uri: str, operation: str, *args):
+        """Blocking call (Celery workers)"""
+        return self.submit(uri, operation, *args).result()
+
+    async def call(self, uri: str, operation: str, *args):
+        """Awaitable call; the event loop never waits on libvirt"""
+        return await asyncio.wrap_future(self.submit(uri, operation, *args))
+
+    def define(self, uri: str, domain: str, spec: Dict[str, Any]) -> None:
+        self.run(uri, "define", domain, spec)
+
+    def start(self, uri: str, domain: str) -> None:
+        self.run(uri, "start", domain)
+
+    def shutdown(self, uri: str, domain: str) -> None:
+        self.run(uri, "shutdown", domain)
+
+    def reboot(self, uri: str, domain: str) -> None:
+        self.run(uri, "reboot", domain)
+
+    def resize(self, uri: str, domain: str, spec: Dict[str, Any]) -> None:
+        self.run(uri, "resize", domain, spec)
+
+    def destroy(self, uri: str, domain: str) -> None:
+        self.run(uri, "destroy", domain)
+
+    def domain_stats(self, uri: str) -> Dict[str, DomainStats]:
+        return self.run(uri, "domain_stats")
+
+    def close(self) -> None:
+        """Close every connection and stop the pools"""
+        with self._lock:
+            hosts, self._hosts = list(self._hosts.values()), {}
+        for host in hosts:
+            host.executor.shutdown(wait=True)
+            if host.conn is not None:
+                self.backend.close(host.conn)
+
+
+def check_backend(choice: str) -> None:
+    """Raise (ValueError/ImportError) if ``make_backend(choice)`` would; starts nothing, so it is safe before forking"""
+    if choice == "libvirt":
+        _import_libvirt()
+    elif choice != "fake":
+        raise ValueError(f"Unknown HYPERVISOR_DRIVER {choice!r}")
+
+
+def make_backend(choice: str):
+    """The backend named by HYPERVISOR_DRIVER: "libvirt", or "fake" (in-memory; tests and benchmarks only)"""
+    check_backend(choice)
+    if choice == "fake":
+        logger.warning("hypervisor_driver_fake jobs will not touch any real host")
+        return FakeHypervisor()
+    return LibvirtBackend(settings.LIBVIRT_KEEPALIVE_INTERVAL, settings.LIBVIRT_KEEPALIVE_COUNT)
+
+
+_manager: Optional[HypervisorManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_driver() -> HypervisorManager:
+    """The process-wide connection manager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = HypervisorManager(
+                make_backend(settings.HYPERVISOR_DRIVER),
+                threads_per_host=settings.LIBVIRT_THREADS_PER_HOST,
+                max_pending_per_host=settings.LIBVIRT_MAX_PENDING_PER_HOST,
+                reconnect_base_seconds=settings.LIBVIRT_RECONNECT_BASE_SECONDS,
+                reconnect_max_seconds=settings.LIBVIRT_RECONNECT_MAX_SECONDS,
+            )
+        return _manager
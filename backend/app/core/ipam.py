@@ -0,0 +1,193 @@
+"""
+IP address management for VPS networking.
+
+Addresses come from ``IPPool`` subnets. A pool serves one network type and,
+optionally, one host. Host pools are tried before shared ones. Each pool's
+usable addresses (the network and broadcast addresses are excluded) are a
+bitmap split into blocks of BLOCK_BITS, stored one row per block. A block row
+also holds its free count and a version.
+
+Allocation picks a block with free addresses, starting from a random block
+so concurrent requests spread out. It sets the lowest clear bits, found with
+a C-level search for the first byte that is not 0xFF. It then writes the
+block back with an UPDATE conditional on the version it read. If another
+transaction changed the block first, the UPDATE matches no row and the block
+is read again, so an address is never handed out twice. Release clears the
+bits the same way. Both run in the caller's transaction, so a rolled-back
+create returns its address.
+"""
+import ipaddress
+import random
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+from app.core.database import AnySession
+from app.models.ip_pool import IPPool, IPPoolBlock
+from app.models.vps import VPS, VPSStatus, NetworkType
+
+BLOCK_BITS = 1024
+_FREE_BYTE = re.compile(b"[^\xff]")
+
+
+def address_column(network_type: NetworkType):
+    return VPS.public_ipv4 if network_type == NetworkType.PUBLIC_IPV4 else VPS.private_ip
+
+
+def usable(cidr: str) -> Tuple[ipaddress.IPv4Network, int, int]:
+    """(network, first usable address as an int, number of usable addresses)"""
+    network = ipaddress.IPv4Network(cidr)
+    first, size = int(network.network_address), network.num_addresses
+    if network.prefixlen < 31:
+        first, size = first + 1, size - 2
+    return network, first, size
+
+
+def _set(bitmap: bytearray, bit: int) -> None:
+    bitmap[bit // 8] |= 1 << (bit % 8)
+
+
+def _take(bitmap: bytearray, count: int) -> List[int]:
+    """Set up to ``count`` clear bits, lowest first; returns their offsets"""
+    taken: List[int] = []
+    match = _FREE_BYTE.search(bitmap)
+    while match is not None and len(taken) < count:
+        i = match.start()
+        byte = bitmap[i]
+        while byte != 0xFF and len(taken) < count:
+            bit = (~byte & (byte + 1)).bit_length() - 1
+            byte |= 1 << bit
+            taken.append(i * 8 + bit)
+        bitmap[i] = byte
+        match = _FREE_BYTE.search(bitmap, i + 1)
+    return taken
+
+
+def create_pool(db: Session, name: str, cidr: str, network_type: NetworkType,
+                host_id: Optional[int] = None, reserved: Iterable[str] = ()) -> IPPool:
+    """
+    Add a pool (flushed, not committed). ``reserved`` addresses (e.g. a
+    gateway) and addresses already held by VPSes of this network type are
+    marked taken. Raises ValueError for a malformed CIDR, or one overlapping
+    a pool the same VPSes could draw from.
+    """
+    network, first, size = usable(cidr)
+    scope = select(IPPool.name, IPPool.cidr).where(IPPool.network_type == network_type)
+    if host_id is not None:
+        scope = scope.where(or_(IPPool.host_id == host_id, IPPool.host_id.is_(None)))
+    for other, other_cidr in db.execute(scope):
+        if network.overlaps(ipaddress.IPv4Network(other_cidr)):
+            raise ValueError(f"{network} overlaps pool {other} ({other_cidr})")
+
+    blocks = [bytearray(BLOCK_BITS // 8) for _ in range(-(-size // BLOCK_BITS))]
+    # Bits past the end of the subnet are permanently taken
+    for offset in range(size, len(blocks) * BLOCK_BITS):
+        _set(blocks[offset // BLOCK_BITS], offset % BLOCK_BITS)
+
+    column = address_column(network_type)
+    held = select(column).where(column.is_not(None), VPS.status != VPSStatus.DELETING)
+    if host_id is not None:
+        held = held.where(VPS.host_id == host_id)
+    for address in [*reserved, *db.scalars(held)]:
+        offset = int(ipaddress.IPv4Address(address)) - first
+        if 0 <= offset < size:
+            _set(blocks[offset // BLOCK_BITS], offset % BLOCK_BITS)
+
+    pool = IPPool(name=name, cidr=str(network), network_type=network_type, host_id=host_id, size=size)
+    pool.blocks = [
+        IPPoolBlock(block=i, bitmap=bytes(bitmap), free=BLOCK_BITS - int.from_bytes(bitmap, "big").bit_count(),
+                    version=0)
+        for i, bitmap in enumerate(blocks)
+    ]
+    db.add(pool)
+    db.flush()
+    return pool
+
+
+async def _pools(db: AnySession, network_type: NetworkType, host_id: Optional[int]):
+    return (await db.execute(
+        select(IPPool.id, IPPool.cidr, IPPool.size)
+        .where(IPPool.network_type == network_type, or_(IPPool.host_id == host_id, IPPool.host_id.is_(None)))
+        .order_by(IPPool.host_id.is_(None), IPPool.id)
+    )).all()
+
+
+def _write(pool_id: int, block: int, version: int, bitmap: bytearray, freed: int):
+    return update(IPPoolBlock).where(
+        IPPoolBlock.pool_id == pool_id,
+        IPPoolBlock.block == block,
+        IPPoolBlock.version == version,
+    ).values(
+        bitmap=bytes(bitmap),
+        free=IPPoolBlock.free + freed,
+        version=IPPoolBlock.version + 1,
+    ).execution_options(synchronize_session=False)
+
+
+async def allocate_addresses(db: AnySession, network_type: NetworkType, host_id: Optional[int],
+                             count: int = 1) -> List[str]:
+    """Take up to ``count`` free addresses for a VPS on ``host_id``, in the caller's transaction"""
+    addresses: List[str] = []
+    for pool_id, cidr, size in await _pools(db, network_type, host_id):
+        _, first, _ = usable(cidr)
+        start = random.randrange(-(-size // BLOCK_BITS))
+        while len(addresses) < count:
+            row = (await db.execute(
+                select(IPPoolBlock.block, IPPoolBlock.bitmap, IPPoolBlock.version)
+                .where(IPPoolBlock.pool_id == pool_id, IPPoolBlock.free > 0)
+                .order_by(IPPoolBlock.block < start, IPPoolBlock.block)
+                .limit(1)
+            )).first()
+            if row is None:
+                break
+            bitmap = bytearray(row.bitmap)
+            taken = _take(bitmap, count - len(addresses))
+            if not taken:  # free count out of step with the bitmap
+                break
+            result = await db.execute(_write(pool_id, row.block, row.version, bitmap, -len(taken)))
+            if result.rowcount == 1:
+                base = first + row.block * BLOCK_BITS
+                addresses.extend(str(ipaddress.IPv4Address(base + bit)) for bit in taken)
+        if len(addresses) == count:
+            break
+    return addresses
+
+
+async def release_addresses(db: AnySession, network_type: NetworkType, host_id: Optional[int],
+                            addresses: Iterable[Optional[str]]) -> int:
+    """Return addresses to their pools; unknown or already free ones are ignored. Returns the number freed."""
+    pools = [(pool_id, *usable(cidr)) for pool_id, cidr, _ in await _pools(db, network_type, host_id)]
+    bits: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for address in addresses:
+        try:
+            ip = ipaddress.IPv4Address(address)
+        except ValueError:
+            continue
+        for pool_id, network, first, size in pools:
+            offset = int(ip) - first
+            if ip in network and 0 <= offset < size:
+                bits[pool_id, offset // BLOCK_BITS].append(offset % BLOCK_BITS)
+                break
+
+    released = 0
+    for (pool_id, block), offsets in bits.items():
+        while True:
+            row = (await db.execute(
+                select(IPPoolBlock.bitmap, IPPoolBlock.version)
+                .where(IPPoolBlock.pool_id == pool_id, IPPoolBlock.block == block)
+            )).first()
+            bitmap = bytearray(row.bitmap)
+            freed = 0
+            for bit in offsets:
+                mask = 1 << (bit % 8)
+                if bitmap[bit // 8] & mask:
+                    bitmap[bit // 8] &= ~mask
+                    freed += 1
+            if not freed:
+                break
+            result = await db.execute(_write(pool_id, block, row.version, bitmap, freed))
+            if result.rowcount == 1:
+                released += freed
+                break
+    return released
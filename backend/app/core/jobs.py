@@ -0,0 +1,334 @@
+"""
+VPS jobs: hypervisor work done by Celery workers, never by the API.
+
+An endpoint makes its VPS change and adds a ``Job`` row (``enqueue``) in one
+transaction. After the commit, ``dispatch`` sends the job ids to Celery.
+Sending is best effort. The job is already stored, and the sweeper re-sends
+any queued job that no worker has picked up.
+
+A worker claims a job with one conditional UPDATE. The UPDATE matches only a
+QUEUED job, or a RUNNING one whose lease has expired (its worker died). It
+sets the job RUNNING and counts the attempt, so a job id delivered twice runs
+once. The handler calls the hypervisor driver. It sets the VPS's new state in
+the same commit that marks the job SUCCEEDED. A failed attempt puts the job
+back to QUEUED with ``run_after`` set by exponential backoff with full jitter,
+and Celery retries it after that delay. After ``max_attempts`` the job is
+FAILED. A VPS whose create failed goes to ERROR. Other kinds leave the VPS
+as it was.
+
+Run a worker with ``celery -A app.core.jobs worker``. It refuses to start if
+HYPERVISOR_DRIVER's backend can't load (libvirt-python missing). With
+CELERY_TASK_ALWAYS_EAGER=true, jobs run in the process that dispatches them.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from celery import Celery
+from celery.signals import worker_init
+from prometheus_client import Counter, Histogram
+from sqlalchemy import DateTime, Integer, and_, exists, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import AnySession, SessionLocal
+from app.core.hypervisor import check_backend, get_driver
+from app.models.job import Job, JobKind, JobStatus
+from app.models.vps import VPS, VPSStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNS = Counter("vps_job_runs_total", "VPS job attempts by outcome", ["kind", "outcome"])
+JOB_SECONDS = Histogram("vps_job_seconds", "Duration of one VPS job attempt", ["kind"])
+
+ACTIVE = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+celery_app = Celery("vps_panel", broker=settings.CELERY_BROKER_URL, backend=settings.CELERY_RESULT_BACKEND)
+celery_app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    # A job is acknowledged only once it has run, so a crashed worker's job is delivered again
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    # Outcomes live in the jobs table
+    task_ignore_result=True,
+    # Don't hold a request for long if the broker is down; the sweeper re-sends
+    task_publish_retry_policy={"max_retries": 1, "interval_start": 0, "interval_step": 0.5},
+)
+
+@worker_init.connect
+def _require_hypervisor(**kwargs) -> None:
+    """Refuse to start a worker whose driver can't load, instead of failing (or faking) every job"""
+    try:
+        check_backend(settings.HYPERVISOR_DRIVER)
+    except (ImportError, ValueError) as exc:
+        logger.critical("worker_start_refused reason=%s", exc)
+        # Celery logs and swallows Exceptions raised by signal handlers
+        raise SystemExit(1) from exc
+
+
+# Workers open their own sessions; tests point this at their database
+session_factory: Callable[[], Session] = SessionLocal
+
+
+class JobError(Exception):
+    """A job that cannot succeed however often it is retried"""
+
+
+def enqueue(db: AnySession, kind: JobKind, vps_id: int, user_id: Optional[int],
+            payload: Optional[Dict[str, Any]] = None) -> Job:
+    """Add a queued job to the caller's transaction; ``dispatch`` it after the commit"""
+    job = Job(
+        kind=kind,
+        status=JobStatus.QUEUED,
+        vps_id=vps_id,
+        user_id=user_id,
+        payload=payload,
+        progress=0,
+        attempts=0,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+async def enqueue_where(db: AnySession, kind: JobKind, user_id: Optional[int], *criteria) -> List[Tuple[int, int]]:
+    """
+    Queue a job on every VPS matching ``criteria`` that has none in flight,
+    with a single INSERT ... SELECT in the caller's transaction. Returns
+    (job id, vps id) pairs.
+    """
+    jobs = Job.__table__
+    idle = ~exists().where(Job.vps_id == VPS.id, Job.status.in_(ACTIVE))
+    rows = select(
+        literal(kind, jobs.c.kind.type),
+        literal(JobStatus.QUEUED, jobs.c.status.type),
+        VPS.id,
+        literal(user_id, Integer),
+        literal(0),
+        literal(0),
+        literal(settings.JOB_MAX_ATTEMPTS),
+        literal(datetime.utcnow(), DateTime),
+    ).where(*criteria, idle)
+    columns = ["kind", "status", "vps_id", "user_id", "progress", "attempts", "max_attempts", "run_after"]
+    result = await db.execute(
+        insert(jobs).from_select(columns, rows).returning(jobs.c.id, jobs.c.vps_id)
+    )
+    return [(job_id, vps_id) for job_id, vps_id in result.all()]
+
+
+async def has_active_job(db: AnySession, vps_id: int) -> bool:
+    """Whether a job for this VPS is queued or running (jobs on one VPS run one at a time)"""
+    return bool(await db.scalar(
+        select(exists().where(Job.vps_id == vps_id, Job.status.in_(ACTIVE)))
+    ))
+
+
+def _send(job_ids: List[int]) -> None:
+    for job_id in job_ids:
+        try:
+            run_job.apply_async((job_id,))
+        except Exception:
+            logger.exception(f"job_dispatch_failed job_id={job_id}")
+
+
+async def dispatch(job_ids: Iterable[int]) -> None:
+    """Send committed jobs to the workers, off the event loop"""
+    job_ids = list(job_ids)
+    if job_ids:
+        await asyncio.to_thread(_send, job_ids)
+
+
+def backoff(attempt: int) -> float:
+    """Seconds before retry number ``attempt`` (1-based): full jitter under a capped exponential"""
+    ceiling = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+# ---------------------------------------------------------------------------
+# Handlers: (driver, db, job, vps, progress) -> result. They run in the
+# worker's session and set the VPS's new state; the caller commits.
+# ---------------------------------------------------------------------------
+
+def _uri(vps: VPS) -> str:
+    return (vps.host.libvirt_uri if vps.host else None) or settings.LIBVIRT_URI
+
+
+def _spec(vps: VPS) -> Dict[str, Any]:
+    return {
+        "cpu_cores": vps.cpu_cores,
+        "ram_gb": vps.ram_gb,
+        "storage_gb": vps.storage_gb,
+        "disk_path": f"{settings.VPS_DISK_DIR}/{vps.uuid}.qcow2",
+    }
+
+
+def _create(driver, db: Session, job: Job, vps: VPS, progress) -> Dict[str, Any]:
+    uri = _uri(vps)
+    driver.define(uri, vps.uuid, _spec(vps))
+    progress(50)
+    if vps.start_on_create:
+        driver.start(uri, vps.uuid)
+    vps.vm_id = vps.uuid
+    if vps.status == VPSStatus.CREATING:
+        vps.status = VPSStatus.RUNNING if vps.start_on_create else VPSStatus.STOPPED
+    return {"domain": vps.uuid, "uri": uri}
+
+
+def _start(driver, db: Session, job: Job, vps: VPS, progress) -> None:
+    driver.start(_uri(vps), vps.vm_id or vps.uuid)
+    vps.status = VPSStatus.RUNNING
+
+
+def _stop(driver, db: Session, job: Job, vps: VPS, progress) -> None:
+    driver.shutdown(_uri(vps), vps.vm_id or vps.uuid)
+    vps.status = VPSStatus.STOPPED
+
+
+def _reboot(driver, db: Session, job: Job, vps: VPS, progress) -> None:
+    driver.reboot(_uri(vps), vps.vm_id or vps.uuid)
+
+
+def _resize(driver, db: Session, job: Job, vps: VPS, progress) -> Dict[str, Any]:
+    # The row already holds the new specs; a later resize simply wins
+    spec = _spec(vps)
+    driver.resize(_uri(vps), vps.vm_id or vps.uuid, spec)
+    return spec
+
+
+def _delete(driver, db: Session, job: Job, vps: VPS, progress) -> None:
+    if vps.status != VPSStatus.DELETING:
+        raise JobError(f"VPS is {vps.status.value}, not deleting")
+    driver.destroy(_uri(vps), vps.vm_id or vps.uuid)
+    job.vps_id = None
+    db.delete(vps)
+
+
+HANDLERS = {
+    JobKind.CREATE: _create,
+    JobKind.START: _start,
+    JobKind.STOP: _stop,
+    JobKind.REBOOT: _reboot,
+    JobKind.RESIZE: _resize,
+    JobKind.DELETE: _delete,
+}
+
+
+def _progress(job_id: int) -> Callable[[int], None]:
+    """Record progress (and extend the lease) outside the handler's transaction"""
+    def progress(percent: int) -> None:
+        with session_factory() as db:
+            db.execute(
+                update(Job).where(Job.id == job_id, Job.status == JobStatus.RUNNING).values(
+                    progress=percent,
+                    lease_until=datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                ).execution_options(synchronize_session=False)
+            )
+            db.commit()
+    return progress
+
+
+def _claim(db: Session, job_id: int) -> bool:
+    now = datetime.utcnow()
+    result = db.execute(
+        update(Job).where(
+            Job.id == job_id,
+            or_(
+                Job.status == JobStatus.QUEUED,
+                and_(Job.status == JobStatus.RUNNING, Job.lease_until < now),
+            ),
+        ).values(
+            status=JobStatus.RUNNING,
+            attempts=Job.attempts + 1,
+            started_at=now,
+            lease_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _fail(db: Session, job_id: int, error: Exception) -> Optional[float]:
+    """Record a failed attempt; returns the retry delay, or None when the job has failed for good"""
+    job = db.get(Job, job_id)
+    job.error = str(error) or type(error).__name__
+    job.lease_until = None
+    if isinstance(error, JobError) or job.attempts >= job.max_attempts:
+        job.status = JobStatus.FAILED
+        job.finished_at = datetime.utcnow()
+        vps = db.get(VPS, job.vps_id) if job.vps_id else None
+        if job.kind == JobKind.CREATE and vps is not None and vps.status == VPSStatus.CREATING:
+            vps.status = VPSStatus.ERROR
+        db.commit()
+        logger.warning(f"job_failed job_id={job_id} kind={job.kind.value} attempts={job.attempts} error={job.error}")
+        return None
+    delay = backoff(job.attempts)
+    job.status = JobStatus.QUEUED
+    job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    db.commit()
+    return delay
+
+
+def execute(job_id: int) -> Optional[float]:
+    """Run one attempt of a job. Returns the delay before it should be retried, else None."""
+    with session_factory() as db:
+        if not _claim(db, job_id):
+            return None  # Finished, or another worker has it
+        job = db.get(Job, job_id)
+        kind = job.kind.value
+        started = time.perf_counter()
+        try:
+            vps = db.get(VPS, job.vps_id) if job.vps_id else None
+            if vps is None:
+                raise JobError("VPS no longer exists")
+            job.result = HANDLERS[job.kind](get_driver(), db, job, vps, _progress(job_id))
+            job.status = JobStatus.SUCCEEDED
+            job.progress = 100
+            job.error = None
+            job.lease_until = None
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            JOB_RUNS.labels(kind, "failed").inc()
+            return _fail(db, job_id, e)
+        finally:
+            JOB_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        JOB_RUNS.labels(kind, "succeeded").inc()
+        return None
+
+
+@celery_app.task(bind=True, name="vps.run_job", max_retries=None)
+def run_job(self, job_id: int) -> None:
+    delay = execute(job_id)
+    if delay is not None:
+        raise self.retry(countdown=delay)
+
+
+def sweep(now: Optional[datetime] = None) -> int:
+    """Re-send queued jobs overdue by a sweep interval and running jobs whose lease expired"""
+    now = now or datetime.utcnow()
+    overdue = now - timedelta(seconds=settings.JOB_SWEEP_SECONDS)
+    with session_factory() as db:
+        job_ids = db.scalars(
+            select(Job.id).where(or_(
+                and_(Job.status == JobStatus.QUEUED, Job.run_after < overdue),
+                and_(Job.status == JobStatus.RUNNING, Job.lease_until < now),
+            )).order_by(Job.id)
+        ).all()
+    _send(list(job_ids))
+    return len(job_ids)
+
+
+async def sweep_loop(interval: float) -> None:
+    """Run ``sweep`` off the event loop every ``interval`` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(sweep)
+            if count:
+                logger.info(f"jobs_resent count={count}")
+        except Exception:
+            logger.exception("job_sweep_failed")
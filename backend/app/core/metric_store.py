@@ -0,0 +1,452 @@
+"""
+Usage history per VPS and per host in NumPy ring buffers.
+
+``stats_cache`` only holds the latest figures; a ``MetricStore`` keeps their
+history without a row per sample. Each series (a VPS or a host) is one row,
+and each resolution tier is one float32 array of shape (rows, slots,
+aggregates, metrics) used as a ring: bucket ``b`` lives in slot
+``b % slots``. All rows share the store's clock, so a slot's time is one
+``stamps`` entry rather than a timestamp per sample, and a series that
+reported nothing in a bucket reads NaN there.
+
+The first tier holds the samples themselves (10s for an hour by default).
+Each coarser tier (1m, 5m and 1h by default, see METRICS_TIERS) holds
+min/avg/max, rolled up from the tier below across all rows at once when the
+clock leaves a window. Queries use the finest tier that still covers the
+requested range and aggregate it into the requested step. Series that have
+been silent for longer than the store keeps anything are freed for reuse.
+
+With a directory, the arrays and each tier's slot stamps are memory-mapped
+``.npy`` files, and ``index.json`` maps series to rows. ``save`` (every
+METRICS_PERSIST_SECONDS) flushes the arrays and rewrites the index, as do
+new series and growth, so a restart picks the history up again. A layout
+change (tiers or metrics) starts the store afresh.
+
+One process writes: the worker that collects stats (``set_writer``, see
+app.core.vps_stats). Every other worker opens the same files read-only. The
+writer's samples show up in their mappings as it records them, and a new
+index (new series, grown arrays) is picked up on the next query.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VPS_METRICS = ("cpu", "ram", "disk", "disk_read", "disk_write", "net_in", "net_out")
+HOST_METRICS = ("cpu", "running", "disk_read", "disk_write", "net_in", "net_out")
+METRICS = {"vps": VPS_METRICS, "host": HOST_METRICS}
+
+_DURATION = re.compile(r"^(\d+)([smhd]?)$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text: str) -> int:
+    """Seconds in "90", "30s", "5m", "1h" or "7d"; raises ValueError"""
+    match = _DURATION.match(text.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid duration {text!r}")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+def parse_tiers(spec: str) -> List[Tuple[int, int]]:
+    """METRICS_TIERS ("10s:1h,1m:6h,...", step:retention) as (step seconds, slots)"""
+    tiers: List[Tuple[int, int]] = []
+    for part in spec.split(","):
+        step, retention = (parse_duration(p) for p in part.split(":"))
+        if tiers and (step <= tiers[-1][0] or step % tiers[-1][0]):
+            raise ValueError(f"Tier step {part!r} must be a larger multiple of the previous one")
+        tiers.append((step, max(1, retention // step)))
+    return tiers
+
+
+def _reduce(block: np.ndarray, axis: int) -> np.ndarray:
+    """min/avg/max over ``axis`` of a (..., aggregates, metrics) block, NaNs ignored"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN windows stay NaN
+        return np.stack([
+            np.nanmin(block[..., 0, :], axis=axis),
+            np.nanmean(block[..., block.shape[-2] // 2, :], axis=axis),
+            np.nanmax(block[..., -1, :], axis=axis),
+        ], axis=-2)
+
+
+class _Tier:
+    """One resolution: a ring of ``slots`` buckets of ``step`` seconds for every row"""
+
+    def __init__(self, step: int, slots: int, data: np.ndarray, stamps: np.ndarray):
+        self.step = step
+        self.slots = slots
+        self.data = data
+        self.stamps = stamps  # Bucket held by each slot, -1 for none
+
+    @property
+    def bucket(self) -> int:
+        """Latest bucket (-1 before the first)"""
+        return int(self.stamps.max())
+
+    def advance(self, bucket: int) -> None:
+        """Move the clock to ``bucket``, blanking the slots it reuses"""
+        latest = self.bucket
+        if bucket <= latest:
+            return
+        buckets = np.arange(max(latest + 1, bucket - self.slots + 1), bucket + 1)
+        slots = buckets % self.slots
+        if latest >= 0:  # A new ring is all NaN already
+            self.data[:, slots] = np.nan
+        self.stamps[slots] = buckets
+
+    def read(self, rows, first: int, last: int) -> np.ndarray:
+        """Buckets ``first``..``last`` of ``rows`` (a row index or an index array), NaN where not held"""
+        buckets = np.arange(first, last + 1)
+        slots = buckets % self.slots
+        block = self.data[rows, slots] if np.isscalar(rows) else self.data[rows][:, slots]
+        block[..., self.stamps[slots] != buckets, :, :] = np.nan
+        return block
+
+
+class MetricStore:
+    """Ring-buffer history for one kind of series (``metrics`` per sample)"""
+
+    def __init__(self, metrics: Sequence[str], tiers: Optional[List[Tuple[int, int]]] = None,
+                 directory: Optional[str] = None, capacity: int = 1024, writable: bool = True):
+        self.metrics = tuple(metrics)
+        self.layout = tiers or parse_tiers(settings.METRICS_TIERS)
+        self.directory = directory
+        self.writable = writable or not directory
+        self._lock = threading.Lock()
+        self._rows: Dict[int, int] = {}
+        self._tiers: List[_Tier] = []
+        self._version = None  # The index file the mappings were opened from
+        if not directory or not self._load():
+            if not self.writable:
+                return  # Nothing written yet: empty until the writer's index appears
+            self._tiers = [
+                _Tier(step, slots, self._allocate(i, capacity), self._allocate_stamps(i))
+                for i, (step, slots) in enumerate(self.layout)
+            ]
+            self._last_seen = np.full(capacity, -1, dtype=np.int64)
+            self._free = list(range(capacity - 1, -1, -1))
+            if directory:
+                self._write_index()
+
+    # -- storage --------------------------------------------------------
+
+    def _path(self, tier: int, kind: str = "") -> str:
+        return os.path.join(self.directory, f"{self.layout[tier][0]}s{kind}.npy")
+
+    def _shape(self, tier: int, rows: int) -> Tuple[int, ...]:
+        return rows, self.layout[tier][1], 1 if tier == 0 else 3, len(self.metrics)
+
+    def _allocate(self, tier: int, rows: int, suffix: str = "") -> np.ndarray:
+        if not self.directory:
+            return np.full(self._shape(tier, rows), np.nan, dtype=np.float32)
+        os.makedirs(self.directory, exist_ok=True)
+        data = np.lib.format.open_memmap(self._path(tier) + suffix, mode="w+", dtype=np.float32,
+                                         shape=self._shape(tier, rows))
+        data[:] = np.nan
+        return data
+
+    def _allocate_stamps(self, tier: int) -> np.ndarray:
+        if not self.directory:
+            return np.full(self.layout[tier][1], -1, dtype=np.int64)
+        stamps = np.lib.format.open_memmap(self._path(tier, ".stamps"), mode="w+", dtype=np.int64,
+                                           shape=(self.layout[tier][1],))
+        stamps[:] = -1
+        return stamps
+
+    def _grow(self, rows: int = 1) -> None:
+        # By at least a quarter rather than doubling: rows are tens of KB each, so slack adds up
+        capacity = len(self._last_seen)
+        grown = capacity + max(rows, capacity // 4, 1024)
+        for i, tier in enumerate(self._tiers):
+            data = self._allocate(i, grown, suffix=".tmp")
+            data[:capacity] = tier.data
+            if self.directory:
+                data.flush()
+                os.replace(self._path(i) + ".tmp", self._path(i))
+            tier.data = data
+        self._last_seen = np.concatenate([self._last_seen, np.full(grown - capacity, -1, dtype=np.int64)])
+        self._free.extend(range(grown - 1, capacity - 1, -1))
+
+    def reserve(self, series: int) -> None:
+        """Make room for ``series`` series in one allocation rather than growing batch by batch"""
+        with self._lock:
+            missing = series - len(self._rows) - len(self._free)
+            if missing > 0:
+                self._grow(missing)
+                if self.directory:
+                    self._write_index()
+
+    def _index_version(self):
+        stat = os.stat(os.path.join(self.directory, "index.json"))
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self) -> bool:
+        mode = "r+" if self.writable else "r"
+        try:
+            version = self._index_version()
+            with open(os.path.join(self.directory, "index.json")) as f:
+                index = json.load(f)
+            if index["metrics"] != list(self.metrics) or index["tiers"] != [list(t) for t in self.layout]:
+                raise ValueError("layout changed")
+            arrays = [np.lib.format.open_memmap(self._path(i), mode=mode) for i in range(len(self.layout))]
+            stamps = [np.lib.format.open_memmap(self._path(i, ".stamps"), mode=mode) for i in range(len(self.layout))]
+            capacity = arrays[0].shape[0]
+            if any(a.shape != self._shape(i, capacity) for i, a in enumerate(arrays)) \
+                    or any(s.shape != (slots,) for s, (_, slots) in zip(stamps, self.layout)):
+                raise ValueError("array shapes don't match the index")
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            if self.writable:
+                logger.warning(f"metric_store_reset directory={self.directory} reason={e}")
+            else:  # e.g. the writer is growing the arrays; try again on the next query
+                logger.debug(f"metric_store_reload_skipped directory={self.directory} reason={e}")
+            return False
+        self._tiers = [_Tier(step, slots, data, stamp)
+                       for (step, slots), data, stamp in zip(self.layout, arrays, stamps)]
+        self._rows = {int(id): row for id, row in index["rows"].items()}
+        self._last_seen = np.full(capacity, -1, dtype=np.int64)
+        self._last_seen[list(self._rows.values())] = index["last_seen"]
+        used = set(self._rows.values())
+        self._free = [row for row in range(capacity - 1, -1, -1) if row not in used]
+        self._version = version
+        return True
+
+    def refresh(self) -> None:
+        """Read-only stores: reopen the files when the writer has written a new index"""
+        if self.writable:
+            return
+        try:
+            version = self._index_version()
+        except FileNotFoundError:
+            return
+        if version != self._version:
+            with self._lock:
+                self._load()
+
+    def _write_index(self) -> None:
+        """Row map for the other processes and the next start (atomically; under the lock)"""
+        index = {
+            "metrics": list(self.metrics),
+            "tiers": [list(t) for t in self.layout],
+            "rows": {str(id): row for id, row in self._rows.items()},
+            "last_seen": self._last_seen[list(self._rows.values())].tolist(),
+        }
+        path = os.path.join(self.directory, "index.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def save(self) -> None:
+        """Free rows silent for longer than anything is kept, then flush to the directory (if any)"""
+        if not self.writable:
+            return
+        with self._lock:
+            self._expire()
+            arrays = [a for t in self._tiers for a in (t.data, t.stamps)]
+        if not self.directory:
+            return
+        # Flushed outside the lock: writes carry on meanwhile
+        for data in arrays:
+            data.flush()
+        with self._lock:
+            self._write_index()
+
+    def _expire(self) -> None:
+        raw = self._tiers[0]
+        horizon = raw.bucket - max(step * slots for step, slots in self.layout) // raw.step
+        for id, row in list(self._rows.items()):
+            if self._last_seen[row] < horizon:
+                for tier in self._tiers:
+                    tier.data[row] = np.nan
+                self._last_seen[row] = -1
+                del self._rows[id]
+                self._free.append(row)
+
+    # -- writing --------------------------------------------------------
+
+    def _row(self, id: int) -> int:
+        row = self._rows.get(id)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._rows[id] = self._free.pop()
+        return row
+
+    def _advance(self, now: int) -> None:
+        """Move every tier's clock to ``now`` (seconds), rolling completed windows up a tier first"""
+        for i, tier in enumerate(self._tiers):
+            if now // tier.step <= tier.bucket:
+                break  # Coarser tiers haven't moved either
+            if i + 1 < len(self._tiers) and tier.bucket >= 0:
+                parent = self._tiers[i + 1]
+                window = tier.bucket * tier.step // parent.step
+                if window < now // parent.step:
+                    k = parent.step // tier.step
+                    parent.advance(window)
+                    parent.data[:, window % parent.slots] = _reduce(
+                        tier.read(slice(None), window * k, window * k + k - 1), axis=1
+                    )
+            tier.advance(now // tier.step)
+
+    def record(self, ids: Sequence[int], values, at: Optional[float] = None) -> None:
+        """One sample per id at ``at`` (default now): rows of ``values`` in ``metrics`` order, None for missing"""
+        if not len(ids):
+            return
+        values = np.asarray(values, dtype=np.float64).astype(np.float32)  # None -> NaN
+        now = int(time.time() if at is None else at)
+        if not self.writable:
+            raise RuntimeError("metric store is read-only in this process")
+        with self._lock:
+            series = len(self._rows)
+            new = sum(id not in self._rows for id in ids) - len(self._free)
+            if new > 0:
+                self._grow(new)
+            rows = np.fromiter((self._row(id) for id in ids), dtype=np.intp, count=len(ids))
+            raw = self._tiers[0]
+            bucket, latest = now // raw.step, raw.bucket
+            if bucket > latest:
+                self._advance(now)
+            elif bucket <= latest - raw.slots:
+                return  # Older than anything kept
+            raw.data[rows, bucket % raw.slots, 0] = values
+            self._last_seen[rows] = np.maximum(self._last_seen[rows], bucket)
+            if self.directory and len(self._rows) != series:
+                self._write_index()  # New series: let the readers find them
+
+    # -- reading --------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Ring buffer bytes allocated, used rows and free ones alike"""
+        return sum(t.data.nbytes for t in self._tiers)  # Empty until a read-only store finds the writer's
+
+    def window(self, range_text: str, step_text: Optional[str] = None) -> Tuple[int, int]:
+        """(range, step) in seconds from query parameters; the default step keeps to about 360 points"""
+        span = parse_duration(range_text)
+        kept = max(step * slots for step, slots in self.layout)
+        if span > kept:
+            raise ValueError(f"range is limited to {kept}s")
+        if step_text:
+            step = parse_duration(step_text)
+        else:
+            step = next((s for s, _ in self.layout if span // s <= 360), self.layout[-1][0])
+        if step % self.layout[0][0]:
+            raise ValueError(f"step must be a multiple of {self.layout[0][0]}s")
+        if span // step > settings.METRICS_MAX_POINTS:
+            raise ValueError(f"range/step is limited to {settings.METRICS_MAX_POINTS} points")
+        return span, step
+
+    def query(self, id: int, start: float, end: float, step: int) -> Dict:
+        """
+        ``{"timestamps": [...], "metrics": {metric: {"min": [...], "avg": [...], "max": [...]}}}``,
+        one point per ``step`` seconds from ``start`` to ``end``; None where nothing was recorded
+        """
+        first, last = int(start) // step, int(end) // step
+        timestamps = np.arange(first, last + 1) * step
+        self.refresh()
+        with self._lock:
+            row = self._rows.get(id)
+            block = None
+            if row is not None:
+                # The finest tier that divides the step and still reaches back to start (give or take a point)
+                usable = [t for t in self._tiers if step % t.step == 0] or self._tiers[:1]
+                tier = next((t for t in usable if (t.bucket - t.slots + 1) * t.step <= (first + 1) * step),
+                            usable[-1])
+                k = step // tier.step
+                block = tier.read(row, first * k, (last + 1) * k - 1)
+        if block is None:
+            points = np.full((len(timestamps), 3, len(self.metrics)), np.nan, dtype=np.float32)
+        else:
+            points = _reduce(block.reshape(len(timestamps), k, *block.shape[1:]), axis=1)
+        return {
+            "timestamps": timestamps.tolist(),
+            "metrics": {
+                metric: {aggregate: _json(points[:, a, m]) for a, aggregate in enumerate(("min", "avg", "max"))}
+                for m, metric in enumerate(self.metrics)
+            },
+        }
+
+
+def _json(values: np.ndarray) -> List[Optional[float]]:
+    return [None if v != v else round(v, 2) for v in values.tolist()]
+
+
+_stores: Dict[str, MetricStore] = {}
+_stores_lock = threading.Lock()
+_writer = False  # Whether this process records history (it collects the stats)
+
+
+def _open(kind: str, writable: bool) -> MetricStore:
+    if not settings.METRICS_DIR:
+        return MetricStore(METRICS[kind])  # In memory: only the collecting worker has history
+    directory = os.path.join(settings.METRICS_DIR, kind)
+    if writable:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"metric_store_in_memory directory={directory} reason={e}")
+            return MetricStore(METRICS[kind])
+    return MetricStore(METRICS[kind], directory=directory, writable=writable)
+
+
+def get_store(kind: str) -> MetricStore:
+    """
+    This process's store for "vps" or "host" series under METRICS_DIR: the
+    writer while it collects stats, else a read-only view of the writer's files
+    """
+    with _stores_lock:
+        if kind not in _stores:
+            _stores[kind] = _open(kind, _writer)
+        return _stores[kind]
+
+
+def set_writer(writer: bool) -> None:
+    """Take over writing the stores (this worker now collects stats), or save and hand it back"""
+    global _writer
+    with _stores_lock:
+        if writer == _writer:
+            return
+        previous = list(_stores.values())
+        _writer = writer
+        _stores.clear()
+    if not writer:
+        for store in previous:
+            store.save()
+
+
+def history(kind: str, id: int, range_text: str, step_text: Optional[str] = None) -> Dict:
+    """A stats endpoint's body: the last ``range`` of a series at ``step``; raises ValueError on bad parameters"""
+    store = get_store(kind)
+    span, step = store.window(range_text, step_text)
+    now = time.time()
+    return {"range": span, "step": step, **store.query(id, now - span, now, step)}
+
+
+def save_stores() -> None:
+    """Save this process's stores (a no-op unless it is the writer)"""
+    for store in list(_stores.values()):
+        store.save()
+
+
+async def persist_loop(interval: float) -> None:
+    """Run ``save_stores`` off the event loop every ``interval`` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(save_stores)
+        except Exception:
+            logger.exception("metric_store_save_failed")
@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A cursor is an opaque token naming the row a page starts after (``next``) or
+before (``prev``). Pages are fetched with ``WHERE key > anchor ORDER BY key
+LIMIT n``, so their cost does not grow with depth, and rows inserted while a
+client pages through cannot shift or duplicate what it has already seen.
+
+Composite keys such as ``(created_at, id)`` are compared against the anchor
+row's own stored values (a subquery on its id), which keeps the comparison in
+the database's native representation. A cursor whose row has since been
+deleted ends the listing.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.sql import Select
+from app.core.database import AnySession
+
+NEXT = "next"
+PREV = "prev"
+
+
+def encode_cursor(row_id: int, direction: str = NEXT) -> str:
+    raw = json.dumps({"id": row_id, "d": direction}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return (row id, direction); malformed cursors are a 400"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        row_id, direction = int(data["id"]), data.get("d", NEXT)
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+        return row_id, direction
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@dataclass
+class Page:
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+async def count_total(db: AnySession, query: Select) -> int:
+    """Row count for a list query, ignoring its ordering and paging"""
+    inner = query.order_by(None).limit(None).offset(None).subquery()
+    return await db.scalar(select(func.count()).select_from(inner))
+
+
+async def paginate(
+    db: AnySession,
+    query: Select,
+    model,
+    *,
+    keys: Sequence,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+    include_total: bool = False,
+) -> Page:
+    """
+    Fetch one keyset page of ``query`` ordered by ``keys`` (ending in the
+    primary key). ``model`` must have an integer ``id`` column.
+    """
+    total = await count_total(db, query) if include_total else None
+
+    anchor_id, direction = decode_cursor(cursor) if cursor else (None, NEXT)
+    # Walking backwards is walking forwards in the opposite order
+    reverse = descending != (direction == PREV)
+    if anchor_id is not None:
+        key = tuple_(*keys) if len(keys) > 1 else keys[0]
+        if len(keys) > 1:
+            anchor = select(*keys).where(model.id == anchor_id).scalar_subquery()
+        else:
+            anchor = anchor_id
+        query = query.where(key < anchor if reverse else key > anchor)
+    ordering = [k.desc() if reverse else k.asc() for k in keys]
+
+    rows = list((await db.scalars(query.order_by(*ordering).limit(limit + 1))).all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == PREV:
+        rows.reverse()
+
+    page = Page(items=rows, total=total)
+    if rows:
+        more_after = has_more if direction == NEXT else anchor_id is not None
+        more_before = anchor_id is not None if direction == NEXT else has_more
+        if more_after:
+            page.next_cursor = encode_cursor(rows[-1].id, NEXT)
+        if more_before:
+            page.prev_cursor = encode_cursor(rows[0].id, PREV)
+    return page
+
+
+def set_page_headers(response: Response, request: Request, page: Page) -> None:
+    """RFC 8288 Link header (rel=next/prev) plus X-Total-Count when counted"""
+    links = []
+    for rel, value in (("next", page.next_cursor), ("prev", page.prev_cursor)):
+        if value:
+            url = request.url.remove_query_params("skip").include_query_params(cursor=value)
+            links.append(f'<{url}>; rel="{rel}"')
+    if links:
+        response.headers["Link"] = ", ".join(links)
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
@@ -0,0 +1,102 @@
+"""
+In-process cache of authenticated principals.
+
+``get_current_user`` resolves the token subject to a lightweight, immutable
+snapshot of the user instead of loading the ORM row on every request. Entries
+expire after ``PRINCIPAL_CACHE_TTL_SECONDS``. Updating or deleting a user
+drops its entry in every worker: the change is recorded as a revocation row
+(``RevocationList.principal_changed``) that the other workers pick up within
+``REVOCATION_SYNC_SECONDS``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.models.user import User, UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Snapshot of the fields routes need from the authenticated user"""
+    id: int
+    uuid: str
+    email: str
+    username: str
+    full_name: Optional[str]
+    role: UserRole
+    is_active: bool
+    is_2fa_enabled: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            uuid=user.uuid,
+            email=user.email,
+            username=user.username,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+            is_2fa_enabled=user.is_2fa_enabled,
+        )
+
+
+class PrincipalCache:
+    """Thread-safe TTL + LRU cache of principals keyed by user id"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_seconds > 0
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, principal: Principal) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[principal.id] = (principal, expires_at)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
@@ -1,34 +1,418 @@
 """
-Lightweight in-memory IP-based rate limiting utilities.
-Note: Suitable for single-process dev; for production, use Redis.
+Rate limiting: sliding-window login throttling and API token buckets.
+
+Login failures are recorded per client IP in a Redis sorted set so every
+worker shares the same window; each check is a single MULTI/EXEC round trip.
+When Redis is unreachable the limiter falls back to a size-bounded in-memory
+store that is swept periodically.
 """
+import math
+import threading
 import time
-from typing import Dict, Tuple
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import redis
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from app.core.config import settings
+from app.core.redis_client import get_redis, mark_unavailable
+from app.core.security import decode_token
+
+
+class MemoryWindowStore:
+    """Per-process sliding windows with LRU eviction and periodic sweeping"""
+
+    def __init__(self, max_keys: int, sweep_interval: float):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._windows: "OrderedDict[str, Tuple[Deque[float], float]]" = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _trim(self, key: str, now: float, window: float) -> Deque[float]:
+        entry = self._windows.get(key)
+        if entry is None:
+            return deque()
+        events = entry[0]
+        while events and events[0] <= now - window:
+            events.popleft()
+        if not events:
+            del self._windows[key]
+        return events
+
+    def _maybe_sweep(self, now: float) -> None:
+        if time.monotonic() < self._next_sweep:
+            return
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        expired = [k for k, (events, window) in self._windows.items() if not events or events[-1] <= now - window]
+        for key in expired:
+            del self._windows[key]
+
+    def add(self, key: str, now: float, window: float) -> int:
+        with self._lock:
+            self._maybe_sweep(now)
+            events = self._trim(key, now, window)
+            events.append(now)
+            self._windows[key] = (events, window)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            return len(events)
+
+    def count(self, key: str, now: float, window: float) -> int:
+        with self._lock:
+            self._maybe_sweep(now)
+            return len(self._trim(key, now, window))
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class LoginThrottle:
+    """Sliding-window failure counter backed by Redis with an in-memory fallback"""
+
+    key_prefix = "login_fail:"
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Optional[redis.Redis]] = get_redis,
+        on_redis_error: Callable[[], None] = mark_unavailable,
+        memory: Optional[MemoryWindowStore] = None,
+    ):
+        self._redis_factory = redis_factory
+        self._on_redis_error = on_redis_error
+        self.memory = memory or MemoryWindowStore(
+            max_keys=settings.LOGIN_THROTTLE_MAX_KEYS,
+            sweep_interval=settings.LOGIN_THROTTLE_SWEEP_SECONDS,
+        )
+
+    def _redis(self) -> Optional[redis.Redis]:
+        try:
+            return self._redis_factory()
+        except redis.RedisError:
+            self._on_redis_error()
+            return None
 
+    def attempts(self, ip: str, window_seconds: int) -> int:
+        now = time.time()
+        client = self._redis()
+        if client is not None:
+            key = self.key_prefix + ip
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.zremrangebyscore(key, 0, now - window_seconds)
+                pipe.zcard(key)
+                return int(pipe.execute()[1])
+            except redis.RedisError:
+                self._on_redis_error()
+        return self.memory.count(ip, now, window_seconds)
 
-_ip_failures: Dict[str, Tuple[int, float]] = {}
+    def record(self, ip: str, window_seconds: int) -> int:
+        now = time.time()
+        client = self._redis()
+        if client is not None:
+            key = self.key_prefix + ip
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.zremrangebyscore(key, 0, now - window_seconds)
+                pipe.zadd(key, {f"{now:.6f}:{uuid.uuid4().hex[:8]}": now})
+                pipe.zcard(key)
+                pipe.expire(key, int(window_seconds) + 1)
+                return int(pipe.execute()[2])
+            except redis.RedisError:
+                self._on_redis_error()
+        return self.memory.add(ip, now, window_seconds)
+
+    def reset(self, ip: str) -> None:
+        client = self._redis()
+        if client is not None:
+            try:
+                client.delete(self.key_prefix + ip)
+            except redis.RedisError:
+                self._on_redis_error()
+        self.memory.reset(ip)
+
+
+_throttle = LoginThrottle()
 
 
 def should_throttle(ip: str, max_attempts: int = 5, window_seconds: int = 60) -> bool:
-    now = time.time()
-    attempts, reset = _ip_failures.get(ip, (0, now + window_seconds))
-    # Reset window if expired
-    if now > reset:
-        attempts = 0
-        reset = now + window_seconds
-    return attempts >= max_attempts
+    return _throttle.attempts(ip, window_seconds) >= max_attempts
 
 
 def record_failure(ip: str, window_seconds: int = 60) -> None:
-    now = time.time()
-    attempts, reset = _ip_failures.get(ip, (0, now + window_seconds))
-    if now > reset:
-        attempts = 0
-        reset = now + window_seconds
-    _ip_failures[ip] = (attempts + 1, reset)
+    _throttle.record(ip, window_seconds)
 
 
 def reset_counter(ip: str) -> None:
-    _ip_failures.pop(ip, None)
+    _throttle.reset(ip)
+
+
+# ---------------------------------------------------------------------------
+# General API rate limiting (token buckets per user, role and route template)
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class BucketLimit:
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "BucketLimit":
+        """Parse ``"<requests>/<seconds>"``, e.g. ``"120/60"``"""
+        count, _, seconds = spec.partition("/")
+        capacity = float(count)
+        return cls(capacity=capacity, refill_per_second=capacity / float(seconds or 1))
+
+
+@dataclass(frozen=True)
+class BucketResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+def _summarize(allowed: bool, limits: List[BucketLimit], tokens: List[float]) -> BucketResult:
+    """Report the most restrictive bucket of a multi-bucket check"""
+    idx = min(range(len(limits)), key=lambda i: tokens[i] / limits[i].capacity)
+    limit = limits[idx]
+    retry_after = 0.0
+    if not allowed:
+        retry_after = max(
+            (1 - tokens[i]) / limits[i].refill_per_second for i in range(len(limits)) if tokens[i] < 1
+        )
+    return BucketResult(
+        allowed=allowed,
+        limit=int(limit.capacity),
+        remaining=max(0, int(tokens[idx])),
+        reset_after=(limit.capacity - tokens[idx]) / limit.refill_per_second,
+        retry_after=retry_after,
+    )
+
+
+class ShardedBucketStore:
+    """In-process token buckets spread over independently locked shards"""
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 20000):
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards: List[Dict[str, List[float]]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def take(self, checks: List[Tuple[str, BucketLimit]], now: float) -> BucketResult:
+        # All buckets of one request share a shard so the check is all-or-nothing
+        n = hash(checks[0][0]) % len(self._shards)
+        shard = self._shards[n]
+        limits = [limit for _, limit in checks]
+        with self._locks[n]:
+            states = []
+            for key, limit in checks:
+                state = shard.get(key)
+                if state is None:
+                    state = [limit.capacity, now]
+                else:
+                    state[0] = min(limit.capacity, state[0] + (now - state[1]) * limit.refill_per_second)
+                    state[1] = now
+                states.append(state)
+            allowed = all(state[0] >= 1 for state in states)
+            for (key, _), state in zip(checks, states):
+                if allowed:
+                    state[0] -= 1
+                shard[key] = state
+            if len(shard) > self.max_keys_per_shard:
+                self._sweep(shard, now)
+            tokens = [state[0] for state in states]
+        return _summarize(allowed, limits, tokens)
+
+    @staticmethod
+    def _sweep(shard: Dict[str, List[float]], now: float) -> None:
+        # Buckets idle for a minute have refilled for any sane limit; drop them
+        idle = [key for key, (_, ts) in shard.items() if now - ts > 60]
+        for key in idle:
+            del shard[key]
+        if len(shard) > 1 and not idle:
+            for key in list(shard)[: len(shard) // 2]:
+                del shard[key]
+
+
+_TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local ok = 1
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  local state = redis.call('HMGET', KEYS[i], 't', 'ts')
+  local t = tonumber(state[1]) or cap
+  local ts = tonumber(state[2]) or now
+  t = math.min(cap, t + math.max(0, now - ts) * rate)
+  tokens[i] = t
+  if t < 1 then ok = 0 end
+end
+local out = {ok}
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  local t = tokens[i]
+  if ok == 1 then t = t - 1 end
+  redis.call('HSET', KEYS[i], 't', t, 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil(cap / rate * 1000) + 1000)
+  out[i + 1] = tostring(t)
+end
+return out
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers; one EVALSHA round trip per request"""
+
+    key_prefix = "ratelimit:"
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Optional[redis.Redis]] = get_redis,
+        on_redis_error: Callable[[], None] = mark_unavailable,
+        fallback: Optional[ShardedBucketStore] = None,
+    ):
+        self._redis_factory = redis_factory
+        self._on_redis_error = on_redis_error
+        self._script = None
+        self.fallback = fallback or ShardedBucketStore()
+
+    def take(self, checks: List[Tuple[str, BucketLimit]], now: float) -> BucketResult:
+        client = self._redis_factory()
+        if client is not None:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(_TOKEN_BUCKET_LUA)
+                args: List[float] = [now]
+                for _, limit in checks:
+                    args.extend((limit.capacity, limit.refill_per_second))
+                reply = self._script(keys=[self.key_prefix + key for key, _ in checks], args=args, client=client)
+                tokens = [float(t) for t in reply[1:]]
+                return _summarize(bool(int(reply[0])), [limit for _, limit in checks], tokens)
+            except redis.RedisError:
+                self._on_redis_error()
+        return self.fallback.take(checks, now)
+
+
+class ApiRateLimiter:
+    """Resolves the buckets that apply to a request and consumes one token from each"""
+
+    def __init__(
+        self,
+        store,
+        default: str,
+        roles: Dict[str, str],
+        routes: Dict[str, str],
+    ):
+        self.store = store
+        self.default = BucketLimit.parse(default)
+        self.roles = {role: BucketLimit.parse(spec) for role, spec in roles.items()}
+        self.routes = {route: BucketLimit.parse(spec) for route, spec in routes.items()}
+
+    def check(self, identity: str, role: str, route: Optional[str], now: Optional[float] = None) -> BucketResult:
+        checks = [(identity, self.roles.get(role, self.default))]
+        route_limit = self.routes.get(route) if route else None
+        if route_limit is not None:
+            checks.append((f"{identity}|{route}", route_limit))
+        return self.store.take(checks, time.time() if now is None else now)
+
+
+def _build_api_limiter() -> ApiRateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        store = RedisBucketStore()
+    else:
+        store = ShardedBucketStore()
+    return ApiRateLimiter(
+        store,
+        default=settings.RATE_LIMIT_DEFAULT,
+        roles=settings.RATE_LIMIT_ROLES,
+        routes=settings.RATE_LIMIT_ROUTES,
+    )
+
+
+api_limiter = _build_api_limiter()
+
+_route_templates: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+_ROUTE_TEMPLATE_CACHE_SIZE = 4096
+
+
+def _route_template(request: Request) -> Optional[str]:
+    """Map a request to ``"<METHOD> <path template>"`` (memoized per concrete path)"""
+    cache_key = (request.method, request.url.path)
+    template = _route_templates.get(cache_key)
+    if template is not None or cache_key in _route_templates:
+        return template
+    template = None
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            template = f"{request.method} {route.path}"
+            break
+    _route_templates[cache_key] = template
+    if len(_route_templates) > _ROUTE_TEMPLATE_CACHE_SIZE:
+        _route_templates.popitem(last=False)
+    return template
+
+
+def _identity(request: Request) -> Tuple[str, str]:
+    """Return (bucket identity, role) from the bearer token or the client IP"""
+    auth = request.headers.get("authorization")
+    if auth and auth[:7].lower() == "bearer ":
+        payload = decode_token(auth[7:])
+        if payload and payload.get("type") == "access" and payload.get("sub") is not None:
+            return f"user:{payload['sub']}", payload.get("role") or "user"
+    client_ip = request.client.host if request.client else "unknown"
+    return f"ip:{client_ip}", "anonymous"
+
+
+def _rate_limit_headers(result: BucketResult) -> Dict[str, str]:
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+
+
+async def rate_limit_middleware(request: Request, call_next: Callable):
+    """Middleware applying per-user, per-role and per-route token buckets to /api"""
+    if (
+        not settings.RATE_LIMIT_ENABLED
+        or request.method == "OPTIONS"
+        or not request.url.path.startswith("/api/v1/")
+    ):
+        return await call_next(request)
 
+    identity, role = _identity(request)
+    result = api_limiter.check(identity, role, _route_template(request))
+    headers = _rate_limit_headers(result)
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+        return JSONResponse(
+            status_code=429,
+            headers=headers,
+            content={
+                "error": {
+                    "code": 429,
+                    "type": "rate_limited",
+                    "detail": "Too many requests",
+                },
+                "request_id": getattr(request.state, "request_id", None),
+            },
+        )
 
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,38 @@
+"""
+Shared Redis client with a short failure backoff.
+
+Callers that can degrade gracefully (rate limiting, caches) ask for the client
+with ``get_redis()`` and call ``mark_unavailable()`` when a command fails, so
+the next requests skip Redis instead of each waiting on a connect timeout.
+"""
+import threading
+import time
+from typing import Optional
+import redis
+from app.core.config import settings
+
+_client: Optional[redis.Redis] = None
+_down_until = 0.0
+_lock = threading.Lock()
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """Return the shared client, or None while Redis is disabled or backing off"""
+    global _client
+    if not settings.REDIS_ENABLED or time.monotonic() < _down_until:
+        return None
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = redis.from_url(
+                    settings.REDIS_URL,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                )
+    return _client
+
+
+def mark_unavailable() -> None:
+    """Skip Redis for REDIS_RETRY_SECONDS after a failed command"""
+    global _down_until
+    _down_until = time.monotonic() + settings.REDIS_RETRY_SECONDS
@@ -0,0 +1,236 @@
+"""
+Token revocation: refresh-token rotation, logout and "revoke all sessions".
+
+Revocations are stored in the ``revoked_tokens`` table. Each process keeps a
+Bloom filter of revoked jtis, backed by the exact set of them, and tops both
+up incrementally (rows with an id above the last one seen) from ``sync_loop``,
+a background task that also purges expired rows. The check run by
+``decode_token`` on every request never touches the database: a few hash
+probes, and a set lookup for Bloom hits. User-wide revocations are rare and
+kept as an exact ``user_id -> cutoff`` map.
+
+The same rows carry principal invalidations: ``principal_changed`` records
+that a user's role, status or profile changed (or the user was deleted), and
+each process drops its cached principal for that user when it syncs the row.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.principal_cache import principal_cache
+from app.core.security import register_revocation_check
+from app.models.revoked_token import RevokedToken, RevocationScope
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one BLAKE2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationList:
+    """Per-process view of revoked tokens, refreshed from the database by ``sync_loop``"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._bloom, self._jtis, self._user_cutoffs = self._empty()
+        self._last_id = 0
+        self._next_purge = time.monotonic() + settings.REVOCATION_PURGE_SECONDS
+        # Revocations made here while a purge rebuilds the view, re-applied to the new one
+        self._rebuilding: Optional[List[Tuple[str, str, Optional[int], datetime]]] = None
+
+    @staticmethod
+    def _empty() -> Tuple[BloomFilter, Set[str], Dict[str, float]]:
+        bloom = BloomFilter(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+        return bloom, set(), {}
+
+    # -- hot path: memory only, it runs inside async request handling ----
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Revocation hook for decode_token"""
+        if self.is_user_revoked(payload):
+            return True
+        jti = payload.get("jti")
+        # The filter turns away almost every live token; the exact set settles its hits
+        return bool(jti) and jti in self._bloom and jti in self._jtis
+
+    def is_user_revoked(self, payload: dict) -> bool:
+        """True if the token predates a "revoke all sessions" for its user"""
+        sub = payload.get("sub")
+        cutoff = self._user_cutoffs.get(str(sub)) if sub is not None else None
+        # iat has 1s resolution: tokens minted in the revocation second are revoked too
+        return cutoff is not None and payload.get("iat", 0) <= int(cutoff)
+
+    # -- refresh (blocking; run off the event loop) ----------------------
+
+    def sync(self) -> None:
+        """Pull revocations added since the last sync (all processes); purge expired rows when due"""
+        purge = time.monotonic() >= self._next_purge
+        with self._lock:
+            if purge:
+                self._rebuilding = []
+            after_id = 0 if purge else self._last_id
+        try:
+            with self._session_factory() as db:
+                if purge:
+                    db.query(RevokedToken).filter(RevokedToken.expires_at < datetime.utcnow()).delete(
+                        synchronize_session=False
+                    )
+                    db.commit()
+                rows = (
+                    db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.scope,
+                             RevokedToken.user_id, RevokedToken.revoked_at)
+                    .filter(RevokedToken.id > after_id)
+                    .order_by(RevokedToken.id)
+                    .all()
+                )
+        except Exception:
+            logger.exception("revocation_sync_failed")
+            with self._lock:
+                self._rebuilding = None
+            return
+        with self._lock:
+            if purge:
+                # Rebuilt from the rows that survived, then swapped in whole
+                view = self._empty()
+                for entry in self._rebuilding:
+                    self._apply(view, *entry)
+                self._rebuilding = None
+                self._next_purge = time.monotonic() + settings.REVOCATION_PURGE_SECONDS
+            else:
+                view = (self._bloom, self._jtis, self._user_cutoffs)
+            for row in rows:
+                self._apply(view, row.jti, row.scope, row.user_id, row.revoked_at)
+                after_id = row.id
+            self._bloom, self._jtis, self._user_cutoffs = view
+            self._last_id = after_id
+
+    async def sync_loop(self, interval: float) -> None:
+        """Run ``sync`` off the event loop now and then every ``interval`` seconds"""
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception:
+                logger.exception("revocation_sync_failed")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _apply(view, jti: str, scope: str, user_id: Optional[int], revoked_at: datetime) -> None:
+        bloom, jtis, user_cutoffs = view
+        if scope == RevocationScope.PRINCIPAL:
+            principal_cache.invalidate(int(jti.split(":")[1]))
+        elif scope == RevocationScope.USER:
+            key = str(user_id)
+            user_cutoffs[key] = max(user_cutoffs.get(key, 0.0), _epoch(revoked_at))
+        else:
+            bloom.add(jti)
+            jtis.add(jti)
+
+    def _apply_local(self, jti: str, scope: str, user_id: Optional[int], revoked_at: datetime) -> None:
+        with self._lock:
+            self._apply((self._bloom, self._jtis, self._user_cutoffs), jti, scope, user_id, revoked_at)
+            if self._rebuilding is not None:
+                self._rebuilding.append((jti, scope, user_id, revoked_at))
+
+    # -- writes ---------------------------------------------------------
+
+    def revoke_token(self, db: Session, payload: dict) -> bool:
+        """
+        Revoke a single token by jti. Returns False if it was already revoked,
+        which the refresh endpoint treats as token reuse.
+        """
+        jti = payload.get("jti")
+        if not jti:
+            return False
+        now = datetime.utcnow()
+        db.add(RevokedToken(
+            jti=jti,
+            scope=RevocationScope.TOKEN,
+            user_id=int(payload["sub"]) if payload.get("sub") is not None else None,
+            revoked_at=now,
+            expires_at=datetime.utcfromtimestamp(payload["exp"]),
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        self._apply_local(jti, RevocationScope.TOKEN, None, now)
+        return True
+
+    def revoke_user(self, db: Session, user_id: int) -> None:
+        """Revoke every token issued to the user up to now"""
+        now = datetime.utcnow()
+        db.add(RevokedToken(
+            jti=f"user:{user_id}:{uuid.uuid4().hex}",
+            scope=RevocationScope.USER,
+            user_id=user_id,
+            revoked_at=now,
+            expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        ))
+        db.commit()
+        self._apply_local("", RevocationScope.USER, user_id, now)
+
+    def principal_changed(self, db: Session, user_id: int) -> None:
+        """Drop the user's cached principal here now, and in every other process at its next sync"""
+        now = datetime.utcnow()
+        jti = f"principal:{user_id}:{uuid.uuid4().hex}"
+        db.add(RevokedToken(
+            jti=jti,
+            scope=RevocationScope.PRINCIPAL,
+            revoked_at=now,
+            # By then every process has synced the row or let its cache entry expire
+            expires_at=now + timedelta(
+                seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS + settings.REVOCATION_SYNC_SECONDS
+            ),
+        ))
+        db.commit()
+        self._apply_local(jti, RevocationScope.PRINCIPAL, None, now)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bloom_bits": self._bloom.num_bits,
+            "bloom_hashes": self._bloom.num_hashes,
+            "last_id": self._last_id,
+            "revoked_jtis": len(self._jtis),
+            "user_cutoffs": len(self._user_cutoffs),
+        }
+
+
+revocation_list = RevocationList()
+register_revocation_check(revocation_list.is_revoked)
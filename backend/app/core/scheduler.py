@@ -0,0 +1,270 @@
+"""
+VPS placement: which host a new VPS goes on.
+
+Each process keeps a ``CapacityIndex`` of free (cpu, ram, storage) per ONLINE
+host. Hosts are bucketed by free CPU, and each bucket is sorted by free RAM.
+A query bisects to the buckets with enough CPU, then bisects each of those
+buckets to the first host with enough RAM. That is O(b log n) for b distinct
+free-CPU values, however fragmented the cluster is. The per-bucket runs are
+merged so that best-fit takes the host with the least free RAM that still
+fits, and spread takes the host with the most.
+
+The index is only a hint. A placement becomes a reservation through one
+conditional UPDATE of the host's ``used_*`` columns. The UPDATE succeeds
+only while the host is still ONLINE and the VPS still fits, so concurrent
+creates, including those from other workers with stale indexes, can never
+overcommit a host. The UPDATE runs in the caller's transaction, so rolling
+back the create also rolls back the reservation. ``abort`` puts the capacity
+back into the local index. A lost race refreshes that host's entry from the
+database and moves on to the next candidate. The whole index is reloaded
+every SCHEDULER_REFRESH_SECONDS.
+"""
+import bisect
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.core.database import AnySession
+from app.models.host import Host, HostStatus
+
+BEST_FIT = "best_fit"
+SPREAD = "spread"
+
+
+class NoCapacity(Exception):
+    """No ONLINE host can take the requested resources"""
+
+
+@dataclass(frozen=True)
+class Resources:
+    cpu: int
+    ram: float
+    storage: float
+
+    def __neg__(self) -> "Resources":
+        return Resources(-self.cpu, -self.ram, -self.storage)
+
+
+@dataclass(frozen=True)
+class Reservation:
+    host_id: int
+    resources: Resources
+
+
+class CapacityIndex:
+    """Free capacity per host: one bucket per free-CPU value, each sorted by (free ram, free storage, host id)"""
+
+    def __init__(self):
+        self._cpus: List[float] = []
+        self._buckets: Dict[float, List[Tuple[float, float, int]]] = {}
+        self._by_host: Dict[int, Tuple[float, float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_host)
+
+    def set(self, host_id: int, cpu: float, ram: float, storage: float) -> None:
+        self.discard(host_id)
+        bucket = self._buckets.get(cpu)
+        if bucket is None:
+            bucket = self._buckets[cpu] = []
+            bisect.insort(self._cpus, cpu)
+        bisect.insort(bucket, (ram, storage, host_id))
+        self._by_host[host_id] = (cpu, ram, storage)
+
+    def discard(self, host_id: int) -> None:
+        free = self._by_host.pop(host_id, None)
+        if free is None:
+            return
+        cpu, ram, storage = free
+        bucket = self._buckets[cpu]
+        del bucket[bisect.bisect_left(bucket, (ram, storage, host_id))]
+        if not bucket:
+            del self._buckets[cpu]
+            del self._cpus[bisect.bisect_left(self._cpus, cpu)]
+
+    def adjust(self, host_id: int, delta: Resources) -> None:
+        """Take ``delta`` off a host's free capacity (negative gives it back)"""
+        free = self._by_host.get(host_id)
+        if free is not None:
+            cpu, ram, storage = free
+            self.set(host_id, cpu - delta.cpu, ram - delta.ram, storage - delta.storage)
+
+    def free(self, host_id: int) -> Optional[Resources]:
+        free = self._by_host.get(host_id)
+        return Resources(*free) if free else None
+
+    def _bucket(self, cpu: float, need: Resources, descending: bool) -> Iterator[Tuple[float, float, int]]:
+        bucket = self._buckets[cpu]
+        start = bisect.bisect_left(bucket, (need.ram,))
+        span = range(len(bucket) - 1, start - 1, -1) if descending else range(start, len(bucket))
+        for i in span:
+            ram, storage, host_id = bucket[i]
+            if storage >= need.storage:
+                yield ram, cpu, host_id
+
+    def candidates(self, need: Resources, strategy: str = BEST_FIT) -> Iterator[int]:
+        """Hosts that fit ``need``: least free (ram, cpu) first for best-fit, most first for spread"""
+        descending = strategy == SPREAD
+        buckets = [
+            self._bucket(cpu, need, descending)
+            for cpu in self._cpus[bisect.bisect_left(self._cpus, need.cpu):]
+        ]
+        for _, _, host_id in heapq.merge(*buckets, reverse=descending):
+            yield host_id
+
+    def snapshot(self) -> List[Resources]:
+        return [Resources(*free) for free in self._by_host.values()]
+
+
+class PlacementScheduler:
+    """Chooses hosts from a ``CapacityIndex`` and reserves them in the database"""
+
+    def __init__(self, strategy: str = BEST_FIT, cpu_overcommit: float = 1.0, refresh_seconds: float = 30):
+        self.strategy = strategy
+        self.cpu_overcommit = cpu_overcommit
+        self.refresh_seconds = refresh_seconds
+        self.index = CapacityIndex()
+        self.placements = 0
+        self.conflicts = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _columns(self):
+        return (
+            Host.id,
+            Host.total_cpu_cores * self.cpu_overcommit - Host.used_cpu_cores,
+            Host.total_ram_gb - Host.used_ram_gb,
+            Host.total_storage_gb - Host.used_storage_gb,
+        )
+
+    async def load(self, db: AnySession) -> None:
+        """Rebuild the index from every ONLINE host"""
+        rows = (await db.execute(select(*self._columns()).where(Host.status == HostStatus.ONLINE))).all()
+        index = CapacityIndex()
+        for host_id, cpu, ram, storage in rows:
+            index.set(host_id, cpu, ram, storage)
+        with self._lock:
+            self.index = index
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    async def _refresh_host(self, db: AnySession, host_id: int) -> None:
+        row = (await db.execute(
+            select(*self._columns()).where(Host.id == host_id, Host.status == HostStatus.ONLINE)
+        )).first()
+        with self._lock:
+            if row is None:
+                self.index.discard(host_id)
+            else:
+                self.index.set(*row)
+
+    def _reserve_stmt(self, host_id: int, delta: Resources, check: bool):
+        stmt = update(Host).where(Host.id == host_id)
+        if check:
+            stmt = stmt.where(
+                Host.status == HostStatus.ONLINE,
+                Host.used_cpu_cores + delta.cpu <= Host.total_cpu_cores * self.cpu_overcommit,
+                Host.used_ram_gb + delta.ram <= Host.total_ram_gb,
+                Host.used_storage_gb + delta.storage <= Host.total_storage_gb,
+            )
+        return stmt.values(
+            used_cpu_cores=Host.used_cpu_cores + delta.cpu,
+            used_ram_gb=Host.used_ram_gb + delta.ram,
+            used_storage_gb=Host.used_storage_gb + delta.storage,
+        ).execution_options(synchronize_session=False)
+
+    async def _update(self, db: AnySession, host_id: int, need: Resources) -> bool:
+        result = await db.execute(self._reserve_stmt(host_id, need, check=True))
+        if result.rowcount == 1:
+            return True
+        self.conflicts += 1
+        await self._refresh_host(db, host_id)
+        return False
+
+    async def reserve_on(self, db: AnySession, host_id: int, need: Resources) -> bool:
+        """Conditionally take ``need`` on one host; False if it no longer fits"""
+        if not await self._update(db, host_id, need):
+            return False
+        with self._lock:
+            self.index.adjust(host_id, need)
+        return True
+
+    def _maybe_reload(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    async def place(self, db: AnySession, need: Resources, strategy: Optional[str] = None) -> Reservation:
+        """Reserve ``need`` on the best host in the caller's transaction, or raise NoCapacity"""
+        if self._maybe_reload():
+            await self.load(db)
+        tried = set()
+        while True:
+            with self._lock:
+                host_id = next((h for h in self.index.candidates(need, strategy or self.strategy) if h not in tried), None)
+            if host_id is None:
+                raise NoCapacity(f"no ONLINE host has {need.cpu} CPU, {need.ram} GB RAM, {need.storage} GB free")
+            tried.add(host_id)
+            if await self.reserve_on(db, host_id, need):
+                self.placements += 1
+                return Reservation(host_id, need)
+
+    def abort(self, reservation: Reservation) -> None:
+        """The reserving transaction rolled back: give the capacity back to the index"""
+        with self._lock:
+            self.index.adjust(reservation.host_id, -reservation.resources)
+
+    async def place_many(self, db: AnySession, needs: List[Resources],
+                         strategy: Optional[str] = None) -> List[Optional[Reservation]]:
+        """Reserve every ``need`` together: placed largest first, one UPDATE per host.
+
+        Entries that fit nowhere are None. A host that lost a race has its
+        share placed again one VPS at a time.
+        """
+        if self._maybe_reload():
+            await self.load(db)
+        strategy = strategy or self.strategy
+        plan: Dict[int, List[int]] = {}
+        with self._lock:
+            for i in sorted(range(len(needs)), key=lambda i: (needs[i].ram, needs[i].cpu, needs[i].storage), reverse=True):
+                host_id = next(self.index.candidates(needs[i], strategy), None)
+                if host_id is not None:
+                    self.index.adjust(host_id, needs[i])
+                    plan.setdefault(host_id, []).append(i)
+
+        reservations: List[Optional[Reservation]] = [None] * len(needs)
+        retry = []
+        for host_id, items in plan.items():
+            share = Resources(
+                sum(needs[i].cpu for i in items),
+                sum(needs[i].ram for i in items),
+                sum(needs[i].storage for i in items),
+            )
+            if await self._update(db, host_id, share):
+                for i in items:
+                    reservations[i] = Reservation(host_id, needs[i])
+                self.placements += len(items)
+            else:
+                retry.extend(items)
+        for i in retry:
+            try:
+                reservations[i] = await self.place(db, needs[i], strategy)
+            except NoCapacity:
+                pass
+        return reservations
+
+    async def release(self, db: AnySession, host_id: int, resources: Resources) -> None:
+        """Return a VPS's resources to its host (in the caller's transaction)"""
+        await db.execute(self._reserve_stmt(host_id, -resources, check=False))
+        with self._lock:
+            self.index.adjust(host_id, -resources)
+
+
+scheduler = PlacementScheduler(
+    strategy=settings.SCHEDULER_STRATEGY,
+    cpu_overcommit=settings.SCHEDULER_CPU_OVERCOMMIT,
+    refresh_seconds=settings.SCHEDULER_REFRESH_SECONDS,
+)
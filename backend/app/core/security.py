@@ -1,8 +1,16 @@
 """
 Security utilities: JWT, password hashing, 2FA
 """
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import pyotp
@@ -26,35 +34,189 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class HashingPoolSaturated(Exception):
+    """Raised when the password hashing pool cannot accept more work"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification in a bounded process pool so that a burst
+    of logins does not stall the event loop. With ``max_workers=0`` the work
+    runs inline (the pre-pool behaviour, useful for scripts and benchmarks).
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _run(self, fn: Callable, *args):
+        if self.max_workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                raise HashingPoolSaturated()
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM, killed); start a fresh pool and retry once
+                self.shutdown(wait=False)
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash without blocking the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await self._run(get_password_hash, password)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+def _with_string_subject(data: dict) -> dict:
+    """Copy claims, coercing ``sub`` to a string as required by RFC 7519"""
+    to_encode = data.copy()
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
+    return to_encode
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
-    to_encode = data.copy()
+    to_encode = _with_string_subject(data)
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
 def create_refresh_token(data: dict) -> str:
     """Create JWT refresh token"""
-    to_encode = data.copy()
+    to_encode = _with_string_subject(data)
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex, "type": "refresh"})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
-def decode_token(token: str) -> Optional[dict]:
+class TokenCache:
+    """
+    Bounded LRU of successfully verified JWT payloads, keyed by a SHA-256
+    digest of the token so raw tokens are never kept in memory. Each entry
+    expires at the token's own ``exp`` claim.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: bytes, payload: dict) -> None:
+        exp = payload.get("exp")
+        if self.maxsize <= 0 or not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._entries[key] = (payload, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: bytes) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
+# Callables that receive a verified payload and return True if it is revoked.
+# They run on every decode, including cache hits and on the event loop, so
+# they must be cheap and must not do I/O.
+_revocation_checks: List[Callable[[dict], bool]] = []
+
+
+def register_revocation_check(check: Callable[[dict], bool]) -> None:
+    """Register a hook consulted by decode_token for every verified payload"""
+    if check not in _revocation_checks:
+        _revocation_checks.append(check)
+
+
+def _is_revoked(payload: dict) -> bool:
+    return any(check(payload) for check in _revocation_checks)
+
+
+def decode_token(token: str, check_revoked: bool = True) -> Optional[dict]:
     """Decode and verify JWT token"""
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError:
+    key = token_cache.key(token)
+    payload = token_cache.get(key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return None
+        token_cache.put(key, payload)
+    if check_revoked and _is_revoked(payload):
+        token_cache.discard(key)
         return None
+    return dict(payload)
 
 
 def generate_2fa_secret() -> str:
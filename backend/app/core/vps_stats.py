@@ -0,0 +1,256 @@
+"""
+VPS and host usage from bulk hypervisor stats.
+
+Every VPS_STATS_INTERVAL_SECONDS, each online host is asked for the counters
+of all its domains in one ``domain_stats`` call. CPU, disk I/O and network
+figures are rates over the time since the host's previous sample; RAM and
+disk are the current fill. A domain that restarted in between (its counters
+went backwards) gets rates again from the next sample.
+
+Each host's results are written in a single UPDATE, joined against a JSON
+``{vps id: stats}`` map with ``json_each`` (SQLite and Postgres alike), and
+only for VPSes whose figures changed since the last write. The host row gets
+a summary of its domains the same way. Hosts are collected concurrently,
+each after a random delay of up to VPS_STATS_JITTER_SECONDS, so the calls
+and writes of a large panel are spread out instead of landing at once.
+
+Only one worker collects: the one holding the "vps-stats" cluster lock, which
+is also the one that writes the metric stores. The others check each
+interval and one of them takes over when it stops.
+
+``stats_updated_at`` is when a row's figures last changed. Every sample,
+changed or not, also goes into the "vps" and "host" metric stores
+(app.core.metric_store) for history.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from prometheus_client import Counter, Histogram
+from sqlalchemy import JSON, Integer, bindparam, cast, func, select, update
+from sqlalchemy.engine import Engine
+from app.core.bootstrap import ClusterLeader
+from app.core.config import settings
+from app.core.database import engine
+from app.core.hypervisor import RUNNING, DomainStats, get_driver
+from app.core.metric_store import MetricStore, get_store, set_writer
+from app.models.host import Host, HostStatus
+from app.models.vps import VPS, VPSStatus
+
+logger = logging.getLogger(__name__)
+
+VPS_STATS_SECONDS = Histogram("vps_stats_collect_seconds", "Time to collect and write one host's stats")
+VPS_STATS_WRITES = Counter("vps_stats_rows_written_total", "VPS rows whose stats changed and were written")
+VPS_STATS_ERRORS = Counter("vps_stats_errors_total", "Hosts whose stats could not be collected", ["host"])
+
+_new_stats = func.json_each(bindparam("stats", type_=JSON)).table_valued("key", "value").alias("new_stats")
+_vpses = VPS.__table__
+UPDATE_VPS_STATS = (
+    update(_vpses)
+    .where(_vpses.c.id == cast(_new_stats.c.key, Integer))
+    # Stats aren't an edit: keep updated_at as it is
+    .values(stats_cache=_new_stats.c.value, stats_updated_at=bindparam("now"), updated_at=_vpses.c.updated_at)
+)
+
+
+class Usage(NamedTuple):
+    """A VPS's figures; rates are per second, None until there are two samples of the running domain"""
+    state: str
+    cpu: Optional[float]
+    ram: Optional[float]
+    disk: Optional[float]
+    disk_read: Optional[int]
+    disk_write: Optional[int]
+    net_in: Optional[int]
+    net_out: Optional[int]
+
+    def as_json(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "cpu": self.cpu,
+            "ram": self.ram,
+            "disk": self.disk,
+            "disk_io": None if self.disk_read is None else {"read": self.disk_read, "write": self.disk_write},
+            "network": None if self.net_in is None else {"in": self.net_in, "out": self.net_out},
+        }
+
+
+def _percent(used: float, total: float) -> Optional[float]:
+    return round(min(100.0, used / total * 100), 1) if total > 0 else None
+
+
+def usage(current: DomainStats, previous: Optional[DomainStats], seconds: float) -> Usage:
+    """One domain's figures from its current sample and the one taken ``seconds`` earlier"""
+    disk = _percent(current.disk_allocation_bytes, current.disk_capacity_bytes)
+    if current.state != RUNNING:
+        return Usage(current.state, None, None, disk, None, None, None, None)
+    ram = _percent(current.mem_used_kb, current.mem_total_kb)
+    if previous is None or previous.state != RUNNING or seconds <= 0:
+        return Usage(current.state, None, ram, disk, None, None, None, None)
+    cpu = current.cpu_time_ns - previous.cpu_time_ns
+    read = current.disk_read_bytes - previous.disk_read_bytes
+    write = current.disk_write_bytes - previous.disk_write_bytes
+    rx = current.net_rx_bytes - previous.net_rx_bytes
+    tx = current.net_tx_bytes - previous.net_tx_bytes
+    if cpu < 0 or read < 0 or write < 0 or rx < 0 or tx < 0:
+        return Usage(current.state, None, ram, disk, None, None, None, None)
+    cpu = round(min(100.0, cpu / (seconds * 1e9 * max(current.vcpus, 1)) * 100), 1)
+    return Usage(current.state, cpu, ram, disk,
+                 int(read / seconds), int(write / seconds), int(rx / seconds), int(tx / seconds))
+
+
+def host_summary(figures: List[Tuple[Usage, int]], total_cpu_cores: int) -> Dict[str, Any]:
+    """Host stats_cache from its VPSes' (usage, vcpus)"""
+    running = [(u, vcpus) for u, vcpus in figures if u.state == RUNNING]
+    measured = [(u, vcpus) for u, vcpus in running if u.cpu is not None]
+    cpu = sum(u.cpu * vcpus for u, vcpus in measured) / total_cpu_cores if total_cpu_cores > 0 else 0
+    return {
+        "vpses": len(figures),
+        "running": len(running),
+        "cpu": round(min(100.0, cpu), 1),
+        "disk_io": {
+            "read": sum(u.disk_read for u, _ in measured),
+            "write": sum(u.disk_write for u, _ in measured),
+        },
+        "network": {
+            "in": sum(u.net_in for u, _ in measured),
+            "out": sum(u.net_out for u, _ in measured),
+        },
+    }
+
+
+class _HostTarget(NamedTuple):
+    id: int
+    uri: str
+    total_cpu_cores: int
+    vpses: Dict[str, int]  # domain name -> VPS id
+
+
+class StatsCollector:
+    """Keeps each host's previous sample and last written figures between passes"""
+
+    def __init__(self, driver=None, db_engine: Engine = engine, jitter: float = 0.0, clock=time.monotonic,
+                 vps_metrics: Optional[MetricStore] = None, host_metrics: Optional[MetricStore] = None):
+        self.driver = driver
+        self.engine = db_engine
+        self.jitter = jitter
+        self.clock = clock
+        self.vps_metrics = get_store("vps") if vps_metrics is None else vps_metrics
+        self.host_metrics = get_store("host") if host_metrics is None else host_metrics
+        # Keyed by host id: hosts left on the default LIBVIRT_URI share a URI
+        self._samples: Dict[int, Tuple[str, float, Dict[str, DomainStats]]] = {}
+        self._written: Dict[int, Dict[int, Usage]] = {}
+        self._summaries: Dict[int, Dict[str, Any]] = {}
+
+    def _targets(self) -> List[_HostTarget]:
+        with self.engine.connect() as conn:
+            hosts = conn.execute(
+                select(Host.id, Host.libvirt_uri, Host.total_cpu_cores).where(Host.status == HostStatus.ONLINE)
+            ).all()
+            vpses: Dict[int, Dict[str, int]] = defaultdict(dict)
+            for vps_id, host_id, vm_id, uuid in conn.execute(
+                select(VPS.id, VPS.host_id, VPS.vm_id, VPS.uuid)
+                .where(VPS.host_id.in_([h.id for h in hosts]), VPS.status != VPSStatus.CREATING)
+            ):
+                vpses[host_id][vm_id or uuid] = vps_id
+        return [_HostTarget(h.id, h.libvirt_uri or settings.LIBVIRT_URI, h.total_cpu_cores, vpses[h.id])
+                for h in hosts]
+
+    def _write(self, host_id: int, changed: Dict[int, Usage], summary: Optional[Dict[str, Any]]) -> None:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            if changed:
+                conn.execute(UPDATE_VPS_STATS, {"stats": {vps_id: u.as_json() for vps_id, u in changed.items()},
+                                                "now": now})
+            if summary is not None:
+                conn.execute(update(Host).where(Host.id == host_id).values(stats_cache=summary, stats_updated_at=now))
+
+    def _apply(self, target: _HostTarget, sampled: Dict[str, DomainStats], now: float) -> int:
+        """Figures from a host's sample, written where they changed (runs on a worker thread)"""
+        uri, taken, previous = self._samples.get(target.id, (target.uri, now, {}))
+        if uri != target.uri:
+            taken, previous = now, {}  # Repointed at another hypervisor: its counters aren't comparable
+        written = self._written.get(target.id, {})
+        figures: Dict[int, Usage] = {}
+        vcpus: List[Tuple[Usage, int]] = []
+        for domain, current in sampled.items():
+            vps_id = target.vpses.get(domain)
+            if vps_id is None:
+                continue  # Not a panel VPS, or one still being created
+            figures[vps_id] = u = usage(current, previous.get(domain), now - taken)
+            vcpus.append((u, current.vcpus))
+        changed = {vps_id: u for vps_id, u in figures.items() if written.get(vps_id) != u}
+        summary = host_summary(vcpus, target.total_cpu_cores)
+        at = time.time()
+        self.vps_metrics.record(list(figures), [u[1:] for u in figures.values()], at)
+        self.host_metrics.record([target.id], [(
+            summary["cpu"], summary["running"], summary["disk_io"]["read"], summary["disk_io"]["write"],
+            summary["network"]["in"], summary["network"]["out"],
+        )], at)
+        if summary == self._summaries.get(target.id):
+            summary = None
+        if changed or summary is not None:
+            self._write(target.id, changed, summary)
+
+        # Only what this pass saw is kept, so deleted domains and VPSes drop out
+        self._samples[target.id] = (target.uri, now, sampled)
+        self._written[target.id] = figures
+        if summary is not None:
+            self._summaries[target.id] = summary
+        return len(changed)
+
+    async def _collect_host(self, target: _HostTarget) -> int:
+        if self.jitter > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+        started = time.perf_counter()
+        sampled = await (self.driver or get_driver()).call(target.uri, "domain_stats")
+        changed = await asyncio.to_thread(self._apply, target, sampled, self.clock())
+        VPS_STATS_SECONDS.observe(time.perf_counter() - started)
+        VPS_STATS_WRITES.inc(changed)
+        return changed
+
+    async def collect(self) -> int:
+        """One pass over every online host; returns the number of VPS rows written"""
+        targets = await asyncio.to_thread(self._targets)
+        self.vps_metrics.reserve(sum(len(t.vpses) for t in targets))
+        self.host_metrics.reserve(len(targets))
+        results = await asyncio.gather(*(self._collect_host(t) for t in targets), return_exceptions=True)
+        written = 0
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                VPS_STATS_ERRORS.labels(target.uri).inc()
+                logger.warning(f"vps_stats_failed host={target.uri} error={result}")
+            else:
+                written += result
+        return written
+
+
+async def stats_loop(interval: float, jitter: float, leader: Optional[ClusterLeader] = None,
+                     collector: Optional[StatsCollector] = None) -> None:
+    """Run a StatsCollector pass every ``interval`` seconds while this worker leads"""
+    leader = leader or ClusterLeader(engine, "vps-stats")
+    current = collector
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(leader.acquire):
+                    # Another worker collects (and writes the history); start from fresh
+                    # samples should this one take over
+                    await asyncio.to_thread(set_writer, False)
+                    current = collector
+                    continue
+                if current is None:
+                    await asyncio.to_thread(set_writer, True)
+                    current = StatsCollector(jitter=min(jitter, interval / 2))
+                written = await current.collect()
+                logger.debug(f"vps_stats_collected written={written}")
+            except Exception:
+                logger.exception("vps_stats_collect_failed")
+    finally:
+        # Saved before the lock goes, so the next leader opens the latest history
+        set_writer(False)
+        leader.release()
@@ -3,39 +3,70 @@ MS VPS Panel - Main FastAPI Application
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 
 from app.core.config import settings
-from app.core.database import engine, Base, SessionLocal
+from app.core.database import SessionLocal
+from app.core.bootstrap import bootstrap
+from app.core.audit import audit_writer
+from app.core.audit_partitions import maintenance_loop
+from app.core.counters import reconcile_loop
+from app.core.jobs import sweep_loop
+from app.core.vps_stats import stats_loop
+from app.core.metric_store import persist_loop
+from app.core.revocation import revocation_list
 from app.api.v1 import api_router
 from app.core.logging_middleware import setup_json_logging, request_logging_middleware
+from app.core.rate_limit import rate_limit_middleware
 from app.core.errors import (
     http_exception_handler,
     validation_exception_handler,
     unhandled_exception_handler,
+    hashing_pool_saturated_handler,
 )
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from app.core.security import get_password_hash
-from app.models.user import User, UserRole
-from app.models.host import Host, HostStatus
-from app.models.image import OSImage, ImageFormat
+from app.core.security import password_hasher, HashingPoolSaturated
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create tables
-    Base.metadata.create_all(bind=engine)
     # Setup logging once
     setup_json_logging()
-    # Ensure admin user exists
-    seed_admin_if_missing()
-    # Ensure baseline fixtures (host/images)
-    seed_fixtures_if_missing()
+    # Startup: migrate and seed (admin user, baseline host/images) unless already current
+    if settings.STARTUP_MODE != "skip":
+        await bootstrap(force=settings.STARTUP_MODE == "always")
+    background = []
+    # Revoked tokens: pull other workers' revocations and purge expired rows, keeping the per-request check in memory
+    background.append(asyncio.create_task(revocation_list.sync_loop(settings.REVOCATION_SYNC_SECONDS)))
+    # Audit partitions: create/roll months and archive expired ones in the background
+    if settings.AUDIT_MAINTENANCE_SECONDS > 0:
+        background.append(asyncio.create_task(maintenance_loop(settings.AUDIT_MAINTENANCE_SECONDS)))
+    # Dashboard counters: periodically repair drift from bulk writes
+    if settings.COUNTER_RECONCILE_SECONDS > 0:
+        background.append(asyncio.create_task(reconcile_loop(settings.COUNTER_RECONCILE_SECONDS)))
+    # VPS jobs: re-send queued jobs that never reached a worker and jobs whose worker died
+    if settings.JOB_SWEEP_SECONDS > 0:
+        background.append(asyncio.create_task(sweep_loop(settings.JOB_SWEEP_SECONDS)))
+    # VPS/host usage: bulk per-host hypervisor stats into stats_cache
+    if settings.VPS_STATS_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(
+            stats_loop(settings.VPS_STATS_INTERVAL_SECONDS, settings.VPS_STATS_JITTER_SECONDS)
+        ))
+    # Usage history: flush the metric stores to their memory-mapped files (in the worker writing them)
+    if settings.METRICS_PERSIST_SECONDS > 0:
+        background.append(asyncio.create_task(persist_loop(settings.METRICS_PERSIST_SECONDS)))
     yield
-    # Shutdown
+    for task in background:
+        task.cancel()
+    # Let them finish unwinding: the stats loop saves the usage history and hands its lock back
+    await asyncio.gather(*background, return_exceptions=True)
+    # Shutdown: write out queued audit entries before the process exits
+    audit_writer.close()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -48,6 +79,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-user/role/route token buckets (added first so CORS and logging wrap 429s)
+app.middleware("http")(rate_limit_middleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +89,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Link", "X-Total-Count"],
 )
 
 # Structured logging + correlation IDs
@@ -63,6 +98,7 @@ app.middleware("http")(request_logging_middleware)
 # Global error handlers
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
+app.add_exception_handler(HashingPoolSaturated, hashing_pool_saturated_handler)
 app.add_exception_handler(Exception, unhandled_exception_handler)
 
 # Include API routes
@@ -79,6 +115,13 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition (connection pool metrics)"""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health/details")
 async def health_details():
     """Lightweight dependency checks (DB ping)."""
@@ -131,73 +174,6 @@ async def health_details():
     }
 
 
-def seed_admin_if_missing() -> None:
-    """Create default admin if it doesn't exist."""
-    with SessionLocal() as db:
-        admin = db.query(User).filter(User.email == "admin@example.com").first()
-        if not admin:
-            admin = User(
-                email="admin@example.com",
-                username="admin",
-                hashed_password=get_password_hash("admin123"),
-                full_name="Administrator",
-                role=UserRole.ADMIN,
-                is_active=True,
-                is_email_verified=True,
-            )
-            db.add(admin)
-            db.commit()
-
-
-def seed_fixtures_if_missing() -> None:
-    """Seed minimal host and images if none exist."""
-    with SessionLocal() as db:
-        host = db.query(Host).filter(Host.name == "localhost").first()
-        if not host:
-            host = Host(
-                name="localhost",
-                fqdn="localhost.localdomain",
-                ip_address="127.0.0.1",
-                total_cpu_cores=8,
-                total_ram_gb=32.0,
-                total_storage_gb=500.0,
-                status=HostStatus.ONLINE,
-            )
-            db.add(host)
-
-        ubuntu = db.query(OSImage).filter(OSImage.name == "Ubuntu 22.04 LTS").first()
-        if not ubuntu:
-            ubuntu = OSImage(
-                name="Ubuntu 22.04 LTS",
-                description="Ubuntu Server 22.04 LTS (Jammy)",
-                os_family="ubuntu",
-                os_version="22.04",
-                file_path="/images/ubuntu-22.04.qcow2",
-                file_size_gb=2.5,
-                file_format=ImageFormat.QCOW2,
-                is_public=True,
-                is_active=True,
-            )
-            db.add(ubuntu)
-
-        debian = db.query(OSImage).filter(OSImage.name == "Debian 12").first()
-        if not debian:
-            debian = OSImage(
-                name="Debian 12",
-                description="Debian 12 (Bookworm)",
-                os_family="debian",
-                os_version="12",
-                file_path="/images/debian-12.qcow2",
-                file_size_gb=2.0,
-                file_format=ImageFormat.QCOW2,
-                is_public=True,
-                is_active=True,
-            )
-            db.add(debian)
-
-        db.commit()
-
-
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -4,6 +4,11 @@ from .host import Host, HostStatus
 from .image import OSImage
 from .ssh_key import SSHKey
 from .audit_log import AuditLog
+from .revoked_token import RevokedToken
+from .app_state import AppState
+from .entity_counter import EntityCounter
+from .ip_pool import IPPool, IPPoolBlock
+from .job import Job, JobKind, JobStatus
 
 __all__ = [
     "User",
@@ -17,5 +22,13 @@ __all__ = [
     "OSImage",
     "SSHKey",
     "AuditLog",
+    "RevokedToken",
+    "AppState",
+    "EntityCounter",
+    "IPPool",
+    "IPPoolBlock",
+    "Job",
+    "JobKind",
+    "JobStatus",
 ]
 
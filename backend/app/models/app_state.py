@@ -0,0 +1,15 @@
+"""
+Application State Model
+"""
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class AppState(Base):
+    """Small key/value table for cluster-wide markers (e.g. the bootstrap version)"""
+    __tablename__ = "app_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
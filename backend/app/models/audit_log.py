@@ -1,7 +1,7 @@
 """
 Audit Log Model
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -49,3 +49,11 @@ class AuditLog(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+    # admin.list_audit_logs: each filter, newest first
+    __table_args__ = (
+        Index("ix_audit_logs_user_created", "user_id", "created_at"),
+        Index("ix_audit_logs_resource_created", "resource_type", "created_at"),
+        Index("ix_audit_logs_action_created", "action", "created_at"),
+        # Closed months move to audit_logs_YYYYMM on SQLite; never reuse their ids
+        {"sqlite_autoincrement": True},
+    )
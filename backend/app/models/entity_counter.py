@@ -0,0 +1,115 @@
+"""
+Entity Counter Model
+
+Row counts per (entity, status) for the admin dashboard: users by
+active/inactive, VPSes and hosts by status. The session hooks below turn every
+ORM insert, delete and status change of those models into counter deltas.
+The deltas are applied on the flush's own connection, so they commit or roll
+back together with the change. Query-level bulk writes bypass the hooks;
+app.core.counters.reconcile repairs any drift they leave.
+"""
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Dict, Tuple
+from sqlalchemy import BigInteger, Column, String, event, inspect, update
+from sqlalchemy.orm import Session
+from app.core.database import Base
+from app.models.host import Host
+from app.models.user import User
+from app.models.vps import VPS
+
+
+class EntityCounter(Base):
+    __tablename__ = "entity_counters"
+
+    entity = Column(String, primary_key=True)  # "users" | "vpses" | "hosts"
+    status = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+# model -> (entity name, attribute whose value is the counter's status)
+TRACKED = {User: ("users", "is_active"), VPS: ("vpses", "status"), Host: ("hosts", "status")}
+
+
+def counter_status(model, value: Any) -> str:
+    if model is User:
+        return "active" if value else "inactive"
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+def _current(obj, attr: str) -> Any:
+    value = inspect(obj).dict.get(attr)
+    if value is None:
+        default = getattr(type(obj), attr).property.columns[0].default
+        value = default.arg if default is not None else None
+    return value
+
+
+def _committed(obj, attr: str) -> Any:
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else _current(obj, attr)
+
+
+def upsert_counter(conn, entity: str, status: str, count: int, increment: bool = True) -> None:
+    """Add ``count`` to (or, with increment=False, set) one counter row"""
+    table = EntityCounter.__table__
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(entity=entity, status=status, count=count)
+        value = table.c.count + stmt.excluded.count if increment else stmt.excluded.count
+        conn.execute(stmt.on_conflict_do_update(index_elements=["entity", "status"], set_={"count": value}))
+        return
+    match = (table.c.entity == entity) & (table.c.status == status)
+    result = conn.execute(update(table).where(match).values(count=table.c.count + count if increment else count))
+    if not result.rowcount:
+        conn.execute(table.insert().values(entity=entity, status=status, count=count))
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_status(session, flush_context, instances) -> None:
+    # The status of a deleted row must be known after the flush; load it now if expired
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            getattr(obj, tracked[1])
+
+
+@event.listens_for(Session, "after_flush")
+def _count_changes(session, flush_context) -> None:
+    deltas: Dict[Tuple[str, str], int] = defaultdict(int)
+    for obj in session.new:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            deltas[tracked[0], counter_status(type(obj), _current(obj, tracked[1]))] += 1
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            deltas[tracked[0], counter_status(type(obj), _committed(obj, tracked[1]))] -= 1
+    for obj in session.dirty:
+        tracked = TRACKED.get(type(obj))
+        if tracked and inspect(obj).attrs[tracked[1]].history.has_changes():
+            entity, attr = tracked
+            deltas[entity, counter_status(type(obj), _committed(obj, attr))] -= 1
+            deltas[entity, counter_status(type(obj), _current(obj, attr))] += 1
+    if not any(deltas.values()):
+        return
+    conn = session.connection()
+    # Fixed order, so concurrent flushes lock counter rows in the same sequence
+    for (entity, status), delta in sorted(deltas.items()):
+        if delta:
+            upsert_counter(conn, entity, status, delta)
+
+
+def _keep_old_value(target, value, oldvalue, initiator) -> None:
+    pass
+
+
+# Load the previous status when it is assigned, so its counter can be decremented
+for _model, (_, _attr) in TRACKED.items():
+    event.listen(getattr(_model, _attr), "set", _keep_old_value, active_history=True)
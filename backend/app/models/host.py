@@ -43,7 +43,7 @@ class Host(Base):
     last_seen = Column(DateTime(timezone=True), nullable=True)
     
     # Stats cache
-    stats_cache = Column(JSON, nullable=True)  # System metrics
+    stats_cache = Column(JSON, nullable=True)  # {vpses, running, cpu: %, disk_io: {read, write}, network: {in, out}}
     stats_updated_at = Column(DateTime(timezone=True), nullable=True)
     
     # Metadata
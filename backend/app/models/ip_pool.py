@@ -0,0 +1,37 @@
+"""
+IP Pool Models
+
+An admin-defined subnet that VPS addresses are allocated from. A pool serves one
+network type, and optionally a single host. Which of its usable addresses are
+taken is a bitmap split into fixed-size blocks, one row each. An allocation
+rewrites one small row instead of the whole subnet. See app.core.ipam.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Enum as SQLEnum
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.models.vps import NetworkType
+
+
+class IPPool(Base):
+    __tablename__ = "ip_pools"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    cidr = Column(String, nullable=False)
+    network_type = Column(SQLEnum(NetworkType), nullable=False)
+    host_id = Column(Integer, ForeignKey("hosts.id"), nullable=True)  # None = any host
+    size = Column(Integer, nullable=False)  # Usable addresses (bits in use across the blocks)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    blocks = relationship("IPPoolBlock", cascade="all, delete-orphan")
+
+
+class IPPoolBlock(Base):
+    __tablename__ = "ip_pool_blocks"
+
+    pool_id = Column(Integer, ForeignKey("ip_pools.id", ondelete="CASCADE"), primary_key=True)
+    block = Column(Integer, primary_key=True)
+    bitmap = Column(LargeBinary, nullable=False)  # Bit set = address taken
+    free = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)  # Bumped by every conditional update
@@ -0,0 +1,69 @@
+"""
+Job Model
+
+One row per hypervisor operation on a VPS (create, start, stop, ...). The API
+inserts the row and returns its id; a Celery worker runs it and records the
+outcome here. See app.core.jobs.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text, Enum as SQLEnum, JSON, text
+from sqlalchemy.sql import func
+from enum import Enum
+from app.core.database import Base
+
+
+class JobKind(str, Enum):
+    CREATE = "create"
+    START = "start"
+    STOP = "stop"
+    REBOOT = "reboot"
+    RESIZE = "resize"
+    DELETE = "delete"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(SQLEnum(JobKind), nullable=False)
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+
+    # Target and requester (vps_id is cleared once a delete job removes the VPS)
+    vps_id = Column(Integer, ForeignKey("vpses.id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    payload = Column(JSON, nullable=True)  # Kind-specific arguments, e.g. the new specs of a resize
+
+    # Progress
+    progress = Column(Integer, default=0, nullable=False)  # Percent
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    error = Column(Text, nullable=True)  # Last failure
+    result = Column(JSON, nullable=True)
+
+    # Scheduling
+    run_after = Column(DateTime(timezone=True), nullable=True)  # A QUEUED job is due from this (backoff)
+    lease_until = Column(DateTime(timezone=True), nullable=True)  # A RUNNING job is stale after this
+
+    # Metadata
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # At most one job in flight per VPS, enforced here rather than by the API's
+        # check-then-insert; also answers "does this VPS have a job in flight"
+        Index("ix_jobs_vps_status", "vps_id", unique=True,
+              postgresql_where=text("status IN ('QUEUED', 'RUNNING')"),
+              sqlite_where=text("status IN ('QUEUED', 'RUNNING')")),
+        # jobs API: a VPS's jobs, newest first
+        Index("ix_jobs_vps_id", "vps_id", "id"),
+        # jobs.sweep: queued jobs due again and expired leases
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
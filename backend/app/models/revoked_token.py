@@ -0,0 +1,26 @@
+"""
+Revoked Token Model
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class RevocationScope:
+    TOKEN = "token"  # a single token, identified by its jti
+    USER = "user"    # every token for user_id issued before revoked_at
+    # The cached principal of the user in the jti ("principal:<id>:...") is stale;
+    # user_id stays NULL so the row outlives a deleted user
+    PRINCIPAL = "principal"
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, unique=True, nullable=False, index=True)
+    scope = Column(String, default=RevocationScope.TOKEN, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    revoked_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Row can be purged after this
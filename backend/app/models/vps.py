@@ -1,7 +1,7 @@
 """
 VPS Model
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, Text, Enum as SQLEnum, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -75,7 +75,7 @@ class VPS(Base):
     cloud_init_data = Column(Text, nullable=True)
     
     # Stats (cached)
-    stats_cache = Column(JSON, nullable=True)  # {cpu: %, ram: %, disk: %, network: {in: bytes, out: bytes}}
+    stats_cache = Column(JSON, nullable=True)  # {state, cpu: %, ram: %, disk: %, disk_io: {read, write}, network: {in, out}}, I/O in bytes/s
     stats_updated_at = Column(DateTime(timezone=True), nullable=True)
     
     # Metadata
@@ -86,6 +86,21 @@ class VPS(Base):
     # Relationships
     snapshots = relationship("VPSSnapshot", back_populates="vps", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # vps.list_vpses: owner (+ status) filter, paged by id
+        Index("ix_vpses_owner_id", "owner_id", "id"),
+        Index("ix_vpses_owner_status_id", "owner_id", "status", "id"),
+        # hosts.get_host_stats: active VPSes per host; Postgres covers the resource columns
+        Index(
+            "ix_vpses_status_host",
+            "status",
+            "host_id",
+            postgresql_include=["cpu_cores", "ram_gb", "storage_gb"],
+        ),
+        # images.delete_image: "is this image still in use"
+        Index("ix_vpses_os_image_id", "os_image_id"),
+    )
+
 
 class VPSTemplate(Base):
     __tablename__ = "vps_templates"
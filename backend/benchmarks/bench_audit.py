@@ -0,0 +1,97 @@
+"""
+Latency of ``POST /api/v1/vps/{id}/start`` with inline vs batched audit writes.
+
+Each run uses a fresh interpreter and a freshly seeded SQLite file. Concurrent
+in-process clients each toggle their own VPS with stop/start, and the start
+latencies are reported. AUDIT_ASYNC=false commits every audit row inside the
+request; AUDIT_ASYNC=true queues it for the background writer. Point
+BENCH_DATABASE_URL at Postgres to include real commit round trips. Run from
+``backend/``:
+
+    python -m benchmarks.bench_audit
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+DURATION = float(os.getenv("BENCH_SECONDS", "5"))
+
+
+def seed() -> None:
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.host import Host, HostStatus
+    from app.models.image import OSImage
+    from app.models.user import User, UserRole
+    from app.models.vps import VPS, VPSStatus
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        owner = User(email="o@example.com", username="o", hashed_password="x", role=UserRole.USER)
+        image = OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1)
+        host = Host(name="h", ip_address="10.0.0.1", total_cpu_cores=64, total_ram_gb=256,
+                    total_storage_gb=4000, status=HostStatus.ONLINE)
+        db.add_all([owner, image, host])
+        db.flush()
+        db.add_all(
+            VPS(name=f"vm{i}", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=image.id,
+                owner_id=owner.id, host_id=host.id, status=VPSStatus.STOPPED)
+            for i in range(CONCURRENCY)
+        )
+        db.commit()
+
+
+async def drive() -> list:
+    import httpx
+    from app.main import app
+    from app.core.audit import audit_writer
+    from app.core.security import create_access_token
+
+    token = create_access_token(data={"sub": 1, "role": "user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(vps_id: int):
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                resp = await client.post(f"/api/v1/vps/{vps_id}/start", headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                assert resp.status_code == 200, resp.text
+                resp = await client.post(f"/api/v1/vps/{vps_id}/stop", headers=headers)
+                assert resp.status_code == 200, resp.text
+
+        await asyncio.gather(*(worker(n + 1) for n in range(CONCURRENCY)))
+    audit_writer.close()
+    return latencies
+
+
+def run_mode() -> None:
+    latencies = sorted(asyncio.run(drive()))
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000  # noqa: E731
+    mode = "batched" if os.environ.get("AUDIT_ASYNC") == "true" else "inline"
+    print(f"{mode:<8} n={len(latencies):<6} p50={p(0.5):6.2f}ms p99={p(0.99):6.2f}ms "
+          f"mean={statistics.mean(latencies) * 1000:6.2f}ms")
+
+
+def main() -> int:
+    for mode in ("false", "true"):
+        url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+        env = dict(os.environ, DATABASE_URL=url, RATE_LIMIT_ENABLED="false", PYTHONPATH=os.getcwd())
+        subprocess.run([sys.executable, "-c", "from benchmarks.bench_audit import seed; seed()"], env=env, check=True)
+        subprocess.run(
+            [sys.executable, "-c", "from benchmarks.bench_audit import run_mode; run_mode()"],
+            env=dict(env, AUDIT_ASYNC=mode),
+            check=True,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
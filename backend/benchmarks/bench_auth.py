@@ -0,0 +1,98 @@
+"""
+get_current_user micro-benchmark with and without the verified-JWT cache.
+
+Replays synthetic traffic (a pool of dashboard sessions, each reusing its
+access token) at a fixed arrival rate and reports per-call latency plus the
+share of one core spent authenticating. Run from ``backend/``:
+
+    python -m benchmarks.bench_auth
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from app.core.database import Base, engine, SessionLocal  # noqa: E402
+from app.core.dependencies import get_current_user  # noqa: E402
+from app.core.principal_cache import principal_cache  # noqa: E402
+from app.core.security import create_access_token, token_cache  # noqa: E402
+from app.models.user import User, UserRole  # noqa: E402
+
+RATE = int(os.getenv("BENCH_RATE", "10000"))
+DURATION = float(os.getenv("BENCH_SECONDS", "2"))
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "500"))
+
+
+def setup():
+    Base.metadata.create_all(bind=engine)
+    creds = []
+    with SessionLocal() as db:
+        for i in range(SESSIONS):
+            user = User(
+                email=f"u{i}@example.com",
+                username=f"u{i}",
+                hashed_password="x",
+                role=UserRole.USER,
+            )
+            db.add(user)
+            db.flush()
+            token = create_access_token(data={"sub": user.id, "role": user.role.value})
+            creds.append(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        db.commit()
+    return creds
+
+
+async def replay(creds):
+    rng = random.Random(1)
+    total = int(RATE * DURATION)
+    interval = 1.0 / RATE
+    latencies = []
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        for i in range(total):
+            # Open-loop arrivals: wait for the slot, never skip it
+            due = start + i * interval
+            while time.perf_counter() < due:
+                pass
+            t = time.perf_counter()
+            await get_current_user(credentials=rng.choice(creds), db=db)
+            latencies.append(time.perf_counter() - t)
+    finally:
+        db.close()
+    wall = time.perf_counter() - start
+    return latencies, wall
+
+
+def report(label, latencies, wall):
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99)]
+    busy = sum(latencies)
+    print(
+        f"{label:<14} achieved {len(latencies) / wall:8.0f} req/s  "
+        f"p50 {statistics.median(latencies) * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us  "
+        f"core busy {busy / wall * 100:5.1f}%"
+    )
+
+
+def main() -> int:
+    creds = setup()
+    print(f"target {RATE} req/s for {DURATION}s over {SESSIONS} sessions")
+    for label, size in (("no cache", 0), ("token cache", SESSIONS * 2)):
+        token_cache.maxsize = size
+        token_cache.clear()
+        principal_cache.clear()
+        latencies, wall = asyncio.run(replay(creds))
+        report(label, latencies, wall)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Requests per second per worker: sync engine vs DATABASE_ASYNC=true.
+
+Each mode runs in a fresh interpreter (the engine is chosen at import time)
+against the same seeded database, driving ``GET /api/v1/vps/`` and
+``GET /api/v1/hosts/{id}`` with concurrent in-process clients. Point
+BENCH_DATABASE_URL at Postgres to include real network round trips; on
+SQLite aiosqlite's thread hop makes async mode the slower of the two. Keep
+BENCH_CONCURRENCY at or below DB_POOL_SIZE + DB_MAX_OVERFLOW: past it, sync
+mode blocks the event loop on pool checkout.
+Run from ``backend/``:
+
+    python -m benchmarks.bench_db_modes
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+DURATION = float(os.getenv("BENCH_SECONDS", "5"))
+SEED_VPSES = int(os.getenv("BENCH_VPSES", "2000"))
+
+
+def seed() -> None:
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.host import Host, HostStatus
+    from app.models.image import OSImage
+    from app.models.user import User, UserRole
+    from app.models.vps import VPS, VPSStatus
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        owner = User(email="o@example.com", username="o", hashed_password="x", role=UserRole.USER)
+        image = OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1)
+        host = Host(name="h", ip_address="10.0.0.1", total_cpu_cores=64, total_ram_gb=256,
+                    total_storage_gb=4000, status=HostStatus.ONLINE)
+        db.add_all([owner, image, host])
+        db.flush()
+        db.add_all(
+            VPS(name=f"vm{i}", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=image.id,
+                owner_id=owner.id, host_id=host.id, status=VPSStatus.RUNNING)
+            for i in range(SEED_VPSES)
+        )
+        db.commit()
+
+
+async def drive() -> float:
+    import httpx
+    from app.main import app
+    from app.core.security import create_access_token
+
+    token = create_access_token(data={"sub": 1, "role": "user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = ["/api/v1/vps/?limit=20", "/api/v1/hosts/1"]
+    done = 0
+    deadline = time.perf_counter() + DURATION
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(n: int):
+            nonlocal done
+            i = n
+            while time.perf_counter() < deadline:
+                resp = await client.get(paths[i % len(paths)], headers=headers)
+                assert resp.status_code == 200, resp.text
+                done += 1
+                i += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(CONCURRENCY)))
+        return done / (time.perf_counter() - start)
+
+
+def run_mode() -> None:
+    rps = asyncio.run(drive())
+    mode = "async" if os.environ.get("DATABASE_ASYNC") == "true" else "sync"
+    print(f"{mode:<6} {rps:8.0f} req/s  (concurrency {CONCURRENCY})")
+
+
+def main() -> int:
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    env = dict(
+        os.environ,
+        DATABASE_URL=url,
+        RATE_LIMIT_ENABLED="false",
+        PYTHONPATH=os.getcwd(),
+    )
+    subprocess.run([sys.executable, "-c", "from benchmarks.bench_db_modes import seed; seed()"], env=env, check=True)
+    for mode in ("false", "true"):
+        subprocess.run(
+            [sys.executable, "-c", "from benchmarks.bench_db_modes import run_mode; run_mode()"],
+            env=dict(env, DATABASE_ASYNC=mode),
+            check=True,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+``/hosts/stats`` computation: ORM rows summed in Python vs SQL aggregates vs
+a snapshot hit.
+
+Seeds BENCH_HOSTS hosts (default 5k) and BENCH_VPSES VPSes (default 200k,
+about a third RUNNING or CREATING) into a temporary SQLite file. Run from
+``backend/``:
+
+    python -m benchmarks.bench_host_stats
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HOSTS = int(os.getenv("BENCH_HOSTS", "5000"))
+VPSES = int(os.getenv("BENCH_VPSES", "200000"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import insert, select  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.core.host_stats import HostStatsSnapshot, compute_host_stats  # noqa: E402
+from app.models.host import Host, HostStatus  # noqa: E402
+from app.models.image import OSImage  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.vps import VPS, VPSStatus  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(email="o@example.com", username="o", hashed_password="x"))
+        conn.execute(insert(OSImage).values(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        conn.execute(insert(Host), [
+            {"name": f"h{i}", "ip_address": "10.0.0.1", "status": rng.choice(list(HostStatus)),
+             "total_cpu_cores": 64, "total_ram_gb": 256.0, "total_storage_gb": 4000.0,
+             "used_cpu_cores": rng.randint(0, 64), "used_ram_gb": rng.uniform(0, 256),
+             "used_storage_gb": rng.uniform(0, 4000)}
+            for i in range(HOSTS)
+        ])
+        statuses = list(VPSStatus)
+        for start in range(0, VPSES, 50000):
+            conn.execute(insert(VPS), [
+                {"name": f"v{i}", "cpu_cores": 1, "ram_gb": 1, "storage_gb": 10, "os_image_id": 1,
+                 "owner_id": 1, "host_id": rng.randint(1, HOSTS), "status": rng.choice(statuses)}
+                for i in range(start, min(start + 50000, VPSES))
+            ])
+
+
+def row_by_row(db) -> dict:
+    """What the endpoint used to do"""
+    hosts = db.scalars(select(Host)).all()
+    vpses = db.scalars(select(VPS).where(VPS.status.in_([VPSStatus.RUNNING, VPSStatus.CREATING]))).all()
+    return {
+        "hosts": len(hosts),
+        "online": len([h for h in hosts if h.status == HostStatus.ONLINE]),
+        "cpu": sum(h.total_cpu_cores for h in hosts),
+        "used_cpu": sum(h.used_cpu_cores for h in hosts),
+        "ram": sum(h.total_ram_gb for h in hosts),
+        "used_ram": sum(h.used_ram_gb for h in hosts),
+        "running": len([v for v in vpses if v.status == VPSStatus.RUNNING]),
+        "creating": len([v for v in vpses if v.status == VPSStatus.CREATING]),
+    }
+
+
+def timed(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            fn(db)
+            samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main() -> int:
+    seed()
+    snapshot = HostStatsSnapshot(ttl_seconds=60)
+    asyncio.run(snapshot.get())
+
+    print(f"{HOSTS} hosts, {VPSES} VPSes, median of {REPEAT} (ms)")
+    print(f"{'row by row':<16} {timed(row_by_row):10.2f}")
+    print(f"{'SQL aggregates':<16} {timed(compute_host_stats):10.3f}")
+    print(f"{'snapshot hit':<16} {timed(lambda db: asyncio.run(snapshot.get())):10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Login storm benchmark.
+
+Fires concurrent logins while a second task issues unrelated ``GET /api/v1/vps``
+requests, and reports login p99 plus the latency seen by the /vps requests.
+Run from ``backend/``:
+
+    PASSWORD_HASH_WORKERS=0 python -m benchmarks.bench_login   # inline bcrypt
+    PASSWORD_HASH_WORKERS=4 python -m benchmarks.bench_login   # process pool
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+
+import httpx  # noqa: E402
+from app.main import app  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import Base, engine, SessionLocal  # noqa: E402
+from app.core.security import get_password_hash, create_access_token  # noqa: E402
+from app.models.user import User, UserRole  # noqa: E402
+
+LOGINS = int(os.getenv("BENCH_LOGINS", "64"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def setup() -> str:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(
+            email="bench@example.com",
+            username="bench",
+            hashed_password=get_password_hash("benchpass"),
+            role=UserRole.USER,
+        )
+        db.add(user)
+        db.commit()
+        return create_access_token(data={"sub": user.id, "role": user.role.value})
+
+
+async def run(token: str):
+    transport = httpx.ASGITransport(app=app)
+    login_times, vps_times = [], []
+    done = asyncio.Event()
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login():
+            async with sem:
+                start = time.perf_counter()
+                resp = await client.post(
+                    "/api/v1/auth/login",
+                    json={"email": "bench@example.com", "password": "benchpass"},
+                )
+                login_times.append(time.perf_counter() - start)
+                assert resp.status_code in (200, 503), resp.text
+
+        async def poll_vps():
+            headers = {"Authorization": f"Bearer {token}"}
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/api/v1/vps/", headers=headers)
+                vps_times.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        poller = asyncio.create_task(poll_vps())
+        await asyncio.gather(*(login() for _ in range(LOGINS)))
+        done.set()
+        await poller
+    return login_times, vps_times
+
+
+def main() -> int:
+    token = setup()
+    login_times, vps_times = asyncio.run(run(token))
+    ms = lambda s: f"{s * 1000:8.1f} ms"  # noqa: E731
+    print(f"hash workers: {settings.PASSWORD_HASH_WORKERS}  logins: {LOGINS}  concurrency: {CONCURRENCY}")
+    print(f"login  p50 {ms(statistics.median(login_times))}  p99 {ms(percentile(login_times, 99))}")
+    print(
+        f"/vps   p50 {ms(statistics.median(vps_times))}  p99 {ms(percentile(vps_times, 99))}"
+        f"  max {ms(max(vps_times))}  (n={len(vps_times)})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Metric store: memory per VPS, ingest cost and query latency.
+
+Records BENCH_HOURS (default 2) of 10s samples for BENCH_VMS VPSes (default
+10k; memory grows linearly, so 50k is five times the figure shown) in
+batches of 1000, as the stats collector does per host, with the default
+METRICS_TIERS. Reported:
+
+* ring buffer bytes per VPS, against keeping every 10s sample for as long
+  as the coarsest tier reaches as Postgres rows (~100 bytes a row, before
+  indexes);
+* allocating the memory-mapped files for every VPS up front, then ms per
+  10s bucket for all of them (the maximum includes the 1m/5m/1h rollups);
+* query latency (p50/p99 over BENCH_QUERIES random VPSes) per range/step,
+  including the JSON-ready lists;
+* save and reopen of the memory-mapped files in a temporary directory.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_metric_store
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+from app.core.metric_store import VPS_METRICS, MetricStore
+
+VMS = int(os.getenv("BENCH_VMS", "10000"))
+HOURS = float(os.getenv("BENCH_HOURS", "2"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "1000"))
+BATCH = 1000
+START = 1_700_002_800
+
+
+def ingest(store: MetricStore) -> list:
+    rng = np.random.default_rng(0)
+    batches = [list(range(i, min(i + BATCH, VMS))) for i in range(0, VMS, BATCH)]
+    values = [rng.random((len(ids), len(VPS_METRICS)), dtype=np.float32) * 100 for ids in batches]
+    per_bucket = []
+    for b in range(int(HOURS * 360)):
+        t0 = time.perf_counter()
+        for ids, batch in zip(batches, values):
+            store.record(ids, batch, at=START + b * 10)
+        per_bucket.append((time.perf_counter() - t0) * 1000)
+    return per_bucket
+
+
+def latency(store: MetricStore, span: int, step: int) -> tuple:
+    end = START + int(HOURS * 3600) - 10
+    rng = random.Random(1)
+    timings = []
+    for _ in range(QUERIES):
+        t0 = time.perf_counter()
+        store.query(rng.randrange(VMS), end - span, end, step)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main() -> int:
+    store = MetricStore(VPS_METRICS, directory=tempfile.mkdtemp())
+    t0 = time.perf_counter()
+    store.reserve(VMS)  # As the collector does from the VPS count before its first pass
+    reserved = time.perf_counter() - t0
+    per_bucket = ingest(store)
+    print(f"{VMS} VPSes, {HOURS:g}h of 10s samples, tiers {[(s, n) for s, n in store.layout]}")
+    per_vm = store.nbytes / len(store)
+    kept = max(step * slots for step, slots in store.layout)
+    rows = kept // store.layout[0][0] * 100
+    print(f"ring buffers: {store.nbytes / 2 ** 20:.0f} MiB allocated, {per_vm / 1024:.1f} KiB per VPS "
+          f"(every sample for {kept // 86400}d as Postgres rows: ~{rows / 2 ** 20:.1f} MiB per VPS)")
+    print(f"ingest: {reserved:.2f}s to allocate, then {statistics.mean(per_bucket):.1f} ms "
+          f"per 10s bucket on average, {max(per_bucket):.1f} ms at most (rollups)")
+
+    print(f"\n{'range/step':<12} {'points':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for span, step, label in ((3600, 10, "1h/10s"), (6 * 3600, 60, "6h/1m"), (86400, 300, "1d/5m"),
+                              (7 * 86400, 3600, "7d/1h")):
+        p50, p99 = latency(store, span, step)
+        print(f"{label:<12} {span // step + 1:>7} {p50:>8.2f} {p99:>8.2f}")
+
+    t0 = time.perf_counter()
+    store.save()
+    saved = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    reopened = MetricStore(VPS_METRICS, directory=store.directory)
+    print(f"\nsave {saved:.2f}s, reopen {time.perf_counter() - t0:.2f}s ({len(reopened)} series)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
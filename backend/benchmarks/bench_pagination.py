@@ -0,0 +1,82 @@
+"""
+Audit-log page latency vs depth: OFFSET paging against cursor paging.
+
+Seeds BENCH_AUDIT_ROWS audit rows (default 1M) into a temporary SQLite file
+and times one 50-row page, newest first, at increasing depths. OFFSET has to
+walk and discard every row before the page; the cursor page seeks straight to
+its anchor. Run from ``backend/``:
+
+    python -m benchmarks.bench_pagination
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROWS = int(os.getenv("BENCH_AUDIT_ROWS", "1000000"))
+PAGE = 50
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import insert, select  # noqa: E402
+from app.core.database import Base, SessionLocal, SyncSessionAdapter, engine  # noqa: E402
+from app.core.pagination import encode_cursor, paginate  # noqa: E402
+from app.models.audit_log import AuditAction, AuditLog, AuditResource  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    batch = 50000
+    with engine.begin() as conn:
+        for offset in range(0, ROWS, batch):
+            conn.execute(insert(AuditLog), [
+                {"user_id": None, "action": AuditAction.UPDATE, "resource_type": AuditResource.VPS,
+                 "resource_id": i, "created_at": start + timedelta(seconds=i // 4)}
+                for i in range(offset, min(offset + batch, ROWS))
+            ])
+
+
+def timed(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main() -> int:
+    seed()
+    query = select(AuditLog)
+    ordering = (AuditLog.created_at.desc(), AuditLog.id.desc())
+    depths = [d for d in (0, 10_000, 100_000, 500_000, ROWS - PAGE) if d < ROWS]
+
+    print(f"{ROWS} audit rows, {PAGE} per page, median of {REPEAT} (ms)")
+    print(f"{'depth':>10} {'offset':>10} {'cursor':>10}")
+    with SessionLocal() as session:
+        db = SyncSessionAdapter(session)
+        for depth in depths:
+            offset_ms = timed(lambda: session.scalars(
+                query.order_by(*ordering).offset(depth).limit(PAGE)
+            ).all())
+            if depth:
+                anchor = session.scalar(select(AuditLog.id).order_by(*ordering).offset(depth - 1).limit(1))
+                cursor = encode_cursor(anchor)
+            else:
+                cursor = None
+            cursor_ms = timed(lambda: asyncio.run(paginate(
+                db, query, AuditLog, keys=[AuditLog.created_at, AuditLog.id],
+                descending=True, limit=PAGE, cursor=cursor,
+            )))
+            print(f"{depth:>10} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Per-request overhead of the API rate-limit middleware.
+
+Drives the middleware directly with a no-op downstream app, for anonymous and
+bearer-authenticated requests, and subtracts the cost of calling the
+downstream app without it. Run from ``backend/``:
+
+    python -m benchmarks.bench_rate_limit
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("RATE_LIMIT_DEFAULT", "1000000000/1")
+
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+from app.main import app  # noqa: E402
+from app.core.rate_limit import rate_limit_middleware  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "50000"))
+
+
+def make_scope(path: str, token: str = None, user_n: int = 0) -> dict:
+    headers = [(b"host", b"bench")]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return {
+        "type": "http",
+        "app": app,
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "scheme": "http",
+        "query_string": b"",
+        "headers": headers,
+        "client": (f"10.0.{user_n // 250}.{user_n % 250}", 1234),
+        "server": ("bench", 80),
+    }
+
+
+async def call_next(request):
+    return Response(b"")
+
+
+async def measure(scopes, wrapped: bool) -> float:
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        request = Request(scopes[i % len(scopes)])
+        if wrapped:
+            await rate_limit_middleware(request, call_next)
+        else:
+            await call_next(request)
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+def main() -> int:
+    tokens = [create_access_token(data={"sub": i, "role": "user"}) for i in range(1000)]
+    cases = {
+        "anonymous": [make_scope(f"/api/v1/vps/{i}", user_n=i) for i in range(1000)],
+        "bearer": [make_scope(f"/api/v1/vps/{i}", token=tokens[i]) for i in range(1000)],
+        "bearer+route": [make_scope("/api/v1/hosts/stats", token=t) for t in tokens],
+    }
+    for label, scopes in cases.items():
+        asyncio.run(measure(scopes, True))  # warm caches
+        base = asyncio.run(measure(scopes, False))
+        full = asyncio.run(measure(scopes, True))
+        print(f"{label:<14} overhead {(full - base) * 1e6:6.1f} us/request")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+VPS placement: decisions per second and the fragmentation each strategy leaves.
+
+Builds BENCH_HOSTS hosts (default 10k) of three sizes. Three measurements:
+
+* decisions/s of the capacity index against a linear best-fit scan (in memory);
+* end-to-end placements/s of ``PlacementScheduler.place`` with the
+  conditional UPDATE and a commit per VPS, on a temporary SQLite file;
+* a fragmentation report after filling the cluster to BENCH_FILL of its RAM
+  (or until not even the smallest flavor fits) with random flavors, per
+  strategy. "16c/64G fit" is how many of the largest flavor still fit on
+  real hosts; "raw" is how many the summed free capacity would suggest.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_scheduler
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+HOSTS = int(os.getenv("BENCH_HOSTS", "10000"))
+DECISIONS = int(os.getenv("BENCH_DECISIONS", "20000"))
+PLACEMENTS = int(os.getenv("BENCH_PLACEMENTS", "5000"))
+FILL = float(os.getenv("BENCH_FILL", "0.8"))
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import insert  # noqa: E402
+from app.core.database import Base, SessionLocal, SyncSessionAdapter, engine  # noqa: E402
+from app.core.scheduler import BEST_FIT, SPREAD, CapacityIndex, PlacementScheduler, Resources  # noqa: E402
+from app.models.host import Host, HostStatus  # noqa: E402
+import app.models  # noqa: E402,F401
+
+SIZES = [Resources(16, 64, 1000), Resources(32, 128, 2000), Resources(64, 256, 4000)]
+FLAVORS = [Resources(1, 1, 20), Resources(2, 4, 40), Resources(4, 8, 80), Resources(8, 32, 160), Resources(16, 64, 320)]
+LARGEST = FLAVORS[-1]
+
+
+def hosts():
+    rng = random.Random(0)
+    return [rng.choice(SIZES) for _ in range(HOSTS)]
+
+
+def flavors(n: int, seed: int):
+    rng = random.Random(seed)
+    return [rng.choice(FLAVORS) for _ in range(n)]
+
+
+def linear_best_fit(free, need: Resources):
+    """One pass over every host, keeping the tightest RAM fit"""
+    best = None
+    for host_id, r in enumerate(free):
+        if r.cpu >= need.cpu and r.ram >= need.ram and r.storage >= need.storage:
+            if best is None or r.ram < free[best].ram:
+                best = host_id
+    return best
+
+
+def decisions() -> None:
+    sizes = hosts()
+    needs = flavors(DECISIONS, 1)
+
+    index = CapacityIndex()
+    for host_id, r in enumerate(sizes):
+        index.set(host_id, r.cpu, r.ram, r.storage)
+    t0 = time.perf_counter()
+    for need in needs:
+        host_id = next(index.candidates(need), None)
+        if host_id is not None:
+            index.adjust(host_id, need)
+    indexed = len(needs) / (time.perf_counter() - t0)
+
+    free = list(sizes)
+    sample = needs[:max(DECISIONS // 20, 1)]
+    t0 = time.perf_counter()
+    for need in sample:
+        host_id = linear_best_fit(free, need)
+        if host_id is not None:
+            r = free[host_id]
+            free[host_id] = Resources(r.cpu - need.cpu, r.ram - need.ram, r.storage - need.storage)
+    linear = len(sample) / (time.perf_counter() - t0)
+
+    print(f"{HOSTS} hosts, placement decisions per second (in memory)")
+    print(f"{'linear scan':<16} {linear:12.0f}")
+    print(f"{'capacity index':<16} {indexed:12.0f}")
+
+
+def end_to_end() -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Host), [
+            {"name": f"h{i}", "ip_address": "10.0.0.1", "status": HostStatus.ONLINE,
+             "total_cpu_cores": r.cpu, "total_ram_gb": r.ram, "total_storage_gb": r.storage}
+            for i, r in enumerate(hosts())
+        ])
+    scheduler = PlacementScheduler(refresh_seconds=3600)
+
+    async def run():
+        with SessionLocal() as session:
+            db = SyncSessionAdapter(session)
+            await scheduler.load(db)
+            t0 = time.perf_counter()
+            for need in flavors(PLACEMENTS, 2):
+                await scheduler.place(db, need)
+                session.commit()
+            return PLACEMENTS / (time.perf_counter() - t0)
+
+    print(f"\n{'reserve + commit':<16} {asyncio.run(run()):12.0f} placements/s (SQLite, {PLACEMENTS} VPSes)")
+
+
+def fragmentation(strategy: str) -> dict:
+    sizes = hosts()
+    index = CapacityIndex()
+    for host_id, r in enumerate(sizes):
+        index.set(host_id, r.cpu, r.ram, r.storage)
+    target = FILL * sum(r.ram for r in sizes)
+    used = refused = 0
+    rng = random.Random(3)
+    while used < target and next(index.candidates(FLAVORS[0]), None) is not None:
+        need = rng.choice(FLAVORS)
+        host_id = next(index.candidates(need, strategy), None)
+        if host_id is None:
+            refused += 1
+            continue
+        index.adjust(host_id, need)
+        used += need.ram
+
+    free = [index.free(h) for h in range(len(sizes))]
+    empty = sum(f == s for f, s in zip(free, sizes))
+    full = sum(f.ram < FLAVORS[0].ram or f.cpu < FLAVORS[0].cpu for f in free)
+    fits = sum(min(f.cpu // LARGEST.cpu, f.ram // LARGEST.ram, f.storage // LARGEST.storage) for f in free)
+    raw = int(min(sum(f.cpu for f in free) // LARGEST.cpu, sum(f.ram for f in free) // LARGEST.ram))
+    return {
+        "strategy": strategy,
+        "empty": empty,
+        "partial": len(sizes) - empty - full,
+        "full": full,
+        "stranded_cpu": sum(f.cpu for f in free if f.ram < FLAVORS[0].ram),
+        "stranded_ram": sum(f.ram for f in free if f.cpu < FLAVORS[0].cpu),
+        "largest_fit": int(fits),
+        "largest_raw": raw,
+        "refused": refused,
+    }
+
+
+def main() -> int:
+    decisions()
+    end_to_end()
+    print(f"\nFragmentation after filling {FILL:.0%} of RAM with random flavors")
+    print(f"{'strategy':<10} {'empty':>6} {'partial':>8} {'full':>6} {'stranded cpu':>13} "
+          f"{'stranded GB':>12} {'16c/64G fit':>12} {'raw':>6} {'refused':>8}")
+    for strategy in (BEST_FIT, SPREAD):
+        r = fragmentation(strategy)
+        print(f"{r['strategy']:<10} {r['empty']:>6} {r['partial']:>8} {r['full']:>6} {r['stranded_cpu']:>13.0f} "
+              f"{r['stranded_ram']:>12.0f} {r['largest_fit']:>12} {r['largest_raw']:>6} {r['refused']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Time to first request for a freshly started worker.
+
+Starts uvicorn in a subprocess, polls ``/health`` until it answers and reads
+``app_bootstrap_seconds`` from ``/metrics``, for three boots against the same
+SQLite file:
+
+- fresh:   empty database (migrate + seed, including the admin bcrypt hash)
+- current: marker already current (STARTUP_MODE=auto, the fast path)
+- always:  STARTUP_MODE=always, i.e. re-running migrate/seed checks every boot
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_startup
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPEAT = int(os.getenv("BENCH_REPEAT", "3"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bootstrap_seconds(port: int) -> float:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as resp:
+        for line in resp.read().decode().splitlines():
+            if line.startswith("app_bootstrap_seconds{"):
+                return float(line.rsplit(" ", 1)[1])
+    return float("nan")
+
+
+def time_to_first_request(db_url: str, mode: str) -> tuple:
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=db_url, STARTUP_MODE=mode, REDIS_ENABLED="false", PYTHONPATH=os.getcwd())
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start, bootstrap_seconds(port)
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    results = {"fresh": [], "current": [], "always": []}
+    for _ in range(REPEAT):
+        db_url = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+        results["fresh"].append(time_to_first_request(db_url, "auto"))
+        results["current"].append(time_to_first_request(db_url, "auto"))
+        results["always"].append(time_to_first_request(db_url, "always"))
+    print(f"best of {REPEAT}      first request (s)   bootstrap (ms)")
+    for name, samples in results.items():
+        first, boot = min(samples)
+        print(f"{name:<8} {first:20.3f} {boot * 1000:16.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,16 @@
 Initialize database with sample data
 """
 import sys
-from app.core.database import SessionLocal, engine, Base
+from app.core.bootstrap import cluster_lock, migrate
+from app.core.database import SessionLocal, engine
 from app.models.user import User, UserRole
 from app.models.host import Host, HostStatus
 from app.models.image import OSImage, ImageFormat
 from app.core.security import get_password_hash
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create or upgrade the tables through the migrations, as the app does at startup
+with cluster_lock(engine):
+    migrate(engine)
 
 db = SessionLocal()
 
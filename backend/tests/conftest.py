@@ -0,0 +1,79 @@
+"""
+Shared fixtures: run database-facing tests in both DATABASE_ASYNC modes
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import pytest
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+import app.core.rate_limit as rate_limit
+from app.core.database import SyncSessionAdapter, to_async_url
+
+
+async def _connect_once(async_engine) -> None:
+    async with async_engine.connect():
+        pass
+
+
+class SessionMode:
+    """How request/core code gets its session: a SyncSessionAdapter ("sync") or a real AsyncSession ("async")"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._async_engines = {}
+        self._lock = threading.Lock()
+
+    def _async_engine(self, engine: Engine):
+        # NullPool: TestClient and asyncio.run give every call its own event
+        # loop, and an aiosqlite connection can't outlive the loop it was made on
+        with self._lock:
+            if engine not in self._async_engines:
+                url = to_async_url(engine.url.render_as_string(hide_password=False))
+                async_engine = create_async_engine(url, poolclass=NullPool, connect_args={"timeout": 60})
+                # The first connect is guarded by an asyncio.Lock tied to one
+                # loop; get it over with before threads race on their own loops
+                with ThreadPoolExecutor(1) as pool:
+                    pool.submit(asyncio.run, _connect_once(async_engine)).result()
+                self._async_engines[engine] = async_engine
+            return self._async_engines[engine]
+
+    def engine(self, engine: Engine) -> Engine:
+        """The sync engine the sessions' statements run on, for event listeners"""
+        return engine if self.name == "sync" else self._async_engine(engine).sync_engine
+
+    @asynccontextmanager
+    async def session(self, engine: Engine):
+        """A session on ``engine``'s database, configured like SessionLocal / AsyncSessionLocal"""
+        if self.name == "sync":
+            db = sessionmaker(bind=engine, autoflush=False)()
+            try:
+                yield SyncSessionAdapter(db)
+            finally:
+                db.close()
+            return
+        factory = async_sessionmaker(bind=self._async_engine(engine), autoflush=False, expire_on_commit=False)
+        async with factory() as db:
+            yield db
+
+    def override(self, engine: Engine):
+        """A get_async_db dependency override handing out sessions on ``engine``"""
+        async def override_async_db():
+            async with self.session(engine) as db:
+                yield db
+        return override_async_db
+
+
+@pytest.fixture(params=["sync", "async"])
+def sessions(request):
+    """SessionMode for each of DATABASE_ASYNC=false and DATABASE_ASYNC=true (aiosqlite)"""
+    return SessionMode(request.param)
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    """Empty API token buckets per test, so one test's requests don't throttle the next"""
+    monkeypatch.setattr(rate_limit, "api_limiter", rate_limit._build_api_limiter())
@@ -0,0 +1,102 @@
+"""
+Tests for the batched audit writer
+"""
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+from app.core import audit
+from app.core.audit import AuditWriter, record_audit
+from app.core.database import Base
+from app.models.audit_log import AuditAction, AuditLog, AuditResource
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/audit.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _count(engine):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(AuditLog))
+
+
+def _failed():
+    return REGISTRY.get_sample_value("audit_events_total", {"outcome": "failed"}) or 0.0
+
+
+def _row(i):
+    return dict(
+        user_id=None, action=AuditAction.START, resource_type=AuditResource.VPS,
+        resource_id=i, resource_uuid=None, ip_address=None, user_agent=None, details={},
+    )
+
+
+def test_rows_are_written_in_batches(engine):
+    """Queued rows land in a few multi-row inserts, and flush waits for them"""
+    inserts = []
+    event.listen(engine, "before_cursor_execute", lambda c, cur, stmt, p, ctx, many: inserts.append(many))
+    writer = AuditWriter(engine, batch_size=100, flush_interval=5)
+    for i in range(250):
+        assert writer.submit(_row(i))
+    writer.flush()
+    assert _count(engine) == 250
+    assert len([m for m in inserts if m]) <= 3  # 100 + 100 + the flushed remainder
+    writer.close()
+
+
+def test_a_bad_row_only_drops_itself(engine):
+    """A batch the database rejects is retried, then written row by row; only the bad row is lost"""
+    writer = AuditWriter(engine, batch_size=100, flush_interval=5)
+    failed = _failed()
+    for i in range(5):
+        writer.submit(_row(i))
+    writer.submit(dict(_row(5), details={"unserialisable": object()}))
+    writer.flush()
+    assert _count(engine) == 5
+    assert _failed() == failed + 1
+    writer.close()
+
+
+def test_close_drains_queue(engine):
+    """Shutdown writes whatever is still queued"""
+    writer = AuditWriter(engine, batch_size=1000, flush_interval=60)
+    for i in range(10):
+        writer.submit(_row(i))
+    writer.close()
+    assert _count(engine) == 10
+
+
+def test_full_queue_falls_back_to_inline_write(engine, monkeypatch):
+    """With the queue full, the "inline" policy writes on the caller's session"""
+    monkeypatch.setattr(audit.settings, "AUDIT_ASYNC", True)
+    monkeypatch.setattr(audit.settings, "AUDIT_OVERFLOW", "inline")
+    monkeypatch.setattr(audit, "audit_writer", AuditWriter(engine, max_queue=1))
+    monkeypatch.setattr(audit.audit_writer, "_ensure_started", lambda: None)  # keep the queue full
+    audit.audit_writer.submit(_row(0))
+    with sessionmaker(bind=engine)() as db:
+        record_audit(db, user_id=None, action=AuditAction.STOP, resource_type=AuditResource.VPS)
+    assert _count(engine) == 1
+
+
+def test_drop_policy_discards_overflow(engine, monkeypatch):
+    """The "drop" policy never blocks or writes when the queue is full"""
+    monkeypatch.setattr(audit.settings, "AUDIT_ASYNC", True)
+    monkeypatch.setattr(audit.settings, "AUDIT_OVERFLOW", "drop")
+    monkeypatch.setattr(audit, "audit_writer", AuditWriter(engine, max_queue=1))
+    monkeypatch.setattr(audit.audit_writer, "_ensure_started", lambda: None)
+    audit.audit_writer.submit(_row(0))
+    with sessionmaker(bind=engine)() as db:
+        record_audit(db, user_id=None, action=AuditAction.STOP, resource_type=AuditResource.VPS)
+    assert _count(engine) == 0
+
+
+def test_sync_mode_writes_inline(engine, monkeypatch):
+    """AUDIT_ASYNC=false commits the entry before record_audit returns"""
+    monkeypatch.setattr(audit.settings, "AUDIT_ASYNC", False)
+    with sessionmaker(bind=engine)() as db:
+        record_audit(db, user_id=None, action=AuditAction.LOGIN, resource_type=AuditResource.USER)
+    assert _count(engine) == 1
@@ -0,0 +1,100 @@
+"""
+Tests for the streaming audit log export
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+from app.core.audit_export import export_query, stream_export
+from app.core.database import Base
+from app.models.audit_log import AuditAction, AuditLog, AuditResource
+import app.models  # noqa: F401  (register tables)
+
+ROWS = int(os.getenv("EXPORT_TEST_ROWS", "5000000"))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/export.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(AuditLog), [
+            {"action": AuditAction.LOGIN if i % 2 else AuditAction.STOP, "resource_type": AuditResource.VPS,
+             "resource_id": i, "details": {"n": i}, "created_at": datetime(2026, 1, 1, 0, 0, 59 - i)}
+            for i in range(50)
+        ])
+    return engine
+
+
+def _export(engine, query=None, fmt="ndjson", compress=False) -> bytes:
+    query = export_query(query if query is not None else select(AuditLog), AuditLog)
+    return b"".join(stream_export(query, fmt, compress, session_factory=sessionmaker(bind=engine)))
+
+
+def test_ndjson_is_oldest_first_and_filtered(engine):
+    """One JSON object per line, in (created_at, id) order, honouring filters"""
+    rows = [json.loads(line) for line in _export(engine).splitlines()]
+    assert [r["resource_id"] for r in rows] == list(range(49, -1, -1))
+    assert rows[0]["action"] == "login" and rows[0]["details"] == {"n": 49}
+
+    stops = _export(engine, select(AuditLog).where(AuditLog.action == AuditAction.STOP))
+    assert len(stops.splitlines()) == 25
+
+
+def test_csv_and_gzip(engine):
+    """CSV has a header row and JSON-encoded details; gzip output decompresses to the same bytes"""
+    body = _export(engine, fmt="csv")
+    reader = list(csv.DictReader(io.StringIO(body.decode())))
+    assert len(reader) == 50
+    assert reader[0]["action"] == "login" and json.loads(reader[0]["details"]) == {"n": 49}
+    assert gzip.decompress(_export(engine, fmt="csv", compress=True)) == body
+
+
+_PEAK_RSS = """
+import resource, sys
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.core.audit_export import export_query, stream_export
+from app.models.audit_log import AuditLog
+engine = create_engine(sys.argv[1])
+query = select(AuditLog).where(AuditLog.id <= int(sys.argv[2]))
+lines = 0
+for chunk in stream_export(export_query(query, AuditLog), "ndjson", session_factory=sessionmaker(bind=engine)):
+    lines += chunk.count(b"\\n")
+print(lines, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def _peak_rss(url: str, max_id: int) -> tuple:
+    out = subprocess.run(
+        [sys.executable, "-c", _PEAK_RSS, url, str(max_id)],
+        capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=os.getcwd()),
+    ).stdout.split()
+    return int(out[0]), int(out[1]) * 1024
+
+
+@pytest.mark.integration
+def test_large_export_runs_in_constant_memory(tmp_path):
+    """Exporting ROWS rows peaks at about the same RSS as exporting a thousand"""
+    url = f"sqlite:///{tmp_path}/big.db"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows) "
+            "INSERT INTO audit_logs (action, resource_type, resource_id, ip_address, details, created_at) "
+            "SELECT 'UPDATE', 'VPS', i, '10.0.0.1', json_object('field', 'status'), "
+            "datetime('2026-01-01', '+' || (i / 10) || ' seconds') FROM n"
+        ), {"rows": ROWS})
+
+    small_lines, small_rss = _peak_rss(url, 1000)
+    lines, rss = _peak_rss(url, ROWS)
+    assert (small_lines, lines) == (1000, ROWS)
+    assert rss - small_rss < 32 * 1024 * 1024, (small_rss, rss)
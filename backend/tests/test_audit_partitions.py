@@ -0,0 +1,107 @@
+"""
+Tests for monthly audit partitions (SQLite layout), pruning and retention
+"""
+import asyncio
+import gzip
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, func, insert, inspect, select
+from sqlalchemy.orm import sessionmaker
+from app.core.audit_partitions import LocalArchive, audit_source, listing_since, maintain
+from app.core.config import settings
+from app.core.database import Base, SyncSessionAdapter
+from app.core.pagination import paginate
+from app.models.audit_log import AuditAction, AuditLog, AuditResource
+import app.models  # noqa: F401  (register tables)
+
+NOW = datetime(2026, 3, 15)
+DAYS = [datetime(2026, month, day) for month in (1, 2, 3) for day in (3, 12, 25) if datetime(2026, month, day) < NOW]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/audit.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(AuditLog), [
+            {"action": AuditAction.UPDATE, "resource_type": AuditResource.VPS, "resource_id": i, "created_at": day}
+            for i, day in enumerate(DAYS)
+        ])
+    return engine
+
+
+def _tables(engine):
+    return sorted(n for n in inspect(engine).get_table_names() if n.startswith("audit_logs"))
+
+
+def _list(engine, since=None, until=None):
+    with sessionmaker(bind=engine)() as session:
+        db = SyncSessionAdapter(session)
+        source = asyncio.run(audit_source(db, since, until))
+        query = select(source)
+        if since:
+            query = query.where(source.created_at >= since)
+        if until:
+            query = query.where(source.created_at < until)
+        page = asyncio.run(paginate(db, query, source, keys=[source.created_at, source.id],
+                                    descending=True, limit=100))
+        return source, [r.created_at.replace(tzinfo=None) for r in page.items]
+
+
+def test_closed_months_roll_into_month_tables(engine):
+    """Rows before the current month move out of audit_logs; ids keep increasing"""
+    result = maintain(engine, now=NOW, retention_months=0)
+    assert result == {"partitioned": ["audit_logs_202601", "audit_logs_202602"], "archived": []}
+    assert _tables(engine) == ["audit_logs", "audit_logs_202601", "audit_logs_202602"]
+    with engine.begin() as conn:
+        assert conn.scalar(select(func.count()).select_from(AuditLog)) == 2
+        new_id = conn.execute(insert(AuditLog).values(
+            action=AuditAction.LOGIN, resource_type=AuditResource.USER, created_at=NOW,
+        )).inserted_primary_key[0]
+    assert new_id == len(DAYS) + 1
+    assert maintain(engine, now=NOW, retention_months=0)["partitioned"] == []
+
+
+def test_listing_unions_only_overlapping_months(engine):
+    """A time range reads just the month tables it overlaps; no range reads all of them"""
+    maintain(engine, now=NOW, retention_months=0)
+
+    source, rows = _list(engine)
+    assert rows == sorted(DAYS, reverse=True)
+
+    source, rows = _list(engine, since=datetime(2026, 2, 10))
+    sql = str(select(source).compile())
+    assert "audit_logs_202602" in sql and "audit_logs_202601" not in sql
+    assert rows == sorted((d for d in DAYS if d >= datetime(2026, 2, 10)), reverse=True)
+
+    source, rows = _list(engine, since=datetime(2026, 3, 1))
+    assert source is AuditLog
+    assert rows == [datetime(2026, 3, 12), datetime(2026, 3, 3)]
+
+
+def test_layout_follows_the_session_and_unranged_listings_are_bounded(engine, monkeypatch):
+    """The session's dialect picks the union, whatever DATABASE_URL says; no ``since`` reads the last N months"""
+    maintain(engine, now=NOW, retention_months=0)
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://elsewhere/vps")
+    since = listing_since(NOW, months=2)
+    assert since == datetime(2026, 2, 1) and listing_since(NOW, months=0) == datetime(2026, 3, 1)
+    source, rows = _list(engine, since=since)
+    sql = str(select(source).compile())
+    assert "audit_logs_202602" in sql and "audit_logs_202601" not in sql
+    assert rows == sorted((d for d in DAYS if d >= since), reverse=True)
+
+
+def test_retention_archives_expired_months(engine, tmp_path):
+    """Months past retention are written to gzip'd JSONL segments, then dropped"""
+    archive = tmp_path / "archive"
+    result = maintain(engine, now=NOW, retention_months=1, sink=LocalArchive(str(archive)))
+    assert result["archived"] == ["audit_logs_202601"]
+    assert _tables(engine) == ["audit_logs", "audit_logs_202602"]
+
+    with gzip.open(archive / "audit_logs_202601.jsonl.gz", "rt") as segment:
+        rows = [json.loads(line) for line in segment]
+    assert [r["created_at"][:10] for r in rows] == ["2026-01-03", "2026-01-12", "2026-01-25"]
+    assert rows[0]["action"] == "update" and rows[0]["resource_type"] == "vps"
+
+    assert maintain(engine, now=NOW, retention_months=1)["archived"] == []
@@ -0,0 +1,139 @@
+"""
+Tests for the startup bootstrap (migrate + seed once, then a one-query fast path)
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime
+import pytest
+from alembic import command
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.core import bootstrap as bootstrap_module
+from app.core.audit_partitions import maintain, month_floor, partition_name
+from app.core.database import Base
+from app.core.bootstrap import ClusterLeader, alembic_config, audit_logs_partitioned, bootstrap, expected_marker, read_marker
+from app.models.user import User
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path}/boot.db")
+
+
+def _run(engine, **kwargs):
+    return asyncio.run(bootstrap(engine, sessionmaker(bind=engine), **kwargs))
+
+
+def _head(engine):
+    with engine.connect() as conn:
+        return conn.scalar(text("SELECT version_num FROM alembic_version"))
+
+
+def test_fresh_database_is_bootstrapped_then_skipped(engine):
+    """First boot migrates and seeds; later boots run a single query"""
+    assert _run(engine) == "bootstrapped"
+    assert read_marker(engine) == expected_marker()
+    assert _head(engine) == expected_marker().split(":")[0]
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(User).filter(User.email == "admin@example.com").count() == 1
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert _run(engine) == "current"
+    assert len(statements) == 1
+
+
+def test_stale_fixture_version_reseeds(engine, monkeypatch):
+    """Bumping FIXTURES_VERSION makes the next boot run the bootstrap again"""
+    _run(engine)
+    monkeypatch.setattr(bootstrap_module, "FIXTURES_VERSION", bootstrap_module.FIXTURES_VERSION + 1)
+    assert _run(engine) == "bootstrapped"
+    assert _run(engine) == "current"
+
+
+def test_legacy_create_all_database_is_adopted(engine):
+    """A pre-migration database (the 0001 schema, unstamped) is migrated to head, keeping its rows"""
+    with engine.connect() as conn:
+        command.upgrade(alembic_config(conn), "0001")
+        conn.execute(text("DROP TABLE alembic_version"))
+        conn.execute(text("INSERT INTO users (email, username, hashed_password, role, is_active, "
+                          "is_email_verified, is_2fa_enabled) VALUES ('old@example.com', 'old', 'x', 'USER', 1, 1, 0)"))
+        conn.commit()
+    assert _run(engine) == "bootstrapped"
+    inspector = inspect(engine)
+    assert "app_state" in inspector.get_table_names()
+    assert "ix_vpses_owner_id" in {ix["name"] for ix in inspector.get_indexes("vpses")}
+    assert _head(engine) == expected_marker().split(":")[0]
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(User).filter(User.email == "old@example.com").count() == 1
+
+
+def test_current_create_all_database_is_adopted(engine):
+    """A database create_all built from today's models (old init_db.py) is stamped head instead of replayed"""
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(email="old@example.com", username="old", hashed_password="x"))
+        db.commit()
+    assert _run(engine) == "bootstrapped"
+    assert _head(engine) == expected_marker().split(":")[0]
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(User).filter(User.email == "old@example.com").count() == 1
+
+
+def _reset_postgres():
+    engine = create_engine(POSTGRES_URL)  # An empty, throwaway database: its public schema is reset
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    return engine
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_postgres_create_all_database_gets_partitioned():
+    """create_all's plain audit_logs is still converted by 0005 when the rest is stamped head"""
+    engine = _reset_postgres()
+    Base.metadata.create_all(bind=engine)
+    assert _run(engine) == "bootstrapped"
+    assert _head(engine) == expected_marker().split(":")[0]
+    with engine.connect() as conn:
+        assert audit_logs_partitioned(conn)
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_fresh_postgres_gets_partitioned_audit_logs():
+    """On Postgres the bootstrap runs 0005, so audit_logs is partitioned with this month's partition"""
+    engine = _reset_postgres()
+    assert _run(engine) == "bootstrapped"
+    with engine.connect() as conn:
+        assert audit_logs_partitioned(conn)
+    assert maintain(engine, retention_months=0) == {"partitioned": [], "archived": []}
+    assert partition_name(month_floor(datetime.utcnow())) in inspect(engine).get_table_names()
+
+
+def test_concurrent_workers_bootstrap_once(engine, tmp_path):
+    """Workers racing on a fresh database serialize on the lock; one does the work"""
+    url = f"sqlite:///{tmp_path}/boot.db"
+    outcomes = []
+    threads = [
+        threading.Thread(target=lambda: outcomes.append(_run(create_engine(url))))
+        for _ in range(3)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(outcomes) == ["bootstrapped", "current", "current"]
+
+
+def test_cluster_leader_is_held_until_released(engine):
+    """One leader per lock name; the others are refused without waiting and take over after release"""
+    first, second = ClusterLeader(engine, "vps-stats"), ClusterLeader(engine, "vps-stats")
+    assert first.acquire() and first.acquire()
+    assert not second.acquire()
+    assert ClusterLeader(engine, "audit-maintenance").acquire()
+    first.release()
+    assert second.acquire() and not first.acquire()
+    second.release()
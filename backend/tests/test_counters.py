@@ -0,0 +1,110 @@
+"""
+Tests for the incrementally maintained dashboard counters
+"""
+import asyncio
+import random
+import pytest
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.orm import sessionmaker
+from app.core.counters import read_counters, real_counts, reconcile
+from app.core.database import Base, SyncSessionAdapter
+from app.models.entity_counter import EntityCounter
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.user import User
+from app.models.vps import VPS, VPSStatus
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/counters.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _stored(engine):
+    with engine.connect() as conn:
+        return {(e, s): c for e, s, c in conn.execute(select(EntityCounter.__table__)) if c}
+
+
+def _real(engine):
+    with engine.connect() as conn:
+        return dict(real_counts(conn))
+
+
+def test_counters_track_random_mutations(engine):
+    """Creates, deletes and status changes (some rolled back) keep counters equal to real counts"""
+    rng = random.Random(16)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        owner = User(email="o@example.com", username="o", hashed_password="x")
+        image = OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1)
+        db.add_all([owner, image])
+        db.commit()
+        owner_id, image_id = owner.id, image.id
+
+    for step in range(300):
+        with Session() as db:
+            op = rng.choice(["user", "host", "vps", "vps", "status", "status", "delete", "deactivate"])
+            if op == "user":
+                db.add(User(email=f"u{step}@example.com", username=f"u{step}", hashed_password="x",
+                            is_active=rng.random() < 0.8))
+            elif op == "host":
+                db.add(Host(name=f"h{step}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32,
+                            total_storage_gb=500, status=rng.choice(list(HostStatus))))
+            elif op == "vps":
+                vps = VPS(name=f"v{step}", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=image_id, owner_id=owner_id)
+                if rng.random() < 0.5:
+                    vps.status = rng.choice(list(VPSStatus))
+                db.add(vps)
+            elif op == "status":
+                model = rng.choice([VPS, Host])
+                row = db.scalars(select(model).order_by(model.id).limit(1).offset(rng.randrange(5))).first()
+                if row is not None:
+                    row.status = rng.choice(list(VPSStatus if model is VPS else HostStatus))
+            elif op == "delete":
+                row = db.scalars(select(rng.choice([VPS, Host, User])).limit(1)).first()
+                if row is not None and row.id != owner_id:
+                    db.expire(row)  # delete without the status loaded
+                    db.delete(row)
+            else:
+                row = db.scalars(select(User).limit(1).offset(rng.randrange(5))).first()
+                if row is not None:
+                    db.expire(row, ["is_active"])  # status assigned while unloaded
+                    row.is_active = not rng.random() < 0.5
+            if rng.random() < 0.2:
+                db.flush()
+                db.rollback()
+            else:
+                db.commit()
+
+    assert _stored(engine) == _real(engine)
+    assert reconcile(engine) == {}
+
+
+def test_reconcile_repairs_bulk_update_drift(engine):
+    """Query-level bulk writes bypass the hooks; reconcile finds and fixes the drift"""
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(Host(name=f"h{i}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32,
+                        total_storage_gb=500, status=HostStatus.ONLINE) for i in range(4))
+        db.commit()
+        db.execute(update(Host).where(Host.id <= 3).values(status=HostStatus.MAINTENANCE))
+        db.commit()
+
+    assert reconcile(engine) == {("hosts", "maintenance"): -3, ("hosts", "online"): 3}
+    assert _stored(engine) == _real(engine) == {("hosts", "online"): 1, ("hosts", "maintenance"): 3}
+
+
+def test_dashboard_reads_counters_in_one_query(engine):
+    """read_counters answers every dashboard figure from a single SELECT"""
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([User(email="a@example.com", username="a", hashed_password="x"),
+                    User(email="b@example.com", username="b", hashed_password="x", is_active=False)])
+        db.commit()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with sessionmaker(bind=engine)() as session:
+        counts = asyncio.run(read_counters(SyncSessionAdapter(session)))
+    assert counts["users"] == {"active": 1, "inactive": 1}
+    assert len(statements) == 1
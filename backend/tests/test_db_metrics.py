@@ -0,0 +1,69 @@
+"""
+Tests for the engine profile and connection pool metrics
+"""
+import threading
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, make_engine
+from app.core.db_metrics import InstrumentedQueuePool, instrument_engine
+from app.models.image import OSImage
+import app.models  # noqa: F401  (register tables)
+
+
+def _sample(name, pool):
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+
+def test_sqlite_profile_applied_on_connect(tmp_path):
+    """File-backed SQLite connections run in WAL mode with a busy timeout"""
+    engine = make_engine(f"sqlite:///{tmp_path}/profile.db", "test-profile")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+    assert _sample("db_pool_checkout_wait_seconds_count", "test-profile") >= 1
+    assert _sample("db_pool_connections_opened_total", "test-profile") == 1
+
+
+def test_concurrent_writers_do_not_hit_locked_database(tmp_path):
+    """Parallel committers queue on busy_timeout instead of failing"""
+    engine = make_engine(f"sqlite:///{tmp_path}/writers.db", "test-writers")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                with factory() as db:
+                    db.add(OSImage(name=f"img-{n}-{i}", os_family="ubuntu", file_path="/x", file_size_gb=1))
+                    db.commit()
+        except Exception as e:  # pragma: no cover - the failure being guarded against
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with factory() as db:
+        assert db.query(OSImage).count() == 160
+
+
+def test_checkout_timeout_is_counted(tmp_path):
+    """An exhausted pool records the timeout and gauges the checked-out connection"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/timeout.db",
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    instrument_engine(engine, "test-timeout")
+    held = engine.connect()
+    assert _sample("db_pool_checked_out", "test-timeout") == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    assert _sample("db_pool_checkout_timeouts_total", "test-timeout") == 1
+    assert _sample("db_pool_checked_out", "test-timeout") == 0
@@ -0,0 +1,156 @@
+"""
+Tests for read-replica routing (two SQLite files stand in for primary and replica)
+"""
+import time
+import pytest
+import redis
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, Replica, ReplicaSet, RoutingSession, StickyPrimary
+from app.models.image import OSImage
+import app.models  # noqa: F401  (register tables)
+
+
+def _engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _seed(engine, name):
+    with sessionmaker(bind=engine)() as db:
+        db.add(OSImage(name=name, os_family="ubuntu", file_path="/x", file_size_gb=1))
+        db.commit()
+
+
+class FakeRedis:
+    """Just the keys-with-TTL part of the redis-py API"""
+
+    def __init__(self):
+        self.expires = {}
+        self.round_trips = 0
+
+    def set(self, key, value, px):
+        self.round_trips += 1
+        self.expires[key] = time.monotonic() + px / 1000
+
+    def pttl(self, key):
+        self.round_trips += 1
+        left = self.expires.get(key, 0.0) - time.monotonic()
+        return int(left * 1000) if left > 0 else -2
+
+
+class DownRedis:
+    def set(self, key, value, px):
+        raise redis.ConnectionError("unreachable")
+
+    def pttl(self, key):
+        raise redis.ConnectionError("unreachable")
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    primary = _engine(tmp_path / "primary.db")
+    replica = _engine(tmp_path / "replica.db")
+    _seed(primary, "on-primary")
+    _seed(replica, "on-replica")
+    replicas = ReplicaSet([Replica("replica", replica)], eject_seconds=30)
+    shared = FakeRedis()
+    sticky = StickyPrimary(window_seconds=5, redis_factory=lambda: shared)
+    factory = sessionmaker(bind=primary, class_=RoutingSession, replicas=replicas, sticky=sticky)
+    return factory, replicas, sticky
+
+
+def _image_names(db):
+    return set(db.scalars(select(OSImage.name)))
+
+
+def test_read_only_sessions_use_replica(cluster):
+    """Only sessions marked read-only are routed to the replica"""
+    factory, _, _ = cluster
+    with factory() as db:
+        assert _image_names(db) == {"on-primary"}
+    with factory() as db:
+        db.info["read_only"] = True
+        assert _image_names(db) == {"on-replica"}
+
+
+def test_writes_go_to_primary_and_pin_session(cluster):
+    """A write from a read-only session lands on the primary and later reads follow it"""
+    factory, _, sticky = cluster
+    with factory() as db:
+        db.info.update(read_only=True, caller="user:1")
+        db.add(OSImage(name="written", os_family="ubuntu", file_path="/y", file_size_gb=1))
+        db.commit()
+        assert _image_names(db) == {"on-primary", "written"}
+    assert sticky.active("user:1")
+    assert not sticky.active("user:2")
+
+
+def test_failed_replica_is_ejected(cluster, tmp_path):
+    """A replica that cannot connect is skipped until its ejection expires"""
+    factory, replicas, _ = cluster
+    broken = Replica("broken", create_engine(f"sqlite:///{tmp_path}/missing/dir.db"))
+    replicas = ReplicaSet([broken, replicas.replicas[0]], eject_seconds=30)
+    factory.configure(replicas=replicas)
+    with pytest.raises(Exception):
+        with factory() as db:
+            db.info["read_only"] = True
+            _image_names(db)
+    assert [r["healthy"] for r in replicas.stats()] == [False, True]
+    for _ in range(3):
+        assert replicas.choose() is replicas.replicas[1]
+
+
+def test_all_replicas_down_falls_back_to_primary(cluster):
+    """With every replica ejected, reads go to the primary"""
+    factory, replicas, _ = cluster
+    replicas.eject(replicas.replicas[0])
+    with factory() as db:
+        db.info["read_only"] = True
+        assert _image_names(db) == {"on-primary"}
+
+
+def test_sticky_window_expires():
+    """A zero-length window never pins a caller"""
+    sticky = StickyPrimary(window_seconds=0, redis_factory=lambda: None)
+    sticky.mark("user:1")
+    assert not sticky.active("user:1")
+    assert not sticky.active(None)
+
+
+def test_sticky_window_is_shared_between_workers():
+    """A write on one worker pins the caller's reads on every other worker until the key expires"""
+    shared = FakeRedis()
+    writer, reader = (StickyPrimary(window_seconds=0.2, recheck_seconds=0.05, redis_factory=lambda: shared)
+                      for _ in range(2))
+    writer.mark("user:1")
+    assert reader.active("user:1") and not reader.active("user:2")
+    time.sleep(0.25)
+    assert not reader.active("user:1") and not writer.active("user:1")
+
+
+def test_sticky_reads_mostly_skip_redis():
+    """Windows and recent "no window" answers are kept locally; Redis is asked again once they lapse"""
+    shared = FakeRedis()
+    writer, reader = (StickyPrimary(window_seconds=5, recheck_seconds=0.1, redis_factory=lambda: shared)
+                      for _ in range(2))
+    writer.mark("user:1")
+    assert all(writer.active("user:1") for _ in range(10))
+    assert all(reader.active("user:1") for _ in range(10))
+    assert all(not reader.active("user:2") for _ in range(10))
+    assert shared.round_trips == 3  # The write, then one look-up per caller on the reader
+
+    writer.mark("user:2")
+    assert not reader.active("user:2")  # Still trusting the recent answer
+    time.sleep(0.15)
+    assert reader.active("user:2")
+
+
+def test_sticky_window_falls_back_to_this_worker_when_redis_is_down():
+    """Without Redis a caller is still pinned on the worker that saw the write"""
+    errors = []
+    sticky = StickyPrimary(window_seconds=5, redis_factory=DownRedis, on_redis_error=lambda: errors.append(1))
+    sticky.mark("user:1")
+    assert sticky.active("user:1") and not sticky.active("user:2")
+    assert len(errors) == 2
@@ -0,0 +1,92 @@
+"""
+Tests for the SQL-aggregated, snapshotted cluster host stats
+"""
+import asyncio
+import random
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.host_stats import HostStatsSnapshot, compute_host_stats
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.user import User
+from app.models.vps import VPS, VPSStatus
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/hosts.db")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(17)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(email="o@example.com", username="o", hashed_password="x"))
+        conn.execute(insert(OSImage).values(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        conn.execute(insert(Host), [
+            {"name": f"h{i}", "ip_address": "10.0.0.1", "status": rng.choice(list(HostStatus)),
+             "total_cpu_cores": 64, "total_ram_gb": 256.0, "total_storage_gb": 4000.0,
+             "used_cpu_cores": rng.randint(0, 64), "used_ram_gb": rng.uniform(0, 256),
+             "used_storage_gb": rng.uniform(0, 4000)}
+            for i in range(40)
+        ])
+        conn.execute(insert(VPS), [
+            {"name": f"v{i}", "cpu_cores": 1, "ram_gb": 1, "storage_gb": 10, "os_image_id": 1, "owner_id": 1,
+             "host_id": rng.randint(1, 40), "status": rng.choice(list(VPSStatus))}
+            for i in range(500)
+        ])
+    return sessionmaker(bind=engine)
+
+
+def test_aggregates_match_row_by_row_sums(factory):
+    """The SQL aggregates give the same figures as summing the ORM rows"""
+    with factory() as db:
+        stats = compute_host_stats(db)
+        hosts = db.scalars(select(Host)).all()
+        vpses = db.scalars(select(VPS)).all()
+    assert stats["hosts"] == {
+        "total": 40,
+        "online": sum(h.status == HostStatus.ONLINE for h in hosts),
+        "offline": sum(h.status == HostStatus.OFFLINE for h in hosts),
+    }
+    assert stats["resources"]["cpu"]["used"] == sum(h.used_cpu_cores for h in hosts)
+    assert stats["resources"]["ram"]["used_gb"] == pytest.approx(sum(h.used_ram_gb for h in hosts))
+    assert stats["resources"]["storage"]["usage_percent"] == pytest.approx(
+        sum(h.used_storage_gb for h in hosts) / sum(h.total_storage_gb for h in hosts) * 100
+    )
+    running = sum(v.status == VPSStatus.RUNNING for v in vpses)
+    creating = sum(v.status == VPSStatus.CREATING for v in vpses)
+    assert stats["vpses"] == {"total": running + creating, "running": running, "creating": creating}
+
+
+def test_empty_cluster(tmp_path):
+    """No hosts: zero totals rather than NULLs or a division by zero"""
+    engine = create_engine(f"sqlite:///{tmp_path}/empty.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        stats = compute_host_stats(db)
+    assert stats["hosts"]["total"] == 0
+    assert stats["resources"]["ram"] == {"total_gb": 0, "used_gb": 0, "available_gb": 0, "usage_percent": 0}
+
+
+def test_snapshot_is_shared_then_refreshed_in_background(factory):
+    """Callers share one computation; once stale they get the old value while it refreshes"""
+    snapshot = HostStatsSnapshot(ttl_seconds=60, session_factory=factory)
+
+    async def scenario():
+        first = await asyncio.gather(*(snapshot.get() for _ in range(5)))
+        assert snapshot.refreshes == 1 and all(s is first[0] for s in first)
+
+        with factory() as db:
+            db.get(Host, 1).status = HostStatus.ONLINE if first[0]["hosts"]["online"] == 0 else HostStatus.ERROR
+            db.commit()
+        snapshot._computed_at -= 61
+        assert await snapshot.get() is first[0]  # stale value served immediately
+        for _ in range(100):
+            if snapshot.refreshes == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert snapshot.refreshes == 2
+        assert (await snapshot.get()) is not first[0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,157 @@
+"""
+Tests for the pooled hypervisor connection manager
+"""
+import asyncio
+import importlib.util
+import time
+import pytest
+from celery.signals import worker_init
+from prometheus_client import REGISTRY
+from app.core.hypervisor import (
+    FakeHypervisor,
+    HypervisorBusy,
+    HypervisorConnectionError,
+    HypervisorManager,
+    LibvirtBackend,
+    make_backend,
+)
+import app.core.jobs  # noqa: F401  (connects the worker_init check)
+from app.core.config import settings
+
+SPEC = {"cpu_cores": 1, "ram_gb": 1, "storage_gb": 10, "disk_path": "/x.qcow2"}
+
+
+@pytest.fixture
+def fake():
+    return FakeHypervisor()
+
+
+def test_one_connection_per_host_and_bounded_threads(fake):
+    """Calls share a persistent connection; a slow host's pool doesn't hold up another host"""
+    manager = HypervisorManager(fake, threads_per_host=2)
+    try:
+        manager.define("test://a", "d1", SPEC)
+        for _ in range(20):
+            manager.start("test://a", "d1")
+        assert fake.connects == ["test://a"]
+
+        fake.latency["test://a"] = 0.1
+        started = time.perf_counter()
+        slow = [manager.submit("test://a", "start", "d1") for _ in range(4)]
+        manager.define("test://b", "d2", SPEC)  # Own pool: doesn't queue behind test://a
+        assert time.perf_counter() - started < 0.1
+        for future in slow:
+            future.result()
+        assert time.perf_counter() - started >= 0.2  # 4 calls, 2 at a time
+        assert fake.connects == ["test://a", "test://b"]
+        assert REGISTRY.get_sample_value(
+            "hypervisor_call_seconds_count", {"host": "test://a", "operation": "start"}
+        ) >= 24
+    finally:
+        manager.close()
+
+
+def test_reconnect_with_backoff(fake):
+    """A dead connection is replaced; an unreachable host fails fast until its backoff has passed"""
+    manager = HypervisorManager(fake, reconnect_base_seconds=0.2)
+    try:
+        manager.define("test://a", "d1", SPEC)
+        fake.drop("test://a")
+        manager.start("test://a", "d1")  # Checked before use and replaced
+        assert fake.connects == ["test://a"] * 2
+
+        fake.drop("test://a")
+        fake.unreachable.add("test://a")
+        with pytest.raises(HypervisorConnectionError):
+            manager.start("test://a", "d1")
+        with pytest.raises(HypervisorConnectionError, match="next connect in"):
+            manager.start("test://a", "d1")
+        assert fake.connects == ["test://a"] * 3  # The second call didn't try
+
+        fake.unreachable.clear()
+        time.sleep(0.25)
+        manager.start("test://a", "d1")
+        assert fake.connects == ["test://a"] * 4
+    finally:
+        manager.close()
+
+
+def test_async_api_and_backpressure(fake):
+    """Awaiting calls leaves the event loop free; calls beyond the pending limit are refused"""
+    manager = HypervisorManager(fake, threads_per_host=1, max_pending_per_host=3)
+    fake.latency["test://a"] = 0.05
+
+    async def main():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        calls = [asyncio.ensure_future(manager.call("test://a", "define", f"d{i}", SPEC)) for i in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(HypervisorBusy):
+            await manager.call("test://a", "define", "d3", SPEC)
+        await asyncio.gather(*calls)
+        done.set()
+        await tick_task
+        return ticks, await manager.call("test://a", "list_domains")
+
+    try:
+        ticks, domains = asyncio.run(main())
+        assert ticks >= 5 and domains == ["d0", "d1", "d2"]
+    finally:
+        manager.close()
+
+
+def test_cancelled_calls_give_their_slot_back(fake):
+    """Awaiters cancelled while their calls are still queued don't use up the host's pending slots"""
+    manager = HypervisorManager(fake, threads_per_host=1, max_pending_per_host=4)
+    fake.latency["test://a"] = 0.05
+
+    async def main():
+        for _ in range(3):
+            calls = [asyncio.ensure_future(manager.call("test://a", "list_domains")) for _ in range(4)]
+            await asyncio.sleep(0.01)  # The first is running, the rest queued behind it
+            for call in calls:
+                call.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+            await asyncio.sleep(0.06)
+        return await asyncio.gather(*(manager.call("test://a", "list_domains") for _ in range(4)))
+
+    try:
+        assert asyncio.run(main()) == [[]] * 4
+        assert REGISTRY.get_sample_value("hypervisor_pending_calls", {"host": "test://a"}) == 0
+    finally:
+        manager.close()
+
+
+def test_libvirt_test_driver():
+    """The libvirt backend against libvirt's built-in test hypervisor"""
+    pytest.importorskip("libvirt")
+    manager = HypervisorManager(LibvirtBackend(keepalive_interval=0))
+    try:
+        assert "test" in manager.run("test:///default", "list_domains")
+        manager.shutdown("test:///default", "test")
+        manager.start("test:///default", "test")
+    finally:
+        manager.close()
+
+
+@pytest.mark.skipif(importlib.util.find_spec("libvirt") is not None, reason="libvirt-python is installed")
+def test_missing_libvirt_stops_the_worker(monkeypatch):
+    """No silent fallback: only an explicit "fake" gets the in-memory driver, and a worker won't start without libvirt"""
+    assert isinstance(make_backend("fake"), FakeHypervisor)
+    with pytest.raises(ImportError):
+        make_backend("libvirt")
+    with pytest.raises(ValueError):
+        make_backend("auto")
+    monkeypatch.setattr(settings, "HYPERVISOR_DRIVER", "libvirt")
+    with pytest.raises(SystemExit):
+        worker_init.send(sender=None)
+    monkeypatch.setattr(settings, "HYPERVISOR_DRIVER", "fake")
+    worker_init.send(sender=None)
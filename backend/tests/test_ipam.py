@@ -0,0 +1,100 @@
+"""
+Tests for bitmap-backed IP address pools
+"""
+import asyncio
+import ipaddress
+import random
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, SyncSessionAdapter
+from app.core.ipam import _take, allocate_addresses, create_pool, release_addresses
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.user import User
+from app.models.vps import VPS, VPSStatus, NetworkType
+import app.models  # noqa: F401  (register tables)
+
+PRIVATE = NetworkType.PRIVATE_ONLY
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/ipam.db", connect_args={"timeout": 60})
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def test_take_sets_lowest_clear_bits():
+    """Free bits are found across partly used bytes and never handed out twice"""
+    bitmap = bytearray([0xFF, 0b10110111, 0x00])
+    assert _take(bitmap, 3) == [11, 14, 16]
+    assert bitmap == bytearray([0xFF, 0xFF, 0x01])
+    assert _take(bytearray([0xFF]), 1) == []
+
+
+def test_full_slash16_under_parallel_requests(engine, sessions):
+    """Concurrent requests drain a /16: every usable address exactly once, then none"""
+    with sessionmaker(bind=engine)() as db:
+        create_pool(db, "lab", "10.20.0.0/16", PRIVATE)
+        db.commit()
+    allocated, lock = [], threading.Lock()
+
+    async def requests(seed):
+        rng = random.Random(seed)
+        async with sessions.session(engine) as db:
+            while True:
+                got = await allocate_addresses(db, PRIVATE, None, rng.randint(1, 64))
+                await db.commit()
+                if not got:
+                    return
+                with lock:
+                    allocated.extend(got)
+
+    threads = [threading.Thread(target=asyncio.run, args=(requests(seed),)) for seed in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    network = ipaddress.ip_network("10.20.0.0/16")
+    assert len(allocated) == len(set(allocated)) == 65534
+    assert set(map(ipaddress.ip_address, allocated)) == set(network.hosts())
+
+    # Released addresses, and only those, are handed out again
+    freed = random.Random(1).sample(allocated, 100)
+
+    async def recycle():
+        async with sessions.session(engine) as db:
+            assert await release_addresses(db, PRIVATE, None, freed + freed[:10]) == 100
+            await db.commit()
+            assert sorted(await allocate_addresses(db, PRIVATE, None, 200)) == sorted(freed)
+
+    asyncio.run(recycle())
+
+
+def test_pools_skip_reserved_and_held_addresses(engine):
+    """Reserved and already-assigned addresses are taken; host pools are used before shared ones"""
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([
+            User(email="o@example.com", username="o", hashed_password="x"),
+            OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1),
+            Host(name="h1", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=16,
+                 total_storage_gb=100, status=HostStatus.ONLINE),
+        ])
+        db.flush()
+        db.add(VPS(name="old", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=1, owner_id=1,
+                   network_type=NetworkType.PUBLIC_IPV4, public_ipv4="198.51.100.2", status=VPSStatus.RUNNING))
+        create_pool(db, "shared", "198.51.100.0/29", NetworkType.PUBLIC_IPV4, reserved=["198.51.100.1"])
+        create_pool(db, "h1", "192.0.2.0/30", NetworkType.PUBLIC_IPV4, host_id=1)
+        with pytest.raises(ValueError):
+            create_pool(db, "overlap", "198.51.100.0/28", NetworkType.PUBLIC_IPV4, host_id=1)
+        db.commit()
+
+        session = SyncSessionAdapter(db)
+        got = asyncio.run(allocate_addresses(session, NetworkType.PUBLIC_IPV4, 1, 10))
+        # h1's /30 first (.1, .2), then the shared /29 without .1 (gateway) and .2 (in use)
+        assert got[:2] == ["192.0.2.1", "192.0.2.2"]
+        assert sorted(got[2:]) == [f"198.51.100.{i}" for i in range(3, 7)]
+        assert asyncio.run(allocate_addresses(session, PRIVATE, 1)) == []
@@ -0,0 +1,214 @@
+"""
+Tests for VPS jobs (Celery in eager mode, in-memory hypervisor)
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+import app.api.v1.vps as vps_api
+import app.core.jobs as jobs
+from app.core.config import settings
+from app.core.database import Base, get_async_db
+from app.core.dependencies import get_current_admin, get_current_user
+from app.core.hypervisor import FakeHypervisor, HypervisorManager, RUNNING, SHUTOFF
+from app.core.ipam import create_pool
+from app.core.principal_cache import Principal
+from app.core.scheduler import PlacementScheduler, Resources
+from app.main import app
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.job import Job, JobKind, JobStatus
+from app.models.user import User, UserRole
+from app.models.vps import VPS, NetworkType
+
+SPEC = {"name": "web", "cpu_cores": 2, "ram_gb": 4, "storage_gb": 20, "os_image_id": 1, "owner_id": 1}
+URI = "qemu+ssh://h1/system"
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch, sessions):
+    """(client, Session, fake hypervisor) with jobs run inline by Celery"""
+    engine = create_engine(f"sqlite:///{tmp_path}/jobs.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(User(email="a@example.com", username="a", hashed_password="x", role=UserRole.ADMIN))
+        db.add(OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        db.add(Host(name="h1", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32, total_storage_gb=500,
+                    status=HostStatus.ONLINE, libvirt_uri=URI))
+        create_pool(db, "public", "203.0.113.0/24", NetworkType.PUBLIC_IPV4)
+        db.commit()
+
+    fake = FakeHypervisor()
+    monkeypatch.setattr(vps_api, "scheduler", PlacementScheduler())
+    monkeypatch.setattr(vps_api, "record_audit", lambda db, **entry: None)
+    monkeypatch.setattr(jobs, "session_factory", Session)
+    driver = HypervisorManager(fake)
+    monkeypatch.setattr(jobs, "get_driver", lambda: driver)
+    monkeypatch.setitem(jobs.celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    admin = Principal(id=1, uuid="u1", email="a@example.com", username="a", full_name=None,
+                      role=UserRole.ADMIN, is_active=True, is_2fa_enabled=False)
+    app.dependency_overrides.update({
+        get_async_db: sessions.override(engine), get_current_admin: lambda: admin, get_current_user: lambda: admin,
+    })
+    try:
+        yield TestClient(app), Session, fake
+    finally:
+        app.dependency_overrides.clear()
+        driver.close()
+
+
+def _job(client, job_id):
+    r = client.get(f"/api/v1/jobs/{job_id}")
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_lifecycle_runs_through_jobs(env):
+    """Each endpoint answers 202 with a job; the job drives the hypervisor and the VPS state"""
+    client, Session, fake = env
+    r = client.post("/api/v1/vps/", json=SPEC)
+    assert r.status_code == 202, r.text
+    vps = r.json()
+    assert vps["status"] == "creating"
+    job = _job(client, vps["job_id"])
+    assert (job["kind"], job["status"], job["progress"], job["attempts"]) == ("create", "succeeded", 100, 1)
+    assert fake.domains[URI, vps["uuid"]]["state"] == SHUTOFF
+    assert client.get(f"/api/v1/vps/{vps['id']}").json()["status"] == "stopped"
+
+    for action, state, vps_status in [("start", RUNNING, "running"), ("reboot", RUNNING, "running"),
+                                      ("stop", SHUTOFF, "stopped")]:
+        r = client.post(f"/api/v1/vps/{vps['id']}/{action}")
+        assert r.status_code == 202, r.text
+        assert _job(client, r.json()["job_id"])["status"] == "succeeded"
+        assert fake.domains[URI, vps["uuid"]]["state"] == state
+        assert client.get(f"/api/v1/vps/{vps['id']}").json()["status"] == vps_status
+
+    r = client.patch(f"/api/v1/vps/{vps['id']}", json={"cpu_cores": 4})
+    assert r.status_code == 202 and _job(client, r.json()["job_id"])["status"] == "succeeded"
+    assert fake.domains[URI, vps["uuid"]]["spec"]["cpu_cores"] == 4
+    assert client.patch(f"/api/v1/vps/{vps['id']}", json={"name": "web-2"}).json()["job_id"] is None
+
+    r = client.delete(f"/api/v1/vps/{vps['id']}")
+    assert r.status_code == 202
+    job = _job(client, r.json()["job_id"])
+    assert job["status"] == "succeeded" and job["vps_id"] is None
+    assert (URI, vps["uuid"]) not in fake.domains
+    with Session() as db:
+        assert db.get(VPS, vps["id"]) is None
+
+
+def test_list_follows_the_next_link(env):
+    """GET /vps/ pages by id; the Link header's next cursor walks the rest, with the total counted once asked"""
+    client, Session, fake = env
+    ids = [client.post("/api/v1/vps/", json=dict(SPEC, name=f"web-{i}")).json()["id"] for i in range(3)]
+    r = client.get("/api/v1/vps/", params={"limit": 2, "include_total": True})
+    assert r.status_code == 200, r.text
+    assert [v["id"] for v in r.json()] == ids[:2] and r.headers["X-Total-Count"] == "3"
+    next_url = r.links["next"]["url"]
+    assert [v["id"] for v in client.get(next_url).json()] == ids[2:]
+    assert client.get("/api/v1/vps/", params={"status_filter": "running"}).json() == []
+
+
+def test_failed_attempts_are_retried_then_fail(env):
+    """Transient errors are retried with backoff; exhausting the attempts fails the job (and a create, the VPS)"""
+    client, Session, fake = env
+    fake.fail("define", times=2)
+    vps = client.post("/api/v1/vps/", json=SPEC).json()
+    job = _job(client, vps["job_id"])
+    assert (job["status"], job["attempts"], job["error"]) == ("succeeded", 3, None)
+
+    fake.fail("start", times=3, error="host unreachable")
+    job = _job(client, client.post(f"/api/v1/vps/{vps['id']}/start").json()["job_id"])
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 3, "host unreachable")
+    assert client.get(f"/api/v1/vps/{vps['id']}").json()["status"] == "stopped"
+
+    fake.fail("define", times=3)
+    broken = client.post("/api/v1/vps/", json=dict(SPEC, name="broken")).json()
+    assert _job(client, broken["job_id"])["status"] == "failed"
+    assert client.get(f"/api/v1/vps/{broken['id']}").json()["status"] == "error"
+
+    assert 0 <= jobs.backoff(1) <= settings.JOB_RETRY_BASE_SECONDS
+    assert jobs.backoff(60) <= settings.JOB_RETRY_MAX_SECONDS
+
+
+def test_jobs_run_once_and_undelivered_ones_are_swept(env, monkeypatch):
+    """One job per VPS at a time; a job id delivered twice runs once; the sweeper re-sends lost jobs"""
+    client, Session, fake = env
+
+    async def lost(job_ids):
+        pass
+
+    monkeypatch.setattr(vps_api, "dispatch", lost)
+    vps = client.post("/api/v1/vps/", json=SPEC).json()
+    assert client.post(f"/api/v1/vps/{vps['id']}/start").status_code == 409
+    assert _job(client, vps["job_id"])["status"] == "queued"
+
+    # Not overdue yet, then re-sent once it is
+    assert jobs.sweep() == 0
+    assert jobs.sweep(datetime.utcnow() + timedelta(seconds=settings.JOB_SWEEP_SECONDS + 1)) == 1
+    assert _job(client, vps["job_id"])["status"] == "succeeded"
+    assert jobs.execute(vps["job_id"]) is None
+    assert [op for op, _ in fake.calls] == ["define"]
+
+    # A worker that died mid-job: its lease runs out and the job is handed out again
+    with Session() as db:
+        job = db.get(Job, vps["job_id"])
+        job.status, job.lease_until = JobStatus.RUNNING, datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+    assert jobs.sweep() == 1
+    assert _job(client, vps["job_id"])["attempts"] == 2
+
+
+def test_racing_requests_cannot_queue_two_jobs(env, monkeypatch):
+    """A job committed between the in-flight check and the insert makes the request 409 and undoes its releases"""
+    client, Session, fake = env
+    vps = client.post("/api/v1/vps/", json=SPEC).json()
+    with Session() as db:
+        with pytest.raises(IntegrityError):
+            db.add_all([jobs.enqueue(db, JobKind.STOP, vps["id"], 1), jobs.enqueue(db, JobKind.START, vps["id"], 1)])
+            db.commit()
+
+    async def raced(db, vps_id):
+        with Session() as other:
+            jobs.enqueue(other, JobKind.STOP, vps_id, 1)
+            other.commit()
+        return False
+
+    monkeypatch.setattr(vps_api, "has_active_job", raced)
+    monkeypatch.setattr(vps_api, "dispatch", lambda job_ids: asyncio.sleep(0))
+    r = client.delete(f"/api/v1/vps/{vps['id']}")
+    assert r.status_code == 409, r.text
+    with Session() as db:
+        host, row = db.get(Host, 1), db.get(VPS, vps["id"])
+        assert (host.used_cpu_cores, host.used_ram_gb, host.used_storage_gb) == (2, 4, 20)
+        assert row.status.value == "stopped" and row.public_ipv4 is not None
+        assert db.query(Job).filter(Job.vps_id == vps["id"], Job.status.in_(jobs.ACTIVE)).count() == 1
+
+    # Once the job that got in first has finished, the next request goes through
+    monkeypatch.setattr(vps_api, "has_active_job", jobs.has_active_job)
+    with Session() as db:
+        db.query(Job).filter(Job.status == JobStatus.QUEUED).update({"status": JobStatus.SUCCEEDED})
+        db.commit()
+    assert client.post(f"/api/v1/vps/{vps['id']}/start").status_code == 202
+
+
+def test_failed_address_allocation_gives_the_reservation_back(env, monkeypatch):
+    """An error while taking an address rolls the placement back in the database and in the scheduler"""
+    client, Session, fake = env
+
+    async def broken(db, network_type, host_id, count=1):
+        raise RuntimeError("pool table locked")
+
+    monkeypatch.setattr(vps_api, "allocate_addresses", broken)
+    with pytest.raises(RuntimeError):
+        client.post("/api/v1/vps/", json=SPEC)
+    assert vps_api.scheduler.index.free(1) == Resources(8, 32, 500)
+    with Session() as db:
+        host = db.get(Host, 1)
+        assert (host.used_cpu_cores, host.used_ram_gb, host.used_storage_gb) == (0, 0, 0)
+        assert db.query(VPS).count() == 0
@@ -0,0 +1,188 @@
+"""
+Tests for the ring-buffer metric store and GET /vps/{id}/stats
+"""
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import app.core.metric_store as metric_store
+from app.core.database import Base, SyncSessionAdapter, get_async_db
+from app.core.dependencies import get_current_user
+from app.core.metric_store import MetricStore, parse_tiers
+from app.core.principal_cache import Principal
+from app.main import app
+from app.models.image import OSImage
+from app.models.user import User, UserRole
+from app.models.vps import VPS
+
+TIERS = parse_tiers("10s:1h,1m:6h,5m:1d,1h:7d")
+T0 = 1_700_002_800  # On an hour boundary
+
+
+def _fill(store, seconds, ids=(1, 2), start=T0):
+    """One sample per 10s: metric a counts samples, b is constant per id; id 2 skips every other sample"""
+    for i in range(seconds // 10):
+        reporting = [id for id in ids if id != 2 or i % 2 == 0]
+        store.record(reporting, [(i, id) for id in reporting], at=start + i * 10)
+
+
+def test_raw_samples_and_rollups():
+    """Samples read back at 10s; coarser steps come from min/avg/max rollups; gaps read as None"""
+    store = MetricStore(("a", "b"), TIERS, capacity=1)
+    _fill(store, 2 * 3600)
+    end = T0 + 2 * 3600 - 10
+
+    raw = store.query(1, end - 50, end, 10)
+    assert raw["timestamps"] == list(range(end - 50, end + 1, 10))
+    assert raw["metrics"]["a"] == {"min": [714, 715, 716, 717, 718, 719], "avg": [714, 715, 716, 717, 718, 719],
+                                   "max": [714, 715, 716, 717, 718, 719]}
+    assert store.query(2, end - 30, end, 10)["metrics"]["a"]["avg"] == [716, None, 718, None]
+
+    # Two hours back at 5m is past the raw tier: served from the 1m rollups
+    five = store.query(1, T0, end, 300)
+    assert five["timestamps"][:2] == [T0, T0 + 300]
+    assert five["metrics"]["a"]["min"][:2] == [0, 30]
+    assert five["metrics"]["a"]["avg"][:2] == [14.5, 44.5]
+    assert five["metrics"]["a"]["max"][:2] == [29, 59]
+    assert five["metrics"]["b"]["max"][0] == 1
+    assert store.query(2, T0, end, 300)["metrics"]["b"]["avg"][0] == 2
+
+    # A day ago nothing was recorded; an unknown id has no history at all
+    assert set(store.query(1, T0 - 86400, T0 - 3600, 3600)["metrics"]["a"]["avg"]) == {None}
+    assert set(store.query(9, T0, end, 300)["metrics"]["a"]["max"]) == {None}
+
+    # After a day the 1m tier no longer reaches back: the 1h tier answers
+    _fill(store, 3600, ids=(1,), start=T0 + 26 * 3600)
+    hourly = store.query(1, T0, T0 + 2 * 3600 - 1, 3600)
+    assert hourly["metrics"]["a"]["min"] == [0, 360] and hourly["metrics"]["a"]["max"] == [359, 719]
+
+
+def test_persist_and_reload(tmp_path):
+    """Saved stores reopen with their history; rows are added past the initial capacity"""
+    store = MetricStore(("a", "b"), TIERS, directory=str(tmp_path), capacity=1)
+    _fill(store, 600, ids=(1, 2, 3))
+    store.save()
+    expected = store.query(3, T0, T0 + 590, 60)
+
+    reopened = MetricStore(("a", "b"), TIERS, directory=str(tmp_path), capacity=1)
+    assert reopened.query(3, T0, T0 + 590, 60) == expected
+    assert expected["metrics"]["a"]["avg"][0] == 2.5
+    reopened.record([4], [(1, 1)], at=T0 + 600)
+    assert reopened.query(4, T0 + 600, T0 + 600, 10)["metrics"]["b"]["avg"] == [1]
+
+    # Another layout can't reuse the files: it starts empty
+    other = MetricStore(("a", "b", "c"), TIERS, directory=str(tmp_path))
+    assert set(other.query(3, T0, T0 + 590, 60)["metrics"]["a"]["avg"]) == {None}
+
+
+def test_readers_follow_the_writer(tmp_path):
+    """Read-only stores see the writer's samples as they land, and new series and growth after its index"""
+    writer = MetricStore(("a", "b"), TIERS, directory=str(tmp_path), capacity=2)
+    reader = MetricStore(("a", "b"), TIERS, directory=str(tmp_path), writable=False)
+    _fill(writer, 60)
+    assert reader.query(1, T0, T0 + 50, 10)["metrics"]["a"]["avg"] == [0, 1, 2, 3, 4, 5]
+
+    writer.record([1, 3, 4, 5], [(6, 1), (6, 3), (6, 4), (6, 5)], at=T0 + 60)  # Grows past 2 rows
+    assert reader.query(5, T0 + 60, T0 + 60, 10)["metrics"]["b"]["avg"] == [5]
+    assert reader.query(1, T0 + 50, T0 + 60, 10)["metrics"]["a"]["avg"] == [5, 6]
+    with pytest.raises(RuntimeError):
+        reader.record([1], [(0, 0)], at=T0 + 70)
+    reader.save()  # Nothing to save: the writer's files are left alone
+
+
+def test_one_process_writes(tmp_path, monkeypatch):
+    """get_store gives read-only stores until set_writer; handing back saves for the next writer"""
+    monkeypatch.setattr(metric_store.settings, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metric_store, "_stores", {})
+    monkeypatch.setattr(metric_store, "_writer", False)
+    assert not metric_store.get_store("host").writable
+    assert not os.path.exists(tmp_path / "host")  # Readers create nothing
+
+    metric_store.set_writer(True)
+    store = metric_store.get_store("host")
+    assert store.writable and store.directory == str(tmp_path / "host")
+    store.record([7], [(50, 2, 0, 0, 0, 0)])
+    metric_store.set_writer(False)
+    reader = metric_store.get_store("host")
+    assert reader is not store and not reader.writable
+    assert metric_store.history("host", 7, "1m")["metrics"]["running"]["max"][-2:] in ([2, None], [None, 2])
+
+
+def test_silent_series_are_freed():
+    """A series that has been silent for longer than the store keeps anything gives its row back"""
+    store = MetricStore(("a",), parse_tiers("10s:1m,1m:5m"), capacity=2)
+    store.record([1, 2], [(1,), (2,)], at=T0)
+    store.record([1], [(1,)], at=T0 + 310)
+    store.save()
+    store.record([3], [(3,)], at=T0 + 320)
+    assert store.query(3, T0 + 320, T0 + 320, 10)["metrics"]["a"]["avg"] == [3]
+    assert len(store._last_seen) == 2  # Reused 2's row instead of growing
+
+
+def test_parameters():
+    """Durations, tiers and range/step limits"""
+    assert [metric_store.parse_duration(t) for t in ("90", "30s", "5m", "1h", "7d")] == [90, 30, 300, 3600, 604800]
+    with pytest.raises(ValueError):
+        parse_tiers("10s:1h,15s:1d")
+    store = MetricStore(("a",), TIERS)
+    assert store.window("1h") == (3600, 10)
+    assert store.window("1d") == (86400, 300)
+    assert store.window("6h", "1m") == (21600, 60)
+    for bad in [("8d", None), ("1h", "15s"), ("7d", "10s"), ("soon", None)]:
+        with pytest.raises(ValueError):
+            store.window(*bad)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/stats.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(User(email="a@example.com", username="a", hashed_password="x"))
+        db.add(OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        db.add(VPS(name="v", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=1, owner_id=1))
+        db.commit()
+
+    def override_async_db():
+        db = Session()
+        try:
+            yield SyncSessionAdapter(db)
+        finally:
+            db.close()
+
+    store = MetricStore(metric_store.VPS_METRICS, TIERS)
+    monkeypatch.setattr(metric_store, "_stores", {"vps": store})
+    app.dependency_overrides[get_async_db] = override_async_db
+    app.dependency_overrides[get_current_user] = lambda: Principal(
+        id=1, uuid="u1", email="a@example.com", username="a", full_name=None,
+        role=UserRole.USER, is_active=True, is_2fa_enabled=False,
+    )
+    try:
+        yield TestClient(app), store
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_vps_stats_endpoint(client):
+    """GET /vps/{id}/stats serves the store's points for the VPS owner"""
+    client, store = client
+    now = time.time()
+    for i in range(30):
+        store.record([1], [(i, 50, 10, 0, 0, 100, 200)], at=now - 300 + i * 10)
+
+    r = client.get("/api/v1/vps/1/stats", params={"range": "5m", "step": "1m"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert (body["range"], body["step"]) == (300, 60)
+    assert len(body["timestamps"]) in (5, 6)
+    assert [v for v in body["metrics"]["ram"]["avg"] if v is not None][0] == 50
+    assert max(v for v in body["metrics"]["cpu"]["max"] if v is not None) == 29
+    assert set(body["metrics"]) == set(metric_store.VPS_METRICS)
+
+    assert client.get("/api/v1/vps/1/stats").json()["step"] == 10
+    assert client.get("/api/v1/vps/1/stats", params={"range": "30d"}).status_code == 422
+    assert client.get("/api/v1/vps/1/stats", params={"step": "15s"}).status_code == 422
+    assert client.get("/api/v1/vps/2/stats").status_code == 404
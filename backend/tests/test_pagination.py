@@ -0,0 +1,105 @@
+"""
+Tests for keyset (cursor) pagination
+"""
+import asyncio
+from datetime import datetime
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from app.core.database import Base, SyncSessionAdapter
+from app.core.pagination import decode_cursor, encode_cursor, paginate, set_page_headers
+from app.models.audit_log import AuditAction, AuditLog, AuditResource
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/pages.db")
+    Base.metadata.create_all(bind=engine)
+    same_second = datetime(2024, 1, 1, 12, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(AuditLog), [
+            {"action": AuditAction.LOGIN, "resource_type": AuditResource.USER, "resource_id": i,
+             # Heavy created_at ties: ordering has to fall back to id
+             "created_at": same_second if i % 3 else datetime(2024, 1, 1, 11, 0, i % 60)}
+            for i in range(50)
+        ])
+    session = sessionmaker(bind=engine)()
+    yield SyncSessionAdapter(session)
+    session.close()
+
+
+def _page(db, cursor=None, limit=7, **kwargs):
+    return asyncio.run(paginate(
+        db, select(AuditLog), AuditLog,
+        keys=[AuditLog.created_at, AuditLog.id], descending=True,
+        limit=limit, cursor=cursor, **kwargs,
+    ))
+
+
+def _expected_order(db):
+    rows = asyncio.run(db.scalars(select(AuditLog).order_by(AuditLog.created_at.desc(), AuditLog.id.desc())))
+    return [r.id for r in rows]
+
+
+def test_forward_and_backward_walks_match(db):
+    """Following next cursors visits every row once; prev cursors retrace them"""
+    pages, cursor = [], None
+    while True:
+        page = _page(db, cursor)
+        pages.append([r.id for r in page.items])
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+    assert [i for p in pages for i in p] == _expected_order(db)
+    assert _page(db).prev_cursor is None
+
+    back, cursor = [], page.prev_cursor
+    while cursor:
+        page = _page(db, cursor)
+        back.append([r.id for r in page.items])
+        cursor = page.prev_cursor
+    assert back == pages[-2::-1]
+
+
+def test_new_rows_do_not_shift_later_pages(db):
+    """Rows inserted after the first page do not reappear or push rows along"""
+    first = _page(db)
+    asyncio.run(db.execute(insert(AuditLog).values(
+        action=AuditAction.LOGIN, resource_type=AuditResource.USER, created_at=datetime(2030, 1, 1)
+    )))
+    second = _page(db, first.next_cursor)
+    assert second.items[0].id == _expected_order(db)[8]  # index 0 is the new row
+    assert not {r.id for r in first.items} & {r.id for r in second.items}
+
+
+def test_total_is_counted_on_request(db):
+    """The total is only computed when asked for"""
+    assert _page(db).total is None
+    assert _page(db, include_total=True).total == 50
+
+
+def test_invalid_cursor_is_rejected():
+    """Garbage cursors are a 400, not a server error"""
+    with pytest.raises(HTTPException) as err:
+        decode_cursor("not-a-cursor")
+    assert err.value.status_code == 400
+    assert decode_cursor(encode_cursor(12, "prev")) == (12, "prev")
+
+
+def test_link_header(db):
+    """Link carries both directions and drops the legacy skip parameter"""
+    page = _page(db, _page(db).next_cursor, include_total=True)
+    request = Request({
+        "type": "http", "method": "GET", "scheme": "http", "server": ("panel", 80),
+        "path": "/api/v1/admin/audit-logs", "query_string": b"limit=7&skip=0", "headers": [],
+    })
+    response = Response()
+    set_page_headers(response, request, page)
+    link = response.headers["Link"]
+    assert f"cursor={page.next_cursor}" in link and 'rel="next"' in link
+    assert f"cursor={page.prev_cursor}" in link and 'rel="prev"' in link
+    assert "skip=" not in link
+    assert response.headers["X-Total-Count"] == "50"
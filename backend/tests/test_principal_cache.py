@@ -0,0 +1,94 @@
+"""
+Tests for the authenticated-principal cache
+"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from app.core.dependencies import get_current_user
+from app.core.principal_cache import Principal, PrincipalCache, principal_cache
+from app.core.security import create_access_token
+from app.models.user import User, UserRole
+
+
+def make_principal(user_id: int, is_active: bool = True) -> Principal:
+    return Principal(
+        id=user_id,
+        uuid=f"uuid-{user_id}",
+        email=f"u{user_id}@example.com",
+        username=f"u{user_id}",
+        full_name=None,
+        role=UserRole.USER,
+        is_active=is_active,
+        is_2fa_enabled=False,
+    )
+
+
+class FakeSession:
+    def __init__(self, user):
+        self.user = user
+        self.selects = 0
+
+    async def get(self, model, ident):
+        self.selects += 1
+        return self.user
+
+
+def test_lru_eviction_and_counters():
+    """Least recently used entries are evicted first"""
+    cache = PrincipalCache(maxsize=2, ttl_seconds=60)
+    cache.put(make_principal(1))
+    cache.put(make_principal(2))
+    assert cache.get(1).id == 1
+    cache.put(make_principal(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 1}
+
+
+def test_ttl_expiry(monkeypatch):
+    """Entries expire after the TTL"""
+    import app.core.principal_cache as module
+    clock = [100.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    cache = PrincipalCache(maxsize=10, ttl_seconds=5)
+    cache.put(make_principal(1))
+    clock[0] += 4
+    assert cache.get(1) is not None
+    clock[0] += 2
+    assert cache.get(1) is None
+
+
+def test_invalidate():
+    """Explicit invalidation drops the entry"""
+    cache = PrincipalCache(maxsize=10, ttl_seconds=60)
+    cache.put(make_principal(1))
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_get_current_user_skips_select_on_hit():
+    """Second request for the same user is served from the cache"""
+    principal_cache.clear()
+    user = User(
+        id=42, uuid="u-42", email="u42@example.com", username="u42",
+        role=UserRole.USER, is_active=True, is_2fa_enabled=False,
+    )
+    db = FakeSession(user)
+    token = create_access_token(data={"sub": user.id, "role": user.role.value})
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    first = asyncio.run(get_current_user(credentials=creds, db=db))
+    second = asyncio.run(get_current_user(credentials=creds, db=db))
+    assert first == second
+    assert db.selects == 1
+    assert principal_cache.stats()["hits"] == 1
+
+    # Disabling the user and invalidating forces a reload
+    user.is_active = False
+    principal_cache.invalidate(user.id)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_user(credentials=creds, db=db))
+    assert exc.value.status_code == 403
+    assert db.selects == 2
+    principal_cache.clear()
@@ -0,0 +1,188 @@
+"""
+Tests for login throttling
+"""
+import redis
+from app.core.rate_limit import LoginThrottle, MemoryWindowStore
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.client.round_trips += 1
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """Just enough of the redis-py sorted-set API for the limiter"""
+
+    def __init__(self):
+        self.zsets = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zremrangebyscore(self, key, lo, hi):
+        zset = self.zsets.get(key, {})
+        doomed = [m for m, score in zset.items() if lo <= score <= hi]
+        for member in doomed:
+            del zset[member]
+        return len(doomed)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    def delete(self, key):
+        self.round_trips += 1
+        return int(self.zsets.pop(key, None) is not None)
+
+
+class DownRedis:
+    def pipeline(self, transaction=True):
+        raise redis.ConnectionError("unreachable")
+
+    def delete(self, key):
+        raise redis.ConnectionError("unreachable")
+
+
+def make_throttle(client):
+    errors = []
+    throttle = LoginThrottle(
+        redis_factory=lambda: client,
+        on_redis_error=lambda: errors.append(1),
+        memory=MemoryWindowStore(max_keys=100, sweep_interval=60),
+    )
+    return throttle, errors
+
+
+def test_redis_window_counts_failures():
+    """Failures accumulate in a shared sorted set, one round trip per call"""
+    fake = FakeRedis()
+    throttle, errors = make_throttle(fake)
+    for _ in range(3):
+        throttle.record("1.2.3.4", window_seconds=60)
+    assert fake.round_trips == 3
+    assert throttle.attempts("1.2.3.4", window_seconds=60) == 3
+    assert fake.round_trips == 4
+    assert fake.ttls["login_fail:1.2.3.4"] == 61
+    assert len(throttle.memory) == 0
+    assert not errors
+
+
+def test_redis_window_slides(monkeypatch):
+    """Failures older than the window stop counting"""
+    import app.core.rate_limit as module
+    clock = [1000.0]
+    monkeypatch.setattr(module.time, "time", lambda: clock[0])
+    throttle, _ = make_throttle(FakeRedis())
+    throttle.record("ip", window_seconds=60)
+    clock[0] += 30
+    throttle.record("ip", window_seconds=60)
+    clock[0] += 31
+    assert throttle.attempts("ip", window_seconds=60) == 1
+
+
+def test_redis_reset():
+    """A successful login clears the window"""
+    fake = FakeRedis()
+    throttle, _ = make_throttle(fake)
+    throttle.record("ip", window_seconds=60)
+    throttle.reset("ip")
+    assert throttle.attempts("ip", window_seconds=60) == 0
+
+
+def test_falls_back_to_memory_when_redis_down():
+    """Redis errors degrade to the in-process store"""
+    throttle, errors = make_throttle(DownRedis())
+    for _ in range(5):
+        throttle.record("ip", window_seconds=60)
+    assert throttle.attempts("ip", window_seconds=60) == 5
+    throttle.reset("ip")
+    assert throttle.attempts("ip", window_seconds=60) == 0
+    assert errors
+
+
+def test_memory_store_is_bounded_and_swept():
+    """Old keys are evicted by size and expired keys by the sweeper"""
+    store = MemoryWindowStore(max_keys=3, sweep_interval=0)
+    for i in range(5):
+        store.add(f"ip{i}", now=100.0, window=60)
+    assert len(store) == 3
+    assert store.count("ip0", now=100.0, window=60) == 0
+    store.add("fresh", now=200.0, window=60)
+    assert len(store) == 1
+
+
+def test_token_bucket_refills():
+    """Buckets allow a burst up to capacity and refill over time"""
+    from app.core.rate_limit import BucketLimit, ShardedBucketStore
+    store = ShardedBucketStore(shards=2)
+    limit = BucketLimit.parse("3/3")
+    results = [store.take([("user:1", limit)], now=0.0) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    assert results[3].retry_after == 1.0
+    assert store.take([("user:1", limit)], now=1.0).allowed
+
+
+def test_multi_bucket_check_is_all_or_nothing():
+    """A request denied by the route bucket does not drain the user bucket"""
+    from app.core.rate_limit import ApiRateLimiter, ShardedBucketStore
+    limiter = ApiRateLimiter(
+        ShardedBucketStore(),
+        default="10/60",
+        roles={},
+        routes={"GET /api/v1/hosts/stats": "1/60"},
+    )
+    assert limiter.check("user:1", "user", "GET /api/v1/hosts/stats", now=0).allowed
+    denied = limiter.check("user:1", "user", "GET /api/v1/hosts/stats", now=0)
+    assert not denied.allowed
+    assert denied.limit == 1
+    other = limiter.check("user:1", "user", "GET /api/v1/vps/", now=0)
+    assert other.allowed and other.remaining == 8
+
+
+def test_middleware_returns_429_with_headers(monkeypatch):
+    """Exhausted buckets yield 429 with Retry-After and RateLimit headers"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    import app.core.rate_limit as module
+
+    limiter = module.ApiRateLimiter(
+        module.ShardedBucketStore(), default="2/60", roles={}, routes={}
+    )
+    monkeypatch.setattr(module, "api_limiter", limiter)
+    api = FastAPI()
+    api.middleware("http")(module.rate_limit_middleware)
+
+    @api.get("/api/v1/ping/{item_id}")
+    async def ping(item_id: int):
+        return {"ok": True}
+
+    client = TestClient(api)
+    first = client.get("/api/v1/ping/1")
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    client.get("/api/v1/ping/2")
+    limited = client.get("/api/v1/ping/3")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert limited.json()["error"]["type"] == "rate_limited"
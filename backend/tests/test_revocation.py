@@ -0,0 +1,124 @@
+"""
+Tests for token revocation and refresh-token rotation
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.principal_cache import Principal, principal_cache
+from app.models.revoked_token import RevocationScope, RevokedToken
+from app.core.revocation import BloomFilter, RevocationList
+from app.core.security import create_access_token, create_refresh_token, decode_token
+from app.models.user import UserRole
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/revocation.db")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+def test_bloom_filter_membership():
+    """Added keys are always found; unknown keys rarely are"""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_rotation_rejects_reuse(session_factory):
+    """A refresh token can be consumed exactly once"""
+    revocations = RevocationList(session_factory=session_factory)
+    payload = decode_token(create_refresh_token(data={"sub": 1}))
+    assert not revocations.is_revoked(payload)
+    with session_factory() as db:
+        assert revocations.revoke_token(db, payload)
+        assert not revocations.revoke_token(db, payload)
+    assert revocations.is_revoked(payload)
+
+
+def test_revocations_propagate_between_processes(session_factory):
+    """Another process picks up revocations on its next sync"""
+    writer = RevocationList(session_factory=session_factory)
+    reader = RevocationList(session_factory=session_factory)
+    payload = decode_token(create_access_token(data={"sub": 3}))
+    reader.sync()
+    with session_factory() as db:
+        writer.revoke_token(db, payload)
+    assert not reader.is_revoked(payload)  # not synced yet, Bloom filter says no
+    reader.sync()
+    assert reader.is_revoked(payload)
+
+
+def test_revoke_user_cuts_off_older_tokens(session_factory):
+    """Revoking a user invalidates tokens issued before the cutoff only"""
+    revocations = RevocationList(session_factory=session_factory)
+    old = decode_token(create_refresh_token(data={"sub": 5}))
+    old["iat"] -= 10
+    other_user = decode_token(create_refresh_token(data={"sub": 6}))
+    other_user["iat"] -= 10
+    with session_factory() as db:
+        revocations.revoke_user(db, 5)
+    fresh = decode_token(create_access_token(data={"sub": 5}))
+    fresh["iat"] += 2
+    assert revocations.is_revoked(old)
+    assert not revocations.is_revoked(fresh)
+    assert not revocations.is_revoked(other_user)
+
+
+def test_principal_changes_reach_every_process(session_factory):
+    """A user update drops the cached principal here at once and elsewhere on the next sync"""
+    writer = RevocationList(session_factory=session_factory)
+    reader = RevocationList(session_factory=session_factory)
+    reader.sync()
+    principal = Principal(id=7, uuid="u7", email="u7@example.com", username="u7", full_name=None,
+                          role=UserRole.ADMIN, is_active=True, is_2fa_enabled=False)
+    principal_cache.put(principal)
+    with session_factory() as db:
+        writer.principal_changed(db, 7)
+    assert principal_cache.get(7) is None
+    principal_cache.put(principal)  # the other process's stale entry
+    reader.sync()
+    assert principal_cache.get(7) is None
+    token = decode_token(create_access_token(data={"sub": 7}))
+    assert not reader.is_revoked(token)  # the user's tokens stay valid
+
+
+def test_checks_never_touch_the_database(session_factory):
+    """Revoked, live and Bloom-colliding tokens are all answered from memory"""
+    revocations = RevocationList(session_factory=session_factory)
+    revoked = decode_token(create_access_token(data={"sub": 7}))
+    with session_factory() as db:
+        revocations.revoke_token(db, revoked)
+    statements = []
+    event.listen(session_factory.kw["bind"], "before_cursor_execute", lambda *args: statements.append(args[2]))
+    revocations._bloom.add("collides")  # A false positive: in the filter, never revoked
+    assert revocations.is_revoked(revoked)
+    assert not revocations.is_revoked({"sub": 7, "jti": "collides", "iat": 0})
+    assert not revocations.is_revoked(decode_token(create_access_token(data={"sub": 7})))
+    assert statements == []
+
+
+def test_purge_drops_expired_rows_and_keeps_the_rest(session_factory):
+    """A due sync deletes expired revocations and rebuilds the view from what is left"""
+    revocations = RevocationList(session_factory=session_factory)
+    live = decode_token(create_access_token(data={"sub": 8}))
+    with session_factory() as db:
+        revocations.revoke_token(db, live)
+        db.add(RevokedToken(jti="expired", scope=RevocationScope.TOKEN, user_id=8, revoked_at=datetime.utcnow(),
+                            expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.commit()
+    revocations.sync()
+    assert revocations.is_revoked({"sub": 8, "jti": "expired", "iat": 0})
+
+    revocations._next_purge = 0.0  # Due now
+    revocations.sync()
+    assert revocations.is_revoked(live)
+    assert not revocations.is_revoked({"sub": 8, "jti": "expired", "iat": 0})
+    with session_factory() as db:
+        assert db.query(RevokedToken).count() == 1
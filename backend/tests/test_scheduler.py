@@ -0,0 +1,91 @@
+"""
+Tests for capacity-aware VPS placement
+"""
+import asyncio
+import threading
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.scheduler import BEST_FIT, SPREAD, CapacityIndex, NoCapacity, PlacementScheduler, Resources
+from app.models.host import Host, HostStatus
+import app.models  # noqa: F401  (register tables)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scheduler.db", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(Host(name=f"h{i}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=16,
+                        total_storage_gb=100, status=HostStatus.ONLINE) for i in range(4))
+        db.add(Host(name="down", ip_address="10.0.0.2", total_cpu_cores=64, total_ram_gb=256,
+                    total_storage_gb=1000, status=HostStatus.OFFLINE))
+        db.commit()
+    return engine
+
+
+def test_index_best_fit_and_spread():
+    """Best-fit takes the tightest host that fits; spread the emptiest; CPU/storage shortfalls are skipped"""
+    index = CapacityIndex()
+    index.set(1, cpu=4, ram=8, storage=100)
+    index.set(2, cpu=1, ram=6, storage=100)   # enough RAM, too little CPU
+    index.set(3, cpu=8, ram=32, storage=100)
+    index.set(4, cpu=8, ram=2, storage=100)   # too little RAM
+    need = Resources(2, 4, 10)
+    assert list(index.candidates(need, BEST_FIT)) == [1, 3]
+    assert list(index.candidates(need, SPREAD)) == [3, 1]
+    index.adjust(3, Resources(8, 30, 0))
+    assert index.free(3) == Resources(0, 2, 100)
+    assert list(index.candidates(need, BEST_FIT)) == [1]
+    index.discard(1)
+    assert list(index.candidates(need)) == [] and len(index) == 3
+
+
+def test_concurrent_placements_never_overcommit(engine, sessions):
+    """Workers with independent, stale indexes race for capacity; only what fits is reserved"""
+    Session = sessionmaker(bind=engine)
+    placed, refused = [], []
+
+    async def worker():
+        scheduler = PlacementScheduler(refresh_seconds=3600)
+        async with sessions.session(engine) as db:
+            for _ in range(10):
+                try:
+                    placed.append((await scheduler.place(db, Resources(2, 4, 10))).host_id)
+                    await db.commit()
+                except NoCapacity:
+                    refused.append(1)
+
+    threads = [threading.Thread(target=asyncio.run, args=(worker(),)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # 4 hosts x (8 CPU / 2) = 16 placements fit; the OFFLINE host is never used
+    assert len(placed) == 16 and len(refused) == 64
+    with Session() as db:
+        for host in db.scalars(select(Host)):
+            assert host.used_cpu_cores <= host.total_cpu_cores
+            assert host.used_ram_gb <= host.total_ram_gb
+            assert host.used_cpu_cores == 2 * placed.count(host.id)
+
+
+def test_rollback_and_abort_restore_capacity(engine, sessions):
+    """A reservation rolled back with its transaction leaves neither the DB nor the index changed"""
+    scheduler = PlacementScheduler(strategy=SPREAD)
+
+    async def run():
+        async with sessions.session(engine) as db:
+            reservation = await scheduler.place(db, Resources(8, 16, 100))
+            assert scheduler.index.free(reservation.host_id) == Resources(0, 0, 0)
+            await db.rollback()
+            scheduler.abort(reservation)
+            assert scheduler.index.free(reservation.host_id) == Resources(8, 16, 100)
+            assert (await db.get(Host, reservation.host_id)).used_cpu_cores == 0
+
+            with pytest.raises(NoCapacity):
+                await scheduler.place(db, Resources(9, 1, 1))
+
+    asyncio.run(run())
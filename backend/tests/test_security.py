@@ -0,0 +1,92 @@
+"""
+Tests for security utilities
+"""
+import asyncio
+import pytest
+from app.core.security import PasswordHasher, HashingPoolSaturated, get_password_hash
+
+
+def test_hasher_roundtrip():
+    """Hash and verify through the process pool"""
+    hasher = PasswordHasher(max_workers=1, max_pending=4)
+    try:
+        hashed = asyncio.run(hasher.hash("s3cret"))
+        assert asyncio.run(hasher.verify("s3cret", hashed))
+        assert not asyncio.run(hasher.verify("wrong", hashed))
+        assert hasher.in_flight == 0
+    finally:
+        hasher.shutdown()
+
+
+def test_hasher_inline_mode():
+    """max_workers=0 hashes inline without a pool"""
+    hasher = PasswordHasher(max_workers=0, max_pending=0)
+    assert asyncio.run(hasher.verify("pw", get_password_hash("pw")))
+
+
+def test_hasher_rejects_when_saturated():
+    """Submissions beyond workers + pending fail fast"""
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+    hashed = get_password_hash("pw")
+
+    async def burst():
+        return await asyncio.gather(
+            *(hasher.verify("pw", hashed) for _ in range(4)),
+            return_exceptions=True,
+        )
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        hasher.shutdown()
+    assert sum(isinstance(r, HashingPoolSaturated) for r in results) == 2
+    assert results.count(True) == 2
+
+
+@pytest.fixture
+def clean_token_cache(monkeypatch):
+    from app.core import security
+    monkeypatch.setattr(security, "_revocation_checks", [])
+    security.token_cache.clear()
+    yield security.token_cache
+    security.token_cache.clear()
+
+
+def test_decode_token_is_cached(clean_token_cache):
+    """Repeated decodes of the same token hit the cache"""
+    from app.core.security import create_access_token, decode_token
+    token = create_access_token(data={"sub": 1})
+    assert decode_token(token)["sub"] == "1"
+    assert decode_token(token)["sub"] == "1"
+    assert clean_token_cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_decode_token_never_caches_failures(clean_token_cache):
+    """Invalid and expired tokens are rejected and not stored"""
+    from datetime import timedelta
+    from app.core.security import create_access_token, decode_token
+    expired = create_access_token(data={"sub": 1}, expires_delta=timedelta(seconds=-1))
+    assert decode_token(expired) is None
+    assert decode_token("not-a-jwt") is None
+    assert clean_token_cache.stats()["size"] == 0
+
+
+def test_decode_token_expires_at_exp(clean_token_cache, monkeypatch):
+    """Cached entries are dropped once the token's exp passes"""
+    from app.core import security
+    token = security.create_access_token(data={"sub": 1})
+    payload = security.decode_token(token)
+    monkeypatch.setattr(security.time, "time", lambda: payload["exp"] + 1)
+    assert clean_token_cache.get(clean_token_cache.key(token)) is None
+
+
+def test_decode_token_respects_revocation_hook(clean_token_cache):
+    """Revocation hooks apply to cached payloads too"""
+    from app.core.security import create_access_token, decode_token, register_revocation_check
+    token = create_access_token(data={"sub": 7})
+    assert decode_token(token) is not None
+    revoked = set()
+    register_revocation_check(lambda payload: payload.get("sub") in revoked)
+    revoked.add("7")
+    assert decode_token(token) is None
+    assert clean_token_cache.stats()["size"] == 0
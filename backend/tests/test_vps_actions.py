@@ -0,0 +1,127 @@
+"""
+Tests for POST /vps/actions
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+import app.api.v1.vps as vps_api
+from app.core.database import Base, get_async_db
+from app.core.dependencies import get_current_user
+from app.core.principal_cache import Principal
+from app.main import app
+from app.models.audit_log import AuditLog
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.job import Job, JobKind, JobStatus
+from app.models.user import User, UserRole
+from app.models.vps import VPS, VPSStatus
+
+
+def _principal(id, role):
+    return Principal(id=id, uuid=f"u{id}", email=f"{id}@example.com", username=f"u{id}", full_name=None,
+                     role=role, is_active=True, is_2fa_enabled=False)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch, sessions):
+    """(client, Session, statements, dispatched, login); 1000 running VPSes on host 1 owned by the admin, 5 stopped ones on host 2 owned by user 2"""
+    engine = create_engine(f"sqlite:///{tmp_path}/actions.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add_all([
+            User(email="a@example.com", username="a", hashed_password="x", role=UserRole.ADMIN),
+            User(email="b@example.com", username="b", hashed_password="x"),
+            OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1),
+        ])
+        db.add_all(Host(name=f"h{i}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32,
+                        total_storage_gb=500, status=HostStatus.ONLINE) for i in (1, 2))
+        db.flush()
+        db.add_all(VPS(name=f"v{i}", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=1, owner_id=1, host_id=1,
+                       status=VPSStatus.RUNNING) for i in range(1000))
+        db.add_all(VPS(name=f"w{i}", cpu_cores=1, ram_gb=1, storage_gb=10, os_image_id=1, owner_id=2, host_id=2,
+                       status=VPSStatus.STOPPED) for i in range(5))
+        db.commit()
+
+    statements = []
+    event.listen(sessions.engine(engine), "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+
+    dispatched = []
+
+    async def dispatch(job_ids):
+        dispatched.extend(job_ids)
+
+    monkeypatch.setattr(vps_api, "dispatch", dispatch)
+
+    def login(id, role=UserRole.ADMIN):
+        app.dependency_overrides[get_current_user] = lambda: _principal(id, role)
+
+    app.dependency_overrides[get_async_db] = sessions.override(engine)
+    login(1)
+    try:
+        yield TestClient(app), Session, statements, dispatched, login
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_filter_queues_every_eligible_vps_in_constant_statements(env):
+    """Stopping a whole host: one job and one audit row per VPS, the same few statements whatever the count"""
+    client, Session, statements, dispatched, _ = env
+    r = client.post("/api/v1/vps/actions", json={"action": "stop", "host_id": 1})
+    assert r.status_code == 202, r.text
+    body = r.json()
+    assert body["queued"] == 1000 and body["failed"] == 0
+    assert sorted(item["job_id"] for item in body["results"]) == sorted(dispatched)
+    # targets SELECT, INSERT ... SELECT ... RETURNING into jobs, audit executemany
+    assert len([s for s in statements if not s.startswith(("BEGIN", "COMMIT"))]) <= 3
+
+    with Session() as db:
+        jobs = db.scalars(select(Job)).all()
+        assert len(jobs) == 1000 and {(j.kind, j.status, j.user_id) for j in jobs} == {
+            (JobKind.STOP, JobStatus.QUEUED, 1)
+        }
+        audits = db.scalars(select(AuditLog)).all()
+        assert len(audits) == 1000 and all(a.details["batch"] and a.resource_uuid for a in audits)
+
+    # Every one of them now has a job in flight
+    r = client.post("/api/v1/vps/actions", json={"action": "stop", "host_id": 1})
+    assert r.status_code == 207 and r.json()["queued"] == 0
+    assert {item["status_code"] for item in r.json()["results"]} == {409}
+
+
+def test_ids_report_per_vps_outcomes(env):
+    """Ineligible, foreign and unknown ids are reported individually; the rest are queued"""
+    client, Session, _, dispatched, login = env
+    login(2, UserRole.USER)
+    r = client.post("/api/v1/vps/actions", json={"action": "start", "ids": [1001, 1002, 1, 9999]})
+    assert r.status_code == 207, r.text
+    outcomes = {item["vps_id"]: (item["status_code"], item["error"]) for item in r.json()["results"]}
+    assert outcomes == {
+        1: (403, "Access denied"),
+        1001: (202, None),
+        1002: (202, None),
+        9999: (404, "VPS not found"),
+    }
+    assert len(dispatched) == 2
+
+    r = client.post("/api/v1/vps/actions", json={"action": "reboot", "ids": [1003]})
+    assert r.json()["results"] == [
+        {"vps_id": 1003, "status_code": 400, "job_id": None, "error": "Cannot reboot a stopped VPS"}
+    ]
+
+    # A user's filter only ever reaches their own VPSes
+    r = client.post("/api/v1/vps/actions", json={"action": "start", "status": "stopped"})
+    assert sorted(item["vps_id"] for item in r.json()["results"] if item["status_code"] == 202) == [1003, 1004, 1005]
+
+
+def test_action_request_validation(env):
+    """Unknown actions, empty selections and mixed ids/filters are rejected before anything is queued"""
+    client, Session, _, dispatched, _ = env
+    assert client.post("/api/v1/vps/actions", json={"action": "destroy", "ids": [1]}).status_code == 422
+    assert client.post("/api/v1/vps/actions", json={"action": "stop"}).status_code == 422
+    assert client.post("/api/v1/vps/actions", json={"action": "stop", "ids": []}).status_code == 422
+    assert client.post("/api/v1/vps/actions", json={"action": "stop", "ids": [1], "host_id": 1}).status_code == 422
+    assert client.post("/api/v1/vps/actions", json={"action": "stop", "status": "gone"}).status_code == 422
+    with Session() as db:
+        assert db.query(Job).count() == 0 and not dispatched
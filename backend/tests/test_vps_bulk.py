@@ -0,0 +1,111 @@
+"""
+Tests for POST /vps/bulk
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+import app.api.v1.vps as vps_api
+from app.core.database import Base, get_async_db
+from app.core.dependencies import get_current_admin
+from app.core.ipam import create_pool
+from app.core.principal_cache import Principal
+from app.core.scheduler import PlacementScheduler
+from app.main import app
+from app.models.audit_log import AuditLog
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.user import User, UserRole
+from app.models.vps import VPS, NetworkType
+
+SPEC = {"cpu_cores": 2, "ram_gb": 4, "storage_gb": 20, "os_image_id": 1, "owner_id": 1}
+
+
+@pytest.fixture
+def bulk(tmp_path, monkeypatch, sessions):
+    """(client, engine, commits, dispatched) against a fresh database with two 8-CPU hosts and address pools"""
+    engine = create_engine(f"sqlite:///{tmp_path}/bulk.db")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with factory() as db:
+        db.add(User(email="a@example.com", username="a", hashed_password="x", role=UserRole.ADMIN))
+        db.add(OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        db.add_all(Host(name=f"h{i}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32,
+                        total_storage_gb=500, status=HostStatus.ONLINE) for i in range(2))
+        create_pool(db, "public", "203.0.113.0/24", NetworkType.PUBLIC_IPV4)
+        create_pool(db, "private", "10.0.0.0/30", NetworkType.PRIVATE_ONLY)
+        db.commit()
+    commits = []
+    event.listen(sessions.engine(engine), "commit", lambda conn: commits.append(1))
+    dispatched = []
+
+    async def dispatch(job_ids):
+        dispatched.extend(job_ids)
+
+    monkeypatch.setattr(vps_api, "scheduler", PlacementScheduler())
+    monkeypatch.setattr(vps_api, "dispatch", dispatch)
+    admin = Principal(id=1, uuid="u1", email="a@example.com", username="a", full_name=None,
+                      role=UserRole.ADMIN, is_active=True, is_2fa_enabled=False)
+    app.dependency_overrides.update({get_async_db: sessions.override(engine), get_current_admin: lambda: admin})
+    try:
+        yield TestClient(app), engine, commits, dispatched
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_bulk_count_creates_all_in_one_transaction(bulk):
+    """count + name_pattern: every VPS placed, inserted, queued and audited with a single commit"""
+    client, engine, commits, dispatched = bulk
+    r = client.post("/api/v1/vps/bulk", json={"count": 6, "name_pattern": "lab-{n:02}", "spec": SPEC})
+    assert r.status_code == 202, r.text
+    body = r.json()
+    assert body["created"] == 6 and body["failed"] == 0
+    assert [item["name"] for item in body["results"]] == [f"lab-{n:02}" for n in range(1, 7)]
+    assert all(item["vps"]["host_id"] and item["vps"]["status"] == "creating" for item in body["results"])
+    assert sorted(item["job_id"] for item in body["results"]) == sorted(dispatched) and len(dispatched) == 6
+    assert len({item["vps"]["public_ipv4"] for item in body["results"]}) == 6
+    assert len(commits) == 1
+
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(VPS).count() == 6
+        assert sum(h.used_cpu_cores for h in db.scalars(select(Host))) == 12
+        audits = db.scalars(select(AuditLog)).all()
+        assert len(audits) == 6 and all(a.details["bulk"] for a in audits)
+
+
+def test_bulk_items_report_partial_failures(bulk):
+    """Bad items fail individually with their own status; the rest are created"""
+    client, engine, _, dispatched = bulk
+    items = [
+        dict(SPEC, name="ok-1"),
+        dict(SPEC, name="no-image", os_image_id=99),
+        dict(SPEC, name="no-owner", owner_id=99),
+        dict(SPEC, name="bad-net", network_type="ipv9"),
+        dict(SPEC, name="too-big", cpu_cores=16),
+        dict(SPEC, name="ok-2", cpu_cores=8),
+        # The private /30 has two addresses: the third VPS is refused and its capacity handed back
+        *(dict(SPEC, name=f"priv-{k}", cpu_cores=1, network_type="private_only") for k in range(3)),
+    ]
+    r = client.post("/api/v1/vps/bulk", json={"items": items})
+    assert r.status_code == 207, r.text
+    body = r.json()
+    assert [item["status_code"] for item in body["results"]] == [202, 404, 404, 422, 409, 202, 202, 202, 409]
+    assert body["created"] == 4 and body["failed"] == 5
+    assert body["results"][-1]["error"] == "No free private_only address"
+    assert len(dispatched) == 4
+
+    with sessionmaker(bind=engine)() as db:
+        assert sorted(v.name for v in db.scalars(select(VPS))) == ["ok-1", "ok-2", "priv-0", "priv-1"]
+        assert sorted(v.private_ip for v in db.scalars(select(VPS)) if v.private_ip) == ["10.0.0.1", "10.0.0.2"]
+        assert sum(h.used_cpu_cores for h in db.scalars(select(Host))) == 12
+
+
+def test_bulk_request_validation(bulk):
+    """Malformed requests are rejected as a whole before anything is placed"""
+    client, engine, _, _ = bulk
+    assert client.post("/api/v1/vps/bulk", json={"count": 2, "spec": SPEC, "items": []}).status_code == 422
+    assert client.post("/api/v1/vps/bulk", json={"count": 2}).status_code == 422
+    assert client.post("/api/v1/vps/bulk", json={"count": 10 ** 6, "spec": SPEC}).status_code == 422
+    assert client.post("/api/v1/vps/bulk", json={"count": 2, "name_pattern": "{x}", "spec": SPEC}).status_code == 422
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(VPS).count() == 0
@@ -0,0 +1,186 @@
+"""
+Tests for the bulk VPS/host stats collector
+"""
+import asyncio
+import time
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.core.database import Base
+from app.core.hypervisor import RUNNING, SHUTOFF, FakeHypervisor, HypervisorManager
+from app.core.metric_store import HOST_METRICS, VPS_METRICS, MetricStore
+from app.core.bootstrap import ClusterLeader
+from app.core.vps_stats import StatsCollector, stats_loop
+from app.models.host import Host, HostStatus
+from app.models.image import OSImage
+from app.models.user import User
+from app.models.vps import VPS, VPSStatus
+
+URIS = {1: "test://h1", 2: "test://h2"}
+SPEC = {"cpu_cores": 2, "ram_gb": 4, "storage_gb": 10, "disk_path": "/x.qcow2"}
+
+
+@pytest.fixture
+def env(tmp_path):
+    """(collector, Session, fake, statements, clock); 3 VPSes on host 1, 2 on host 2, all running"""
+    engine = create_engine(f"sqlite:///{tmp_path}/stats.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    fake = FakeHypervisor()
+    with Session() as db:
+        db.add(User(email="a@example.com", username="a", hashed_password="x"))
+        db.add(OSImage(name="img", os_family="ubuntu", file_path="/x", file_size_gb=1))
+        db.add_all(Host(name=f"h{i}", ip_address="10.0.0.1", total_cpu_cores=8, total_ram_gb=32,
+                        total_storage_gb=500, status=HostStatus.ONLINE, libvirt_uri=uri) for i, uri in URIS.items())
+        db.flush()
+        for i, host_id in enumerate([1, 1, 1, 2, 2]):
+            db.add(VPS(uuid=f"d{i}", name=f"v{i}", cpu_cores=2, ram_gb=4, storage_gb=10, os_image_id=1, owner_id=1,
+                       host_id=host_id, status=VPSStatus.RUNNING))
+            fake.domains[URIS[host_id], f"d{i}"] = {"state": RUNNING, "spec": dict(SPEC), "counters": {
+                "mem_used_kb": 2 * 1024 * 1024, "disk_allocation_bytes": 5 * 1024 ** 3,
+            }}
+        fake.domains[URIS[1], "unmanaged"] = {"state": RUNNING, "spec": dict(SPEC)}
+        db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    clock = [1000.0]
+    driver = HypervisorManager(fake)
+    try:
+        yield StatsCollector(driver, engine, clock=lambda: clock[0], vps_metrics=MetricStore(VPS_METRICS),
+                             host_metrics=MetricStore(HOST_METRICS)), Session, fake, statements, clock
+    finally:
+        driver.close()
+
+
+def _advance(fake, domain, uri=URIS[1], **deltas):
+    counters = fake.domains[uri, domain]["counters"]
+    for name, delta in deltas.items():
+        counters[name] = counters.get(name, 0) + delta
+
+
+def _stats(Session):
+    with Session() as db:
+        return {v.uuid: v.stats_cache for v in db.scalars(select(VPS))}, {h.id: h.stats_cache for h in db.scalars(select(Host))}
+
+
+def test_rates_from_successive_samples(env):
+    """One stats call per host; CPU%, RAM%, disk and network rates come from the previous sample"""
+    collector, Session, fake, _, clock = env
+    assert asyncio.run(collector.collect()) == 5
+    vpses, _ = _stats(Session)
+    assert vpses["d0"] == {"state": "running", "cpu": None, "ram": 50.0, "disk": 50.0, "disk_io": None, "network": None}
+
+    clock[0] += 10
+    # 10s of one fully busy vCPU out of 2, 1 MB/s in, 100 KB/s written
+    _advance(fake, "d0", cpu_time_ns=10 * 10 ** 9, net_rx_bytes=10 * 1024 ** 2, disk_write_bytes=1024 ** 2)
+    asyncio.run(collector.collect())
+    vpses, hosts = _stats(Session)
+    assert vpses["d0"] == {"state": "running", "cpu": 50.0, "ram": 50.0, "disk": 50.0,
+                           "disk_io": {"read": 0, "write": 104857}, "network": {"in": 1048576, "out": 0}}
+    assert vpses["d1"]["cpu"] == 0.0
+    assert hosts[1] == {"vpses": 3, "running": 3, "cpu": 12.5, "disk_io": {"read": 0, "write": 104857},
+                        "network": {"in": 1048576, "out": 0}}
+    assert [op for op, _ in fake.calls] == ["domain_stats"] * 4
+    now = time.time()
+    history = collector.vps_metrics.query(1, now - 10, now, 10)["metrics"]
+    assert 50.0 in history["cpu"]["max"] and 1048576 in history["net_in"]["avg"]
+    assert 3 in collector.host_metrics.query(1, now - 10, now, 10)["metrics"]["running"]["avg"]
+
+    # A restarted domain's counters start over: no rates until the next sample
+    clock[0] += 10
+    fake.domains[URIS[1], "d0"]["counters"]["cpu_time_ns"] = 10 ** 9
+    asyncio.run(collector.collect())
+    assert _stats(Session)[0]["d0"]["cpu"] is None
+
+
+def test_one_update_per_host_and_only_changed_rows(env):
+    """Each host's changes go out in one UPDATE; unchanged VPSes and hosts aren't rewritten"""
+    collector, Session, fake, statements, clock = env
+    asyncio.run(collector.collect())
+    clock[0] += 10
+    asyncio.run(collector.collect())  # All idle: rates appear once, then nothing moves
+    with Session() as db:
+        first = {v.id: v.stats_updated_at for v in db.scalars(select(VPS))}
+    statements.clear()
+
+    clock[0] += 10
+    _advance(fake, "d2", net_tx_bytes=5000)
+    fake.domains[URIS[2], "d3"]["state"] = SHUTOFF
+    assert asyncio.run(collector.collect()) == 2
+    updates = [s for s in statements if s.startswith("UPDATE vpses")]
+    assert len(updates) == 2  # One per host
+    with Session() as db:
+        after = {v.id: v.stats_updated_at for v in db.scalars(select(VPS))}
+    assert [i for i in after if after[i] != first[i]] == [3, 4]
+
+    clock[0] += 10
+    statements.clear()
+    _advance(fake, "d2", net_tx_bytes=5000)  # Same rate as before
+    assert asyncio.run(collector.collect()) == 0
+    assert not [s for s in statements if s.startswith("UPDATE")]
+    vpses, hosts = _stats(Session)
+    assert vpses["d3"]["state"] == "shutoff" and vpses["d3"]["cpu"] is None
+    assert hosts[2]["running"] == 1
+
+
+def test_hosts_sharing_a_uri_keep_their_own_samples(env, monkeypatch):
+    """Hosts left on the default LIBVIRT_URI each keep their previous sample, so both get rates"""
+    collector, Session, fake, _, clock = env
+    monkeypatch.setattr(settings, "LIBVIRT_URI", "test://shared")
+    with Session() as db:
+        db.query(Host).update({"libvirt_uri": None})
+        db.commit()
+    for uri, domain in list(fake.domains):
+        fake.domains["test://shared", domain] = fake.domains.pop((uri, domain))
+    targets = collector._targets()
+    for now in (1000.0, 1010.0):
+        sampled = asyncio.run(collector.driver.call("test://shared", "domain_stats"))
+        for target in targets:  # Host 1's new sample must not become host 2's previous one
+            collector._apply(target, sampled, now)
+        _advance(fake, "d0", uri="test://shared", cpu_time_ns=10 * 10 ** 9)
+        _advance(fake, "d3", uri="test://shared", cpu_time_ns=5 * 10 ** 9)
+    vpses, _ = _stats(Session)
+    assert (vpses["d0"]["cpu"], vpses["d3"]["cpu"], vpses["d4"]["cpu"]) == (50.0, 25.0, 0.0)
+
+def test_unreachable_host_does_not_stop_the_others(env):
+    """A host that can't be reached is skipped and counted; the rest are still written"""
+    collector, Session, fake, _, _ = env
+    fake.unreachable.add(URIS[2])
+    assert asyncio.run(collector.collect()) == 3
+    vpses, hosts = _stats(Session)
+    assert vpses["d3"] is None and hosts[2] is None
+    assert vpses["d0"]["ram"] == 50.0
+
+
+def test_only_the_leading_worker_collects(env):
+    """Of two workers' loops only the lock holder collects; the other takes over when it stops"""
+    collector, Session, fake, _, _ = env
+    engine = collector.engine
+    passes = {"a": 0, "b": 0}
+
+    def counting(name):
+        worker = StatsCollector(collector.driver, engine, vps_metrics=collector.vps_metrics,
+                                host_metrics=collector.host_metrics)
+        collect = worker.collect
+
+        async def counted():
+            passes[name] += 1
+            return await collect()
+        worker.collect = counted
+        return worker
+
+    async def main():
+        a = asyncio.create_task(stats_loop(0.01, 0, ClusterLeader(engine, "vps-stats"), counting("a")))
+        await asyncio.sleep(0.05)
+        b = asyncio.create_task(stats_loop(0.01, 0, ClusterLeader(engine, "vps-stats"), counting("b")))
+        await asyncio.sleep(0.2)
+        assert passes["a"] > 0 and passes["b"] == 0
+        a.cancel()
+        await asyncio.sleep(0.2)
+        b.cancel()
+        await asyncio.gather(a, b, return_exceptions=True)
+
+    asyncio.run(main())
+    assert passes["b"] > 0